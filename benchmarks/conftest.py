@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+import fake_iris
+
+# Must happen before irissqlcli imports the real iris package
+fake_iris.install()
+
+from irissqlcli.sqlexecute import SQLExecute  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def temp_config(tmpdir_factory):
+    # use temporary directory for config home so user config will not be used
+    os.environ["XDG_CONFIG_HOME"] = str(tmpdir_factory.mktemp("data"))
+
+
+@pytest.fixture
+def executor(request):
+    # Every test gets its own namespace, so its own database
+    executor = SQLExecute(
+        hostname="localhost",
+        port=1972,
+        namespace=request.node.name,
+        username="_SYSTEM",
+        password="SYS",
+    )
+    yield executor
+    executor.close()
@@ -0,0 +1,202 @@
+"""SQLite backed stand-in for the ``iris`` package, so the benchmarks run
+without an IRIS server.
+
+Only what irissqlcli uses is provided: ``iris.dbapi.connect`` with the DB-API
+exceptions, and ``iris.connect``/``iris.system`` for the server version.
+Connections to the same namespace share one in-memory database. The catalog
+queries run against an attached ``INFORMATION_SCHEMA`` database, which
+`add_table` keeps up to date.
+"""
+
+import re
+import sqlite3
+import sys
+import types
+from itertools import count
+
+STARTSWITH_REGEX = re.compile(r"%STARTSWITH\s+'([^']*)'", re.IGNORECASE)
+
+catalog_schema = (
+    "CREATE TABLE IF NOT EXISTS INFORMATION_SCHEMA.SCHEMATA"
+    " (SCHEMA_NAME TEXT PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS INFORMATION_SCHEMA.TABLES"
+    " (TABLE_SCHEMA TEXT, TABLE_NAME TEXT)",
+    "CREATE TABLE IF NOT EXISTS INFORMATION_SCHEMA.COLUMNS"
+    " (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT)",
+)
+
+# Keep one connection per namespace open, a shared in-memory database only
+# lives as long as a connection to it.
+_databases = {}
+_job = count(1000)
+
+
+def _startswith(match):
+    prefix = match.group(1)
+    for char in "\\%_":
+        prefix = prefix.replace(char, "\\" + char)
+    return "LIKE '%s%%' ESCAPE '\\'" % prefix
+
+
+def translate(sql):
+    """Rewrite the IRIS specific bits of *sql* that SQLite does not know.
+
+    >>> translate("SELECT A FROM T WHERE NOT A %STARTSWITH '%'")
+    "SELECT A FROM T WHERE NOT A LIKE '\\\\%%' ESCAPE '\\\\'"
+    """
+    return STARTSWITH_REGEX.sub(_startswith, sql)
+
+
+class Cursor(object):
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection._conn.cursor()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, sql, params=()):
+        if sql.strip().upper() == "SELECT $JOB":
+            sql, params = "SELECT ?", (self._connection.job,)
+        try:
+            self._cursor.execute(translate(sql), params)
+        except sqlite3.OperationalError as e:
+            raise OperationalError(str(e))
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Connection(object):
+    def __init__(self, namespace):
+        uri = "file:%s?mode=memory&cache=shared" % (namespace or "USER")
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._conn.execute(
+            "ATTACH DATABASE ? AS INFORMATION_SCHEMA",
+            ("file:%s_catalog?mode=memory&cache=shared" % (namespace or "USER"),),
+        )
+        for statement in catalog_schema:
+            self._conn.execute(statement)
+        self.job = next(_job)
+
+    def setAutoCommit(self, autocommit):
+        self._conn.isolation_level = None if autocommit else ""
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def add_table(connection, schema, table, columns, rows=()):
+    """Create *table* with *columns* and register it in the catalog.
+
+    The table is created in SQLite without its schema, the catalog records
+    the IRIS name *schema*.*table*.
+    """
+    conn = connection._conn
+    conn.execute(
+        'CREATE TABLE "%s" (%s)' % (table, ", ".join('"%s"' % c for c in columns))
+    )
+    if rows:
+        conn.executemany(
+            'INSERT INTO "%s" VALUES (%s)' % (table, ", ".join("?" * len(columns))),
+            rows,
+        )
+    conn.execute(
+        "INSERT OR IGNORE INTO INFORMATION_SCHEMA.SCHEMATA VALUES (?)", (schema,)
+    )
+    conn.execute("INSERT INTO INFORMATION_SCHEMA.TABLES VALUES (?, ?)", (schema, table))
+    conn.executemany(
+        "INSERT INTO INFORMATION_SCHEMA.COLUMNS VALUES (?, ?, ?)",
+        [(schema, table, column) for column in columns],
+    )
+    conn.commit()
+
+
+def _connect(mode=None, namespace=None, **kwargs):
+    namespace = namespace or "USER"
+    if namespace not in _databases:
+        _databases[namespace] = Connection(namespace)
+    return Connection(namespace)
+
+
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+dbapi = types.ModuleType("iris.dbapi")
+dbapi.connect = _connect
+for _error in (
+    Error,
+    InterfaceError,
+    DatabaseError,
+    OperationalError,
+    ProgrammingError,
+):
+    setattr(dbapi, _error.__name__, _error)
+
+system = types.SimpleNamespace(
+    Version=types.SimpleNamespace(
+        GetVersion=lambda: "SQLite %s (fake iris)" % sqlite3.sqlite_version
+    ),
+)
+runtime = types.SimpleNamespace(configure=lambda **kwargs: None)
+
+
+def connect(**kwargs):
+    return None
+
+
+def install():
+    """Make ``import iris`` resolve to this module. Has to run before
+    irissqlcli is imported."""
+    sys.modules["iris"] = sys.modules[__name__]
+    sys.modules["iris.dbapi"] = dbapi
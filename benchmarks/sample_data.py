@@ -0,0 +1,73 @@
+"""Generated data sets for the benchmarks."""
+
+import random
+
+ROW_HEADERS = ["id", "name", "price", "created", "notes"]
+
+
+def make_rows(count):
+    """Rows of (id, name, price, created, notes), a mix of the usual column
+    types."""
+    return [
+        (
+            i,
+            "name %d" % i,
+            i * 1.25,
+            "2024-01-%02d 12:00:00" % (i % 28 + 1),
+            None if i % 3 else "note %d" % i,
+        )
+        for i in range(count)
+    ]
+
+
+def catalog_rows(identifiers, columns_per_table=9, schemas=10):
+    """Yields the (schemas, tables, columns) row generators of a catalog with
+    about *identifiers* names, shaped like the catalog queries of SQLExecute.
+
+    Most tables live in SQLUser, the rest are spread over other schemas.
+    """
+    tables_count = identifiers // (columns_per_table + 1)
+    schema_names = ["SQLUser"] + ["Schema%d" % i for i in range(1, schemas)]
+
+    def schema_of(i):
+        return schema_names[0] if i % 2 else schema_names[i % schemas]
+
+    yield ((s,) for s in schema_names)
+    yield ((schema_of(i), "table_%d" % i) for i in range(tables_count))
+    yield (
+        (schema_of(i), "table_%d" % i, "column_%d_%d" % (i % 100, c))
+        for i in range(tables_count)
+        for c in range(columns_per_table)
+    )
+
+
+def make_catalog(identifiers, columns_per_table=9, schemas=10):
+    """The rows of `catalog_rows` as (schemas, tables, columns) lists."""
+    return [
+        list(rows) for rows in catalog_rows(identifiers, columns_per_table, schemas)
+    ]
+
+
+WORDS = (
+    "order item customer invoice line product account ledger entry user role"
+    " grant audit event log stock price tax region country city address payment"
+    " method ship status history archive temp stage fact dim sales"
+).split()
+
+
+def make_identifiers(count, seed=0):
+    """*count* distinct names of one to four words, in snake_case, CamelCase
+    or numbered columns."""
+    rand = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        words = rand.sample(WORDS, rand.randint(1, 4))
+        style = rand.random()
+        if style < 0.5:
+            name = "_".join(words) + "_%d" % rand.randint(0, 999)
+        elif style < 0.8:
+            name = "".join(w.capitalize() for w in words) + str(rand.randint(0, 999))
+        else:
+            name = "column_%d_%d" % (rand.randint(0, 99), rand.randint(0, 99))
+        names.add(name)
+    return sorted(names)
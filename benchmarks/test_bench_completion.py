@@ -0,0 +1,40 @@
+import pytest
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+
+from irissqlcli.sqlcompleter import SQLCompleter
+from sample_data import make_catalog
+
+SIZES = [10000, 100000, 1000000]
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: "%d" % size)
+def completer(request):
+    schemas, tables, columns = make_catalog(request.param)
+    completer = SQLCompleter()
+    completer.extend_schemas(schemas, kind="tables")
+    completer.extend_relations(tables, kind="tables")
+    completer.extend_columns(columns, kind="tables")
+    return completer
+
+
+def complete(completer, text):
+    return list(
+        completer.get_completions(
+            Document(text=text, cursor_position=len(text)), CompleteEvent()
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "SELECT * FROM SQLUser.tab",
+        "SELECT * FROM ",
+        "SELECT t.col FROM SQLUser.table_1 t JOIN SQLUser.table_3 u ON t.",
+        "SEL",
+    ],
+    ids=["table", "schema", "column", "keyword"],
+)
+def test_get_completions(benchmark, completer, text):
+    benchmark(complete, completer, text)
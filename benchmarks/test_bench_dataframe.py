@@ -0,0 +1,27 @@
+import pytest
+
+import fake_iris
+from irissqlcli.packages import arrowtable
+from sample_data import ROW_HEADERS, make_rows
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+
+@pytest.mark.parametrize("batched", [False, True], ids=["records", "arrow"])
+def test_fetch_dataframe(benchmark, executor, batched):
+    """Fetch a 200k rows result into a DataFrame, from the fetched tuples like
+    ipython-sql or in Arrow column batches like the magic."""
+    fake_iris.add_table(
+        executor.conn, "SQLUser", "items", ROW_HEADERS, make_rows(200000)
+    )
+
+    def run():
+        cursor = executor.conn.cursor()
+        cursor.execute("SELECT * FROM items")
+        if batched:
+            return arrowtable.to_pandas(arrowtable.fetch_batches(cursor), ROW_HEADERS)
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=ROW_HEADERS)
+
+    frame = benchmark.pedantic(run, rounds=5)
+    assert len(frame) == 200000
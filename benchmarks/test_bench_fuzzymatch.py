@@ -0,0 +1,52 @@
+from itertools import islice
+
+import pytest
+
+from irissqlcli.packages.fuzzymatch import FuzzyIndex
+from sample_data import make_identifiers
+
+IDENTIFIERS = 500000
+
+# Completions shown by the first page of the completion menu
+PAGE = 10
+
+
+@pytest.fixture(scope="module")
+def identifiers():
+    return make_identifiers(IDENTIFIERS)
+
+
+@pytest.fixture(scope="module")
+def index(identifiers):
+    return FuzzyIndex(identifiers)
+
+
+def test_build(benchmark, identifiers):
+    benchmark.pedantic(FuzzyIndex, args=(identifiers,), rounds=1)
+
+
+@pytest.mark.parametrize(
+    "text,typed",
+    [
+        ("o", False),
+        ("ord", False),
+        ("order_it", False),
+        ("OrderIt", False),
+        ("cpo", False),
+        ("custinv", False),
+        ("custinv", True),
+    ],
+    ids=["letter", "prefix", "segment", "camel", "initials", "scan", "narrowed"],
+)
+def test_first_page(benchmark, index, text, typed):
+    def setup():
+        index._scans.clear()
+        if typed:
+            # Typed one keystroke at a time, the scan of the previous text
+            # narrows this one down
+            for i in range(1, len(text)):
+                list(index.find(text[:i]))
+
+    benchmark.pedantic(
+        lambda: list(islice(index.find(text), PAGE)), setup=setup, rounds=5
+    )
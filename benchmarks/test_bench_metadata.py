@@ -0,0 +1,46 @@
+"""Time and memory to load the completion metadata of a large namespace.
+
+The memory is measured with tracemalloc, once, and reported in the extra info
+of the benchmark: what the completer keeps, and the peak while loading.
+"""
+
+import gc
+import tracemalloc
+
+import pytest
+
+from irissqlcli.sqlcompleter import SQLCompleter
+from sample_data import catalog_rows
+
+MB = 1024.0 * 1024
+
+# (tables, columns per table), the largest is a 40k tables, 1.2M columns
+# namespace
+SIZES = [(4000, 30), (40000, 30)]
+
+
+def load(tables, columns_per_table):
+    """Load the catalog like the completion refresher, the rows are produced
+    one at a time like the cursor does."""
+    schemas, relations, columns = catalog_rows(
+        tables * (columns_per_table + 1), columns_per_table
+    )
+    completer = SQLCompleter()
+    completer.extend_schemas(schemas, kind="tables")
+    completer.extend_relations(relations, kind="tables")
+    completer.extend_columns(columns, kind="tables")
+    return completer
+
+
+@pytest.mark.parametrize("size", SIZES, ids=lambda size: "%dx%d" % size)
+def test_load_metadata(benchmark, size):
+    gc.collect()
+    tracemalloc.start()
+    completer = load(*size)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del completer
+
+    benchmark.extra_info["retained_mb"] = round(retained / MB, 1)
+    benchmark.extra_info["peak_mb"] = round(peak / MB, 1)
+    benchmark.pedantic(load, args=size, rounds=3)
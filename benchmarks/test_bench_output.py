@@ -0,0 +1,167 @@
+import sys
+from collections import namedtuple
+
+import click
+import pytest
+
+import fake_iris
+from irissqlcli.main import IRISSqlCli
+from irissqlcli.packages import delimited, jsonformat, special
+from irissqlcli.packages.special import iocommands
+from sample_data import ROW_HEADERS, make_rows
+
+FORMATS = [
+    "ascii",
+    "psql",
+    "fancy_grid",
+    "minimal",
+    "csv",
+    "tsv",
+    "html",
+    "vertical",
+    "json",
+    "jsonl",
+]
+
+Size = namedtuple("Size", "rows columns")
+
+
+class FakeOutput:
+    def get_size(self):
+        return Size(50, 200)
+
+
+class FakePromptApp:
+    output = FakeOutput()
+
+
+@pytest.fixture
+def cli(executor):
+    cli = IRISSqlCli(sqlexecute=executor)
+    cli.prompt_app = FakePromptApp()
+    cli.explicit_pager = False
+    return cli
+
+
+@pytest.fixture
+def rows():
+    return make_rows(10000)
+
+
+@pytest.mark.parametrize("table_format", FORMATS)
+def test_format_output(benchmark, cli, rows, table_format):
+    cli.formatter.format_name = table_format
+
+    def run():
+        return sum(
+            1 for _ in cli.format_output(None, rows, ROW_HEADERS, "10000 rows in set")
+        )
+
+    benchmark(run)
+
+
+@pytest.mark.parametrize("pager", [False, True], ids=["no pager", "pager"])
+def test_output(benchmark, monkeypatch, cli, rows, pager):
+    """Format and write a result set through IRISSqlCli.output, with the
+    terminal writes discarded."""
+    monkeypatch.setattr(click, "secho", lambda *args, **kwargs: None)
+    monkeypatch.setattr(click, "echo_via_pager", lambda *args, **kwargs: None)
+    pager_enabled = special.is_pager_enabled()
+    special.set_pager_enabled(pager)
+    cli.formatter.format_name = "ascii"
+
+    try:
+        benchmark(
+            lambda: cli.output(
+                cli.format_output(None, rows, ROW_HEADERS, None), "10000 rows in set"
+            )
+        )
+    finally:
+        special.set_pager_enabled(pager_enabled)
+
+
+@pytest.mark.parametrize("streamed", [False, True], ids=["formatter", "streamed"])
+@pytest.mark.parametrize("table_format", ["csv", "tsv", "json", "jsonl"])
+def test_run_query_batch(
+    benchmark, monkeypatch, tmp_path, cli, rows, table_format, streamed
+):
+    """Write a result set like -e and piped mode, to a file standing for the
+    pipe."""
+    result = (None, rows, ROW_HEADERS, "", "", True, False)
+    monkeypatch.setattr(cli.sqlexecute, "run", lambda query, stream=False: [result])
+    if not streamed:
+        monkeypatch.setattr(delimited, "supported_formats", ())
+        monkeypatch.setattr(jsonformat, "supported_formats", ())
+    cli.formatter.format_name = table_format
+
+    with open(tmp_path / "out", "w") as out:
+        monkeypatch.setattr(sys, "stdout", out)
+        benchmark(cli.run_query, "SELECT")
+
+
+@pytest.mark.parametrize("pager", [False, True], ids=["no pager", "pager"])
+def test_output_sinks(benchmark, monkeypatch, tmp_path, cli, pager):
+    """Write preformatted lines through IRISSqlCli.output to the terminal or
+    pager, the audit log and the tee and once files."""
+    lines = ["| %6d | %-60s |" % (i, "value %d" % i) for i in range(10000)]
+    monkeypatch.setattr(click, "secho", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        click, "echo_via_pager", lambda text, *args, **kwargs: sum(1 for _ in text)
+    )
+    pager_enabled = special.is_pager_enabled()
+    special.set_pager_enabled(pager)
+    iocommands.set_tee("-o %s" % (tmp_path / "tee.txt"))
+
+    def run():
+        iocommands.set_once("-o %s" % (tmp_path / "once.txt"))
+        cli.output(lines, "10000 rows in set")
+
+    try:
+        with open(tmp_path / "audit.log", "w") as cli.logfile:
+            benchmark(run)
+    finally:
+        special.close_tee()
+        special.set_pager_enabled(pager_enabled)
+
+
+@pytest.mark.parametrize("background", [False, True], ids=["file", "background"])
+def test_output_audit_log(benchmark, monkeypatch, tmp_path, cli, background):
+    """Write preformatted lines through IRISSqlCli.output with the audit log
+    enabled, written directly or by the background writer, for the time the
+    output of one result takes."""
+    from irissqlcli.auditlog import AuditLog
+
+    lines = ["| %6d | %-60s |" % (i, "value %d" % i) for i in range(10000)]
+    monkeypatch.setattr(click, "secho", lambda *args, **kwargs: None)
+    pager_enabled = special.is_pager_enabled()
+    special.set_pager_enabled(False)
+    if background:
+        cli.logfile = AuditLog(str(tmp_path / "audit.log"))
+    else:
+        cli.logfile = open(tmp_path / "audit.log", "a", encoding="utf-8")
+
+    try:
+        # The log is written between the rounds, as between two queries
+        benchmark.pedantic(
+            cli.output,
+            (lines, "10000 rows in set"),
+            setup=cli.logfile.flush,
+            rounds=200,
+        )
+    finally:
+        cli.logfile.close()
+        special.set_pager_enabled(pager_enabled)
+
+
+def test_vertical_first_record(benchmark, cli):
+    """Run a query ending with \\G returning 100k rows, up to its first
+    record."""
+    fake_iris.add_table(
+        cli.sqlexecute.conn, "SQLUser", "items", ROW_HEADERS, make_rows(100000)
+    )
+
+    def run():
+        output, _ = cli._evaluate_command("SELECT * FROM items\\G")
+        return next(iter(output))
+
+    assert benchmark(run).endswith("[ RECORD 1 ]-------------------------")
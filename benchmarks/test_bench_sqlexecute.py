@@ -0,0 +1,32 @@
+import fake_iris
+from sample_data import ROW_HEADERS, make_rows
+
+
+def make_script(count):
+    lines = []
+    for i in range(count):
+        if i % 10 == 0:
+            lines.append("-- batch %d" % (i // 10))
+        lines.append(
+            "INSERT INTO items VALUES (%d, 'name; %d', %d.5, NULL, NULL);" % (i, i, i)
+        )
+    return "\n".join(lines)
+
+
+def test_run_splitting(benchmark, executor):
+    """Split and run a script of 1000 small statements."""
+    fake_iris.add_table(executor.conn, "SQLUser", "items", ROW_HEADERS)
+    script = make_script(1000)
+
+    results = benchmark(lambda: list(executor.run(script)))
+    assert len(results) == 1000
+
+
+def test_run_fetch(benchmark, executor):
+    """Run a single query returning 100k rows."""
+    fake_iris.add_table(
+        executor.conn, "SQLUser", "items", ROW_HEADERS, make_rows(100000)
+    )
+
+    results = benchmark(lambda: list(executor.run("SELECT * FROM items")))
+    assert len(results[0][1]) == 100000
@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SCRIPT = "import fake_iris; fake_iris.install(); import irissqlcli.main"
+
+
+def test_import_time(benchmark):
+    """Time of a fresh interpreter importing the CLI, the start up cost
+    before any connection is made."""
+    env = dict(os.environ, PYTHONPATH=BENCHMARKS_DIR)
+
+    def run():
+        subprocess.check_call([sys.executable, "-c", IMPORT_SCRIPT], env=env)
+
+    benchmark.pedantic(run, rounds=10, warmup_rounds=1)
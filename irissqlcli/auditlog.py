@@ -0,0 +1,167 @@
+"""Audit log of the output, written by a background thread.
+
+The output is put in a bounded queue and a writer thread appends it to the
+log file in batches, so a query does not wait for the disk. Writes only
+block when the queue is full, nothing is dropped. The log is gzip compressed
+when its name ends with .gz, and rotated once it reaches a maximum size.
+What is queued is written when the log is closed, at the latest on exit.
+Should the writer thread fail, it writes what is still queued and stops, the
+following writes are made synchronously, in order.
+"""
+
+import atexit
+import gzip
+import logging
+import os
+import queue
+import threading
+
+from .config import ensure_dir_exists
+
+_logger = logging.getLogger(__name__)
+
+# Number of writes waiting for the writer thread before write blocks
+QUEUE_SIZE = 256
+
+# Stops the writer thread
+_CLOSE = object()
+
+
+class AuditLog(object):
+    """Appends text to *path* from a writer thread.
+
+    When *max_bytes* is set, the log is rotated once its file reaches that
+    size: it is renamed to path.1 (audit.1.gz for audit.gz), the previous
+    ones to path.2 and so on, and the ones past *backup_count* are deleted.
+    The file is opened right away, OSError if it can't be.
+    """
+
+    def __init__(self, path, max_bytes=0, backup_count=5, queue_size=QUEUE_SIZE):
+        self.path = os.path.expanduser(path)
+        self.compress = self.path.endswith(".gz")
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = None
+        self._open()
+        self._queue = queue.Queue(queue_size)
+        self._closed = False
+        self._failed = False
+        # Held by the synchronous writes, once the writer thread failed
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="audit_log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, text):
+        """Queues *text* to be appended to the log."""
+        if self._closed or self._failed:
+            with self._lock:
+                self._drain()
+                self._write_now([text])
+        else:
+            self._queue.put(text)
+            # Queued as the writer thread failed
+            if self._failed:
+                with self._lock:
+                    self._drain()
+
+    def flush(self):
+        """Waits until the queued text is written."""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        """Writes the queued text and closes the log."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if not self._failed:
+            self._queue.put(_CLOSE)
+        self._thread.join()
+        self._close_file()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write([text for text in batch if text is not _CLOSE])
+            except Exception as e:
+                _logger.error("Audit log %r writer failed: %r", self.path, e)
+                self._failed = True
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if self._failed:
+                with self._lock:
+                    self._drain()
+                return
+            if _CLOSE in batch:
+                return
+
+    def _drain(self):
+        # Writes what is left in the queue, with the lock held
+        texts = []
+        while True:
+            try:
+                texts.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            self._write_now([text for text in texts if text is not _CLOSE])
+        finally:
+            for _ in texts:
+                self._queue.task_done()
+
+    def _write_now(self, texts):
+        try:
+            self._write(texts)
+        except Exception as e:
+            _logger.error("Unable to write audit log %r: %r", self.path, e)
+
+    def _write(self, texts):
+        if not texts:
+            return
+        try:
+            if self._file is None:
+                self._open()
+            # Lone surrogates, like in a pasted query, are escaped
+            self._file.write("".join(texts).encode("utf-8", "backslashreplace"))
+            self._file.flush()
+            if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+        except (IOError, OSError) as e:
+            _logger.error("Unable to write audit log %r: %r", self.path, e)
+
+    def _open(self):
+        ensure_dir_exists(self.path)
+        if self.compress:
+            self._file = gzip.open(self.path, "ab")
+        else:
+            self._file = open(self.path, "ab")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _backup_name(self, n):
+        if self.compress:
+            return "%s.%d.gz" % (self.path[:-3], n)
+        return "%s.%d" % (self.path, n)
+
+    def _rotate(self):
+        self._close_file()
+        if self.backup_count:
+            for n in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(self._backup_name(n)):
+                    os.replace(self._backup_name(n), self._backup_name(n + 1))
+            os.replace(self.path, self._backup_name(1))
+        else:
+            os.remove(self.path)
+        self._open()
@@ -0,0 +1,141 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+_logger = logging.getLogger(__name__)
+
+BENCH_USAGE = "\\bench [-w warmup] [-c concurrency] count query"
+
+
+def parse_bench_args(arg):
+    """Parse the arguments of the \\bench command.
+
+    Returns tuple (count, warmup, concurrency, query).
+
+    >>> parse_bench_args("10 select 1")
+    (10, 0, 1, 'select 1')
+    >>> parse_bench_args("-w 2 -c 4 100 select * from t")
+    (100, 2, 4, 'select * from t')
+    >>> parse_bench_args("select 1")
+    Traceback (most recent call last):
+    ...
+    ValueError: Usage: \\bench [-w warmup] [-c concurrency] count query
+    """
+    options = {"-w": 0, "-c": 1}
+    tokens = arg.split(None, 1)
+    try:
+        while tokens and tokens[0] in options:
+            value, _, rest = tokens[1].partition(" ")
+            options[tokens[0]] = int(value)
+            tokens = rest.split(None, 1)
+        count, query = int(tokens[0]), tokens[1].strip()
+    except (IndexError, ValueError):
+        raise ValueError("Usage: " + BENCH_USAGE)
+
+    if count < 1 or options["-w"] < 0 or options["-c"] < 1 or not query:
+        raise ValueError("Usage: " + BENCH_USAGE)
+    return count, options["-w"], options["-c"], query
+
+
+def percentile(values, pct):
+    """Return the *pct* percentile of the sorted list *values*, interpolating
+    linearly between the closest ranks.
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2.5
+    >>> percentile([1, 2, 3, 4], 100)
+    4
+    >>> percentile([5], 99)
+    5
+    """
+    if not values:
+        return None
+    rank = (len(values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    if low == high:
+        return values[low]
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def _run_iterations(executor, sql, count):
+    samples = []
+    for _ in range(count):
+        cursor, _ = executor.execute_timed(sql)
+        cursor.close()
+        samples.append(executor.last_stats)
+    return samples
+
+
+def run_benchmark(executor, sql, count, warmup=0, concurrency=1):
+    """Run *sql* *count* times, spread over *concurrency* connections.
+
+    The first connection is *executor* itself, additional ones are clones of
+    it. Every connection runs *warmup* untimed iterations first.
+
+    Returns tuple (samples, wall_time) with the QueryStats of each timed
+    iteration and the elapsed time of the timed phase.
+    """
+    executors = [executor]
+    counts = [
+        count // concurrency + (1 if i < count % concurrency else 0)
+        for i in range(concurrency)
+    ]
+    measure_bytes = executor.measure_bytes
+    try:
+        for _ in range(concurrency - 1):
+            executors.append(executor.clone())
+        for e in executors:
+            e.measure_bytes = True
+            _run_iterations(e, sql, warmup)
+
+        _logger.debug("bench: %r x %d on %d connections", sql, count, concurrency)
+        start = time()
+        if concurrency == 1:
+            results = [_run_iterations(executor, sql, count)]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(
+                    pool.map(_run_iterations, executors, [sql] * concurrency, counts)
+                )
+        wall_time = time() - start
+    finally:
+        executor.measure_bytes = measure_bytes
+        for e in executors[1:]:
+            e.close()
+
+    return [s for samples in results for s in samples], wall_time
+
+
+def summarize(samples, wall_time):
+    """Build the (rows, headers) of the \\bench report."""
+    latencies = sorted(s.execute_time + s.fetch_time for s in samples)
+    rows = sum(s.rowcount for s in samples)
+    size = sum(s.bytes or 0 for s in samples)
+
+    def ms(value):
+        return "%0.3f" % (value * 1000)
+
+    headers = [
+        "runs",
+        "min ms",
+        "median ms",
+        "p95 ms",
+        "p99 ms",
+        "max ms",
+        "rows/s",
+        "bytes",
+    ]
+    result = [
+        (
+            len(latencies),
+            ms(latencies[0]),
+            ms(percentile(latencies, 50)),
+            ms(percentile(latencies, 95)),
+            ms(percentile(latencies, 99)),
+            ms(latencies[-1]),
+            "%0.1f" % (rows / wall_time if wall_time else 0),
+            size,
+        )
+    ]
+    return result, headers
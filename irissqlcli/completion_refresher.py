@@ -3,7 +3,6 @@ from .packages.special.main import COMMANDS
 from collections import OrderedDict
 
 from .sqlcompleter import SQLCompleter
-from .sqlexecute import SQLExecute
 
 
 class CompletionRefresher(object):
@@ -14,7 +13,7 @@ class CompletionRefresher(object):
         self._completer_thread = None
         self._restart_refresh = threading.Event()
 
-    def refresh(self, executor, callbacks, completer_options=None):
+    def refresh(self, executor, callbacks, completer_options=None, history=None):
 
         """Creates a SQLCompleter object and populates it with the relevant
         completion suggestions in a background thread.
@@ -25,6 +24,8 @@ class CompletionRefresher(object):
                     has completed the refresh. The newly created completion
                     object will be passed in as an argument to each callback.
         completer_options - dict of options to pass to SQLCompleter.
+        history - iterable of executed queries whose names and keywords rank
+                  the completions, iterated in the background thread.
 
         """
         if completer_options is None:
@@ -36,7 +37,7 @@ class CompletionRefresher(object):
         else:
             self._completer_thread = threading.Thread(
                 target=self._bg_refresh,
-                args=(executor, callbacks, completer_options),
+                args=(executor, callbacks, completer_options, history),
                 name="completion_refresh",
             )
             self._completer_thread.setDaemon(True)
@@ -53,40 +54,37 @@ class CompletionRefresher(object):
     def is_refreshing(self):
         return self._completer_thread and self._completer_thread.is_alive()
 
-    def _bg_refresh(self, sqlexecute, callbacks, completer_options):
+    def _bg_refresh(self, sqlexecute, callbacks, completer_options, history=None):
         completer = SQLCompleter(**completer_options)
 
-        e = sqlexecute
         # Create a new sqlexecute method to populate the completions.
-        executor = SQLExecute(
-            hostname=e.hostname,
-            port=e.port,
-            namespace=e.namespace,
-            username=e.username,
-            password=e.password,
-            embedded=e.embedded,
-            sslcontext=e.sslcontext,
-            **e.extra_params,
-        )
+        executor = sqlexecute.clone()
 
         # If callbacks is a single function then push it into a list.
         if callable(callbacks):
             callbacks = [callbacks]
 
-        while 1:
-            for refresher in self.refreshers.values():
-                refresher(completer, executor)
-                if self._restart_refresh.is_set():
-                    self._restart_refresh.clear()
+        try:
+            while 1:
+                for refresher in self.refreshers.values():
+                    refresher(completer, executor)
+                    if self._restart_refresh.is_set():
+                        self._restart_refresh.clear()
+                        break
+                else:
+                    # Break out of while loop if the for loop finishes
+                    # naturally without hitting the break statement.
                     break
-            else:
-                # Break out of while loop if the for loop finishes naturally
-                # without hitting the break statement.
-                break
 
-            # Start over the refresh from the beginning if the for loop hit the
-            # break statement.
-            continue
+                # Start over the refresh from the beginning if the for loop
+                # hit the break statement.
+                continue
+        finally:
+            executor.close()
+
+        if history:
+            for text in history:
+                completer.extend_query_history(text)
 
         for callback in callbacks:
             callback(completer)
@@ -120,6 +118,14 @@ def refresh_tables(completer, executor):
     completer.extend_columns(executor.table_columns(), kind="tables")
 
 
+@refresher("indexes")
+def refresh_indexes(completer, executor):
+    # Index the objects of the default schema now rather than on the first
+    # keystroke, it takes seconds on large catalogs.
+    completer.schema_objects_index(None, "schemas", background=False)
+    completer.schema_objects_index("SQLUser", "tables", background=False)
+
+
 # @refresher("functions")
 # def refresh_functions(completer, executor):
 #     completer.extend_functions(executor.functions())
@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+from bisect import bisect_left
+
+from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
+from prompt_toolkit.history import FileHistory, ThreadedHistory
+
+_logger = logging.getLogger(__name__)
+
+
+class PrefixIndex(object):
+    """Finds the most recent history line starting with a prefix without
+    scanning the whole history.
+
+    Lines are kept sorted, so the lines sharing a prefix form a contiguous
+    range, together with their recency and the most recent line of each
+    block of `block_size` lines. Lines added after the index was built are
+    kept apart and searched first, the index is rebuilt once there are more
+    than `max_recent` of them.
+    """
+
+    block_size = 256
+    max_recent = 1000
+
+    def __init__(self):
+        self._rank = {}
+        self._count = 0
+        self._recent = []
+        self._data = ([], [], [], [])
+        self._lock = threading.Lock()
+
+    def load(self, strings):
+        """Index the *strings* loaded from the history file, oldest first.
+        They are older than any line added in this session."""
+        lines = [line for string in strings for line in string.splitlines()]
+        with self._lock:
+            for rank, line in enumerate(lines, -len(lines)):
+                if self._rank.get(line, rank) <= rank:
+                    self._rank[line] = rank
+            self._reindex()
+
+    def add(self, string):
+        with self._lock:
+            for line in string.splitlines():
+                self._count += 1
+                self._rank[line] = self._count
+                self._recent.append(line)
+            if len(self._recent) > self.max_recent:
+                self._reindex()
+
+    def _reindex(self):
+        lines = sorted(self._rank)
+        ranks = [self._rank[line] for line in lines]
+        block_max, block_argmax = [], []
+        for start in range(0, len(lines), self.block_size):
+            block = ranks[start : start + self.block_size]
+            best = max(range(len(block)), key=block.__getitem__)
+            block_max.append(block[best])
+            block_argmax.append(start + best)
+        self._data = (lines, ranks, block_max, block_argmax)
+        self._recent = []
+
+    def suggest(self, prefix):
+        """Returns the most recent line starting with *prefix*, or None.
+
+        >>> index = PrefixIndex()
+        >>> index.load(["select * from a", "select 1", "select * from b"])
+        >>> index.suggest("select *")
+        'select * from b'
+        >>> index.add("select * from a")
+        >>> index.suggest("select *")
+        'select * from a'
+        >>> index.suggest("update") is None
+        True
+        """
+        for line in reversed(self._recent):
+            if line.startswith(prefix):
+                return line
+
+        lines, ranks, block_max, block_argmax = self._data
+        lo = bisect_left(lines, prefix)
+        hi = bisect_left(lines, prefix + "\U0010ffff", lo)
+        if lo >= hi:
+            return None
+
+        size = self.block_size
+        best = lo
+        i = lo
+        while i < hi:
+            if i % size == 0 and i + size <= hi:
+                if block_max[i // size] > ranks[best]:
+                    best = block_argmax[i // size]
+                i += size
+            else:
+                if ranks[i] > ranks[best]:
+                    best = i
+                i += 1
+        return lines[best]
+
+
+class CompactingFileHistory(FileHistory):
+    """FileHistory that skips duplicate entries when loading and rewrites the
+    file without them once they make up more than `compact_ratio` of it. The
+    loaded entries feed *index*."""
+
+    compact_ratio = 0.1
+    compact_min_duplicates = 100
+
+    def __init__(self, filename, index):
+        super().__init__(filename)
+        self.index = index
+        self._lock = threading.Lock()
+
+    def _read_entries(self):
+        """Returns the list of (header, string) entries in the file."""
+        entries = []
+        header, lines = None, []
+
+        def add():
+            if lines:
+                entries.append((header, "".join(lines)[:-1]))
+
+        with open(self.filename, "rb") as f:
+            for line_bytes in f:
+                line = line_bytes.decode("utf-8", errors="replace")
+                if line.startswith("+"):
+                    lines.append(line[1:])
+                else:
+                    add()
+                    lines = []
+                    if line.startswith("#"):
+                        header = line
+            add()
+        return entries
+
+    def _write_entries(self, entries):
+        tmp_filename = "%s.tmp" % self.filename
+        with open(tmp_filename, "wb") as f:
+            for header, string in entries:
+                f.write(("\n" + (header or "# \n")).encode("utf-8"))
+                for line in string.split("\n"):
+                    f.write(("+%s\n" % line).encode("utf-8"))
+        os.replace(tmp_filename, self.filename)
+
+    def load_history_strings(self):
+        if not os.path.exists(self.filename):
+            return []
+
+        with self._lock:
+            entries = self._read_entries()
+            seen = set()
+            unique = []
+            for header, string in reversed(entries):
+                if string not in seen:
+                    seen.add(string)
+                    unique.append((header, string))
+            unique.reverse()
+
+            duplicates = len(entries) - len(unique)
+            if duplicates >= max(
+                self.compact_min_duplicates, len(entries) * self.compact_ratio
+            ):
+                _logger.debug(
+                    "Compacting %r, %d duplicate entries", self.filename, duplicates
+                )
+                try:
+                    self._write_entries(unique)
+                except (IOError, OSError) as e:
+                    _logger.error("Unable to compact %r: %r", self.filename, e)
+
+        strings = [string for _, string in unique]
+        self.index.load(strings)
+        return reversed(strings)
+
+    def store_string(self, string):
+        with self._lock:
+            super().store_string(string)
+        self.index.add(string)
+
+
+class IndexedFileHistory(ThreadedHistory):
+    """File history loaded in a background thread, deduplicated, with a
+    PrefixIndex of its lines for IndexedAutoSuggest."""
+
+    def __init__(self, filename):
+        self.index = PrefixIndex()
+        super().__init__(CompactingFileHistory(filename, self.index))
+
+
+class IndexedAutoSuggest(AutoSuggest):
+    """Suggest the most recent history line starting with the current line,
+    like AutoSuggestFromHistory, using the PrefixIndex of an
+    IndexedFileHistory."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def get_suggestion(self, buffer, document):
+        # Consider only the last line for the suggestion.
+        text = document.text.rsplit("\n", 1)[-1]
+
+        if text.strip():
+            line = self.index.suggest(text)
+            if line is not None:
+                return Suggestion(line[len(text) :])
+        return None
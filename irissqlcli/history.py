@@ -0,0 +1,215 @@
+import datetime as dt
+import logging
+import sqlite3
+import threading
+from time import time
+
+from .config import ensure_dir_exists
+
+_logger = logging.getLogger(__name__)
+
+HISTORY_USAGE = "\\history [slowest] [count] [today|week] [failed] [^prefix|text]"
+
+
+def parse_history_args(arg):
+    """Parse the filters of the \\history command into keyword arguments for
+    QueryHistoryStore.search.
+
+    >>> parse_history_args("slowest 20 today")["order"]
+    'slowest'
+    >>> parse_history_args("slowest 20 today")["limit"]
+    20
+    >>> parse_history_args("failed ^select")["prefix"]
+    'select'
+    >>> parse_history_args("orders by date")["text"]
+    'orders by date'
+    """
+    kwargs = {"order": "recent", "limit": 20}
+    words = arg.split()
+    while words:
+        word = words[0].lower()
+        if word in ("slowest", "recent"):
+            kwargs["order"] = word
+        elif word.isdigit():
+            kwargs["limit"] = int(word)
+        elif word == "today":
+            midnight = dt.datetime.combine(dt.date.today(), dt.time())
+            kwargs["since"] = midnight.timestamp()
+        elif word == "week":
+            kwargs["since"] = time() - 7 * 24 * 3600
+        elif word == "failed":
+            kwargs["successful"] = False
+        else:
+            break
+        words.pop(0)
+
+    text = " ".join(words)
+    if text.startswith("^"):
+        kwargs["prefix"] = text[1:]
+    elif text:
+        kwargs["text"] = text
+    return kwargs
+
+
+class QueryHistoryStore(object):
+    """Persistent store of the executed queries, kept in a SQLite database.
+
+    The database is opened on first use. Queries are indexed by start time,
+    duration and text, and by an FTS5 full-text index when SQLite supports it.
+    """
+
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY,
+            query TEXT NOT NULL,
+            started REAL NOT NULL,
+            successful INTEGER NOT NULL,
+            total_time REAL,
+            execution_time REAL,
+            rowcount INTEGER,
+            namespace TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS history_started ON history (started)",
+        "CREATE INDEX IF NOT EXISTS history_total_time ON history (total_time)",
+        "CREATE INDEX IF NOT EXISTS history_query ON history (query)",
+    )
+
+    fts_schema = (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+        USING fts5(query, content='history', content_rowid='id')
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history
+        BEGIN
+            INSERT INTO history_fts (rowid, query) VALUES (new.id, new.query);
+        END
+        """,
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self.fts = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                ensure_dir_exists(self.path)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            try:
+                for statement in self.fts_schema:
+                    conn.execute(statement)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                _logger.debug("Full-text search disabled: %r", e)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def add(self, query, namespace=None, started=None):
+        """Record the MetaQuery *query*."""
+        if not query.query or not query.query.strip():
+            return
+        if started is None:
+            started = time() - query.total_time
+        with self._lock:
+            try:
+                conn = self.connect()
+                conn.execute(
+                    "INSERT INTO history (query, started, successful, total_time,"
+                    " execution_time, rowcount, namespace)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        query.query.strip(),
+                        started,
+                        bool(query.successful),
+                        query.total_time,
+                        query.execution_time,
+                        query.rowcount,
+                        namespace,
+                    ),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                _logger.error("Unable to save query history: %r", e)
+
+    def search(
+        self,
+        text=None,
+        prefix=None,
+        since=None,
+        successful=None,
+        order="recent",
+        limit=20,
+    ):
+        """Returns (id, started, successful, total_time, rowcount, namespace,
+        query) tuples matching the filters."""
+        where, params = [], []
+        if text:
+            if self.fts:
+                where.append(
+                    "id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)"
+                )
+                params.append(
+                    " ".join('"%s"' % word.replace('"', '""') for word in text.split())
+                )
+            else:
+                where.append("query LIKE ?")
+                params.append("%" + text + "%")
+        if prefix:
+            where.append("query >= ? AND query < ?")
+            params.extend([prefix, prefix + "\uffff"])
+        if since is not None:
+            where.append("started >= ?")
+            params.append(since)
+        if successful is not None:
+            where.append("successful = ?")
+            params.append(bool(successful))
+
+        sql = (
+            "SELECT id, started, successful, total_time, rowcount, namespace, query"
+            " FROM history"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY " + ("total_time DESC" if order == "slowest" else "id DESC")
+        sql += " LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            conn = self.connect()
+            return conn.execute(sql, params).fetchall()
+
+    def recent_queries(self, namespace=None, limit=1000):
+        """Yields the text of the last *limit* successful queries run in
+        *namespace*, oldest first."""
+        sql = "SELECT query FROM history WHERE successful = 1"
+        params = []
+        if namespace is not None:
+            sql += " AND namespace = ?"
+            params.append(namespace)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            try:
+                rows = self.connect().execute(sql, params).fetchall()
+            except sqlite3.Error as e:
+                _logger.error("Unable to read query history: %r", e)
+                rows = []
+        for (query,) in reversed(rows):
+            yield query
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,160 @@
+"""Stream (LOB) values of result sets, kept out of memory.
+
+The DB-API returns the content of %Stream columns with each row. As the rows
+are fetched, the stream values are moved to a temporary spool file and
+replaced by a `LobHandle`, which reads them back on demand. Only the start
+of a value is read for display, and `export` copies a whole value to a file
+in chunks.
+"""
+
+import codecs
+import tempfile
+
+from cli_helpers.utils import bytes_to_string
+
+EXPORT_USAGE = "\\export [row column] filename"
+
+# Type codes of the stream columns in cursor.description, the
+# LONGVARCHAR, WLONGVARCHAR and LONGVARBINARY values of iris.dbapi.SQLType
+LOB_TYPE_CODES = {-1, -10, -4}
+
+# Number of rows fetched at once from a result with stream columns
+FETCH_BATCH_SIZE = 10
+
+# Size of the chunks copied by export
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes per character read at most for a text prefix, in UTF-8
+_MAX_CHAR_BYTES = 4
+
+
+class LobSpool(object):
+    """A temporary file holding the stream values of one result set. It is
+    deleted once the spool and its handles are gone."""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+
+    def add(self, value):
+        """Moves *value*, str or bytes, to the spool and returns its
+        handle."""
+        is_text = isinstance(value, str)
+        data = value.encode("utf-8") if is_text else bytes(value)
+        self.file.seek(self.size)
+        self.file.write(data)
+        handle = LobHandle(self, self.size, len(data), is_text)
+        self.size += len(data)
+        return handle
+
+    def read_bytes(self, offset, size):
+        self.file.seek(offset)
+        return self.file.read(size)
+
+
+class LobHandle(object):
+    """A stream value in a `LobSpool`. Like a file, read() returns str for
+    text and bytes for binary values, from the position set by seek().
+
+    >>> spool = LobSpool()
+    >>> handle = spool.add("naïve text")
+    >>> handle.read(5), handle.read(3), len(handle)
+    ('naïve', ' te', 11)
+    >>> handle.seek(0)
+    >>> str(handle)
+    'naïve text'
+    """
+
+    def __init__(self, spool, offset, length, is_text):
+        self.spool = spool
+        self.offset = offset
+        self.length = length
+        self.is_text = is_text
+        self.position = 0
+
+    def __len__(self):
+        """The size of the value in bytes."""
+        return self.length
+
+    def __str__(self):
+        data = self.spool.read_bytes(self.offset, self.length)
+        return data.decode("utf-8") if self.is_text else bytes_to_string(data)
+
+    def __repr__(self):
+        return "<LobHandle %d bytes>" % self.length
+
+    def seek(self, position):
+        """Moves to the *position*, in bytes."""
+        self.position = position
+
+    def read(self, size=-1):
+        """Reads *size* characters, or bytes for binary values, all the
+        remaining ones when negative."""
+        remaining = self.length - self.position
+        if size < 0 or not self.is_text:
+            count = remaining if size < 0 else min(size, remaining)
+            data = self.spool.read_bytes(self.offset + self.position, count)
+            self.position += len(data)
+            return data.decode("utf-8") if self.is_text else data
+
+        # At most 4 bytes per character, a character cut at the end is left
+        # for the next read
+        data = self.spool.read_bytes(
+            self.offset + self.position, min(size * _MAX_CHAR_BYTES, remaining)
+        )
+        text = codecs.getincrementaldecoder("utf-8")().decode(data)[:size]
+        self.position += len(text.encode("utf-8"))
+        return text
+
+    def copy_to(self, out):
+        """Writes the value to the binary file *out*, returns the number of
+        bytes written."""
+        for start in range(0, self.length, CHUNK_SIZE):
+            out.write(
+                self.spool.read_bytes(
+                    self.offset + start, min(CHUNK_SIZE, self.length - start)
+                )
+            )
+        return self.length
+
+
+def lob_columns(description):
+    """The positions of the stream columns of a cursor *description*."""
+    return [
+        i for i, column in enumerate(description or ()) if column[1] in LOB_TYPE_CODES
+    ]
+
+
+def spooled(rows, spool, columns):
+    """Yields the *rows*, the values of the stream *columns* moved to
+    *spool*."""
+    for row in rows:
+        row = list(row)
+        for i in columns:
+            if isinstance(row[i], (str, bytes, bytearray)):
+                row[i] = spool.add(row[i])
+        yield tuple(row)
+
+
+def fetch_spooled(cursor, columns):
+    """Fetches all the rows of *cursor*, the values of the stream *columns*
+    replaced by handles in a new spool."""
+    spool = LobSpool()
+    rows = []
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not batch:
+            break
+        rows.extend(spooled(batch, spool, columns))
+    return rows
+
+
+def export(value, out):
+    """Writes the whole *value*, a handle or a plain value, to the binary file
+    *out*. Returns the number of bytes written."""
+    if isinstance(value, LobHandle):
+        return value.copy_to(out)
+    if not isinstance(value, (bytes, bytearray)):
+        value = str(value).encode("utf-8")
+    out.write(value)
+    return len(value)
@@ -1,4 +1,6 @@
 from .main import IRISSqlCli
+from .packages import arrowtable
+from .sqlexecute import RowStream
 import sql.parse
 import sql.connection
 import logging
@@ -52,5 +54,39 @@ def irissqlcli_line_magic(line):
         _logger.debug("Dangerous query detected -- ignoring")
         return
 
+    if irissqlcli.magic_result != "resultset":
+        try:
+            return fetch_result(irissqlcli, q.query)
+        except ImportError as e:
+            _logger.debug("Returning a resultset: %r", e)
+
     ipython = get_ipython()
     return ipython.run_cell_magic("sql", line, q.query)
+
+
+def fetch_result(irissqlcli, query):
+    """Runs *query* again on the connection of *irissqlcli*, returns the
+    result of its last statement as a DataFrame, or a pyarrow Table when
+    magic_result is arrow. The rows are fetched and converted in batches."""
+    # Before the query is run again
+    import pyarrow  # noqa: F401
+
+    if irissqlcli.magic_result != "arrow":
+        import pandas  # noqa: F401
+
+    rows = headers = None
+    for result in irissqlcli.sqlexecute.run(query, stream=True):
+        title, rows, headers, status, sql, success, is_special = result
+        if isinstance(status, Exception):
+            raise status
+    if headers is None:
+        return None
+
+    if isinstance(rows, RowStream):
+        # Fetched directly, without spooling the streams
+        batches = arrowtable.fetch_batches(rows.cursor)
+    else:
+        batches = [rows]
+    if irissqlcli.magic_result == "arrow":
+        return arrowtable.to_arrow(batches, headers)
+    return arrowtable.to_pandas(batches, headers)
@@ -6,7 +6,6 @@ import os
 import platform
 import re
 import sys
-import ssl
 import shutil
 import threading
 import traceback
@@ -15,44 +14,43 @@ from time import time
 from getpass import getuser
 
 import click
-import pendulum
 from cli_helpers.tabular_output import TabularOutputFormatter
-from cli_helpers.tabular_output.preprocessors import align_decimals, format_numbers
 from cli_helpers.utils import strip_ansi
 import iris
-from prompt_toolkit.completion import DynamicCompleter, ThreadedCompleter
-from prompt_toolkit.document import Document
-from prompt_toolkit.enums import DEFAULT_BUFFER, EditingMode
-from prompt_toolkit.filters import HasFocus, IsDone
-from prompt_toolkit.formatted_text import ANSI
-from prompt_toolkit.history import FileHistory
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.layout.processors import (
-    ConditionalProcessor,
-    HighlightMatchingBracketProcessor,
-    TabsProcessor,
-)
-from prompt_toolkit.lexers import PygmentsLexer
-from prompt_toolkit.shortcuts import CompleteStyle, PromptSession
 
-from irissqlcli.completion_refresher import CompletionRefresher
+# The interactive stack (prompt_toolkit, the completer, pendulum) is imported
+# where it is used, so that --execute and piped batch mode start quickly.
+
 from irissqlcli.utils import parse_uri
 
 from .__init__ import __version__
-from .clitoolbar import create_toolbar_tokens_func
+from .auditlog import AuditLog
+from .benchmark import BENCH_USAGE, parse_bench_args, run_benchmark, summarize
+from .history import HISTORY_USAGE, QueryHistoryStore, parse_history_args
 from .config import config_location, get_config, ensure_dir_exists
-from .key_bindings import irissqlcli_bindings
-from .lexer import IRISSqlLexer
-from .sqlcompleter import SQLCompleter
-from .sqlexecute import SQLExecute
-from .style import style_factory, style_factory_output
+from .lobs import EXPORT_USAGE, export
+from .sqlexecute import CatalogFilter, RowStream, SQLExecute
+from .slowlog import SlowQueryLog
+from .style import style_factory_output
+from .packages.compressedfile import CompressedFile, open_output
 from .packages.encodingutils import utf8tounicode, text_type
-from .packages import special
+from .packages.formatplan import EXPAND_USAGE, FormatPlan, column_types
+from .packages import (
+    completion_profiler,
+    delimited,
+    jsonformat,
+    sinks,
+    special,
+    vertical,
+)
+from .packages.completion_profiler import KEYSTROKES_USAGE
 from .packages.special import NO_QUERY
 from .packages.prompt_utils import confirm, confirm_destructive_query
 
 COLOR_CODE_REGEX = re.compile(r"\x1b(\[.*?[@-~]|\].*?(\x07|\x1b\\))")
 DEFAULT_MAX_FIELD_WIDTH = 500
+# Seconds the banner waits for the server version looked up in the background
+SERVER_VERSION_TIMEOUT = 2
 
 # Query tuples are used for maintaining history
 MetaQuery = namedtuple(
@@ -67,9 +65,11 @@ MetaQuery = namedtuple(
         "path_changed",  # True if any subquery changed the search path
         "mutated",  # True if any subquery executed insert/update/delete
         "is_special",  # True if the query is a special command
+        "rowcount",  # Number of rows fetched or affected by the subqueries
+        "streamed",  # True if the rows of the last subquery were streamed
     ],
 )
-MetaQuery.__new__.__defaults__ = ("", False, 0, 0, False, False, False, False)
+MetaQuery.__new__.__defaults__ = ("", False, 0, 0, False, False, False, False, 0, False)
 
 
 class IRISSQLCliQuitError(Exception):
@@ -93,10 +93,18 @@ class IRISSqlCli(object):
         self.force_passwd_prompt = force_passwd_prompt
         self.quiet = quiet
         self.sqlexecute = sqlexecute
-        self.logfile = logfile
 
         c = self.config = get_config(irissqlclirc)
 
+        # The --logfile audit log, written in the background
+        self.logfile = None
+        if logfile:
+            self.logfile = AuditLog(
+                logfile,
+                max_bytes=c["main"].as_int("audit_log_max_size") * 1024 * 1024,
+                backup_count=c["main"].as_int("audit_log_backups"),
+            )
+
         self.output_file = None
 
         self.multi_line = c["main"].as_bool("multi_line")
@@ -107,19 +115,34 @@ class IRISSqlCli(object):
 
         self.key_bindings = c["main"]["key_bindings"]
         self.table_format = c["main"]["table_format"]
+        for format_name in jsonformat.supported_formats:
+            TabularOutputFormatter.register_new_formatter(
+                format_name, jsonformat.adapter, kwargs={"format_name": format_name}
+            )
         self.formatter = TabularOutputFormatter(format_name=c["main"]["table_format"])
         self.syntax_style = c["main"]["syntax_style"]
         self.less_chatty = c["main"].as_bool("less_chatty")
+        self.null_string = c["main"].get("null_string", "<null>")
+        self.max_field_width = int(
+            c["main"].get("max_field_width", DEFAULT_MAX_FIELD_WIDTH)
+        )
+        self.max_field_widths = {
+            column.lower(): int(width)
+            for column, width in c.get("max_field_widths", {}).items()
+        }
+        # The plan of the last result set shown, for \expand
+        self.last_plan = None
         self.show_bottom_toolbar = (
             False
             if isinstance(sys.stdout, ISC_StdoutTypeWrapper)
             else c["main"].as_bool("show_bottom_toolbar")
         )
         self.cli_style = c["colors"]
-        self.style_output = style_factory_output(self.syntax_style, self.cli_style)
+        self._style_output = None
         self.wider_completion_menu = c["main"].as_bool("wider_completion_menu")
         self.autocompletion = c["main"].as_bool("autocompletion")
         self.login_path_as_host = c["main"].as_bool("login_path_as_host")
+        self.magic_result = c["main"]["magic_result"]
 
         # read from cli argument or user config file
         self.auto_vertical_output = auto_vertical_output or c["main"].as_bool(
@@ -129,19 +152,43 @@ class IRISSqlCli(object):
         self.logger = logging.getLogger(__name__)
         self.initialize_logging()
 
-        keyword_casing = c["main"].get("keyword_casing", "auto")
+        self.slow_query_log = None
+        slow_query_threshold = c["main"].as_int("slow_query_threshold")
+        if slow_query_threshold > 0:
+            slow_query_log = c["main"]["slow_query_log"]
+            if slow_query_log == "default":
+                slow_query_log = config_location() + "slow_query.jsonl"
+            self.slow_query_log = SlowQueryLog(slow_query_log, slow_query_threshold)
+
+        self.catalog_filter = CatalogFilter(
+            include=[p for p in c["main"].as_list("completion_schemas") if p],
+            exclude=[p for p in c["main"].as_list("completion_exclude_schemas") if p],
+            max_objects=c["main"].as_int("max_catalog_objects"),
+        )
+
+        self.completer_options = {
+            "supported_formats": self.formatter.supported_formats,
+            "keyword_casing": c["main"].get("keyword_casing", "auto"),
+            "time_budget": c["main"].as_int("completion_time_budget") / 1000.0,
+            "max_completions": c["main"].as_int("max_completions"),
+        }
 
         self.now = dt.datetime.today()
 
-        self.completion_refresher = CompletionRefresher()
+        # Created on first use, see refresh_completions
+        self.completion_refresher = None
 
         self.query_history = []
 
-        # Initialize completer.
-        self.completer = SQLCompleter(
-            supported_formats=self.formatter.supported_formats,
-            keyword_casing=keyword_casing,
+        history_db = c["main"]["history_db"]
+        if history_db == "default":
+            history_db = config_location() + "history.db"
+        self.history_store = (
+            QueryHistoryStore(os.path.expanduser(history_db)) if history_db else None
         )
+
+        # Created by run_cli, the completer is only needed by the REPL.
+        self.completer = None
         self._completer_lock = threading.Lock()
         self.prompt_format = c["main"].get("prompt", self.default_prompt)
 
@@ -152,6 +199,17 @@ class IRISSqlCli(object):
     def quit(self):
         raise IRISSQLCliQuitError
 
+    @property
+    def style_output(self):
+        if self._style_output is None:
+            self._style_output = style_factory_output(self.syntax_style, self.cli_style)
+        return self._style_output
+
+    def new_completer(self):
+        from .sqlcompleter import SQLCompleter
+
+        return SQLCompleter(**self.completer_options)
+
     def register_special_commands(self):
         special.register_special_command(
             self.change_table_format,
@@ -177,6 +235,50 @@ class IRISSqlCli(object):
             aliases=("\\R",),
             case_sensitive=True,
         )
+        special.register_special_command(
+            self.bench,
+            "\\bench",
+            BENCH_USAGE,
+            "Run a query repeatedly and report latency statistics.",
+            case_sensitive=True,
+        )
+        special.register_special_command(
+            self.show_history,
+            "\\history",
+            HISTORY_USAGE,
+            "Search the query history.",
+            case_sensitive=True,
+        )
+        special.register_special_command(
+            self.profile_keystrokes,
+            "\\keystrokes",
+            KEYSTROKES_USAGE,
+            "Record and report the completion latency of each keystroke.",
+            case_sensitive=True,
+        )
+        special.register_special_command(
+            self.expand_value,
+            "\\expand",
+            EXPAND_USAGE,
+            "Show the full text of a value truncated in the last result.",
+            case_sensitive=True,
+        )
+        special.register_special_command(
+            self.export_value,
+            "\\export",
+            EXPORT_USAGE,
+            "Write a value truncated in the last result to a file, in full.",
+            case_sensitive=True,
+        )
+        special.register_special_command(
+            self.show_status,
+            "status",
+            "\\s",
+            "Show connection and server information.",
+            arg_type=special.NO_QUERY,
+            aliases=("\\s", "\\status"),
+            case_sensitive=True,
+        )
 
     def change_table_format(self, arg, **_):
         try:
@@ -207,6 +309,129 @@ class IRISSqlCli(object):
         self.prompt_format = self.get_prompt(arg)
         return [(None, None, None, "Changed prompt format to %s" % arg)]
 
+    def bench(self, arg, **_):
+        try:
+            count, warmup, concurrency, query = parse_bench_args(arg)
+        except ValueError as e:
+            return [(None, None, None, str(e))]
+
+        # The REPL only sees \bench, the benchmarked query is confirmed here
+        if self.destructive_warning and confirm_destructive_query(query) is False:
+            return [(None, None, None, "Wise choice!")]
+
+        samples, wall_time = run_benchmark(
+            self.sqlexecute, query, count, warmup, concurrency
+        )
+        rows, headers = summarize(samples, wall_time)
+        status = "Ran {0} iteration{1} ({2} warmup) on {3} connection{4} in {5:0.3f}s"
+        status = status.format(
+            count,
+            "" if count == 1 else "s",
+            warmup,
+            concurrency,
+            "" if concurrency == 1 else "s",
+            wall_time,
+        )
+        return [(None, rows, headers, status)]
+
+    def show_history(self, arg, **_):
+        if not self.history_store:
+            return [(None, None, None, "Query history is disabled.")]
+
+        headers = ["id", "started", "ok", "time", "rows", "namespace", "query"]
+        rows = []
+        for entry in self.history_store.search(**parse_history_args(arg)):
+            entry_id, started, successful, total_time, rowcount, namespace, query = (
+                entry
+            )
+            started = dt.datetime.fromtimestamp(started)
+            rows.append(
+                (
+                    entry_id,
+                    started.strftime("%Y-%m-%d %H:%M:%S"),
+                    "yes" if successful else "no",
+                    "%0.3f" % (total_time or 0),
+                    rowcount,
+                    namespace,
+                    query,
+                )
+            )
+        return [(None, rows, headers, None)]
+
+    def profile_keystrokes(self, arg, **_):
+        action, _, profile_dir = arg.strip().partition(" ")
+        profile_dir = profile_dir.strip()
+        if action == "on":
+            completion_profiler.enable(profile_dir or None)
+            message = "Recording keystroke timings."
+            if profile_dir:
+                message += " Profiles of the slowest keystrokes go to %s." % profile_dir
+            return [(None, None, None, message)]
+
+        profiler = completion_profiler.profiler
+        if action == "off":
+            completion_profiler.disable()
+            return [(None, None, None, "Stopped recording keystroke timings.")]
+        elif action == "reset":
+            if profiler:
+                profiler.reset()
+            return [(None, None, None, "Cleared the keystroke timings.")]
+        elif action:
+            return [(None, None, None, "Usage: " + KEYSTROKES_USAGE)]
+
+        if not profiler or not profiler.keystrokes:
+            return [(None, None, None, "No keystrokes recorded, see \\keystrokes on.")]
+        results = [
+            ("Keystroke latency",) + profiler.summary() + (None,),
+            ("Histogram",) + profiler.histogram() + (None,),
+        ]
+        if profiler.slowest:
+            results.append(
+                ("Slowest keystrokes",) + profiler.slowest_keystrokes() + (None,)
+            )
+        return results
+
+    def expand_value(self, arg, **_):
+        if not self.last_plan or not self.last_plan.truncated:
+            return [(None, None, None, "No value was truncated in the last result.")]
+        try:
+            return [(None, None, None, self.last_plan.expand(arg))]
+        except ValueError as e:
+            return [(None, None, None, str(e))]
+
+    def export_value(self, arg, **_):
+        if not self.last_plan or not self.last_plan.truncated:
+            return [(None, None, None, "No value was truncated in the last result.")]
+        args = arg.split(None, 2)
+        if len(args) == 2 or not args:
+            return [(None, None, None, "Usage: " + EXPORT_USAGE)]
+        filename = os.path.expanduser(args.pop())
+        try:
+            value = self.last_plan.truncated_value(args, EXPORT_USAGE)
+            with open_output(filename, "wb") as out:
+                size = export(value, out)
+        except (ValueError, OSError) as e:
+            return [(None, None, None, str(e))]
+        if isinstance(out, CompressedFile):
+            return [(None, None, None, out.summary())]
+        return [(None, None, None, "Wrote %d bytes to %s" % (size, filename))]
+
+    def show_status(self):
+        e = self.sqlexecute
+        if e.embedded:
+            connection = "embedded (%s)" % e.hostname
+        else:
+            connection = "%s:%s" % (e.hostname, e.port)
+        rows = [
+            ("Server", e.server_version),
+            ("Connection", connection),
+            ("Namespace", e.namespace),
+            ("User", e.username),
+            ("Connection id", e.connection_id()),
+            ("irissqlcli", __version__),
+        ]
+        return [(None, rows, ["Name", "Value"], None)]
+
     def connect_uri(self, uri):
         hostname, port, namespace, username, password, embedded = parse_uri(uri)
         self.connect(hostname, port, namespace, username, password, embedded)
@@ -253,6 +478,8 @@ class IRISSqlCli(object):
             click.secho(str(e), err=True, fg="red")
             exit(1)
 
+        sqlexecute.slow_query_log = self.slow_query_log
+        sqlexecute.catalog_filter = self.catalog_filter
         self.sqlexecute = sqlexecute
 
     def get_prompt(self, string):
@@ -269,16 +496,57 @@ class IRISSqlCli(object):
 
     def run_query(self, query, new_line=True):
         """Runs *query*."""
-        results = self.sqlexecute.run(query)
+        table_format = self.formatter.format_name
+        results = self.sqlexecute.run(
+            query,
+            stream=table_format
+            in delimited.supported_formats + jsonformat.supported_formats,
+        )
         for result in results:
             title, cur, headers, status, sql, success, is_special = result
             self.formatter.query = query
-            output = self.format_output(title, cur, headers, "")
+            if (
+                table_format
+                in delimited.supported_formats + jsonformat.supported_formats
+                and new_line
+                and not special.is_tee_enabled()
+                and not special.is_expanded_output()
+            ):
+                # Machine formats are streamed, without the table preprocessors
+                with delimited.buffered_stdout() as out:
+                    if table_format in jsonformat.supported_formats:
+                        jsonformat.write_json(out, table_format, title, cur, headers)
+                    else:
+                        delimited.write_delimited(
+                            out, table_format, title, cur, headers, self.csv_dialect()
+                        )
+                continue
+            output = self.format_output(
+                title, cur, headers, "", expanded=special.is_expanded_output()
+            )
             for line in output:
                 special.write_tee(line)
                 click.echo(line, nl=new_line)
 
     def _build_cli(self, history):
+        from prompt_toolkit.completion import DynamicCompleter, ThreadedCompleter
+        from prompt_toolkit.enums import DEFAULT_BUFFER, EditingMode
+        from prompt_toolkit.filters import HasFocus, IsDone
+        from prompt_toolkit.formatted_text import ANSI
+        from prompt_toolkit.layout.processors import (
+            ConditionalProcessor,
+            HighlightMatchingBracketProcessor,
+            TabsProcessor,
+        )
+        from prompt_toolkit.lexers import PygmentsLexer
+        from prompt_toolkit.shortcuts import CompleteStyle, PromptSession
+
+        from .clitoolbar import create_toolbar_tokens_func
+        from .filehistory import IndexedAutoSuggest
+        from .key_bindings import irissqlcli_bindings
+        from .lexer import IRISSqlLexer
+        from .style import style_factory
+
         key_bindings = irissqlcli_bindings(self)
 
         def get_message():
@@ -323,7 +591,7 @@ class IRISSqlCli(object):
                     # Render \t as 4 spaces instead of "^I"
                     TabsProcessor(char1=" ", char2=" "),
                 ],
-                auto_suggest=AutoSuggestFromHistory(),
+                auto_suggest=IndexedAutoSuggest(history.index),
                 tempfile_suffix=".sql",
                 history=history,
                 completer=ThreadedCompleter(DynamicCompleter(lambda: self.completer)),
@@ -342,6 +610,13 @@ class IRISSqlCli(object):
 
             return prompt_app
 
+    def streams_rows(self, text):
+        """Whether the rows of the last statement of *text* are fetched as
+        they are written: it ends with \\G or the format is json."""
+        if self.formatter.format_name in jsonformat.supported_formats:
+            return True
+        return text.rstrip().rstrip(";").rstrip().endswith("\\G")
+
     def _evaluate_command(self, text):
         """Used to run a command entered by the user during CLI operation
         (Puts the E in REPL)
@@ -361,6 +636,7 @@ class IRISSqlCli(object):
         output = []
         total = 0
         execution = 0
+        rowcount = 0
 
         # Run the query.
         start = time()
@@ -370,7 +646,9 @@ class IRISSqlCli(object):
             # self.special,
             # exception_formatter,
             # on_error_resume,
+            stream=self.streams_rows(text),
         )
+        streamed = False
 
         is_special = None
 
@@ -383,14 +661,23 @@ class IRISSqlCli(object):
             #     cur, status = self._limit_output(cur)
 
             execution = time() - start
-            formatted = self.format_output(title, cur, headers, status)
+            formatted = self.format_output(
+                title, cur, headers, status, expanded=special.is_expanded_output()
+            )
 
-            output.extend(formatted)
+            if isinstance(cur, RowStream):
+                # The last result, its rows are fetched as they are written
+                streamed = True
+                output = itertools.chain(output, formatted)
+            else:
+                output.extend(formatted)
             total = time() - start
 
             # Keep track of whether any of the queries are mutating or changing
             # the database
             if success:
+                if not is_special:
+                    rowcount += self.sqlexecute.last_stats.rowcount
                 mutated = mutated or is_mutating(status)
                 db_changed = db_changed or has_change_db_cmd(sql)
                 meta_changed = meta_changed or has_meta_cmd(sql)
@@ -408,6 +695,8 @@ class IRISSqlCli(object):
             path_changed,
             mutated,
             is_special,
+            rowcount,
+            streamed,
         )
 
         return output, meta_query
@@ -451,10 +740,22 @@ class IRISSqlCli(object):
                 self.output(output)
             except KeyboardInterrupt:
                 pass
+            except iris.dbapi.DatabaseError as e:
+                # Raised while fetching streamed rows
+                logger.error("sql: %r, error: %r", text, e)
+                click.secho(str(e), err=True, fg="red")
+            if query.streamed:
+                stats = self.sqlexecute.last_stats
+                query = query._replace(
+                    total_time=query.total_time + stats.fetch_time,
+                    rowcount=query.rowcount + stats.rowcount,
+                )
 
             if True or self.special.timing_enabled:
                 # Only add humanized time display if > 1 second
                 if query.total_time > 1:
+                    import pendulum
+
                     print(
                         "Time: %0.03fs (%s), executed in: %0.03fs (%s)"
                         % (
@@ -470,10 +771,13 @@ class IRISSqlCli(object):
             # Check if we need to update completions, in order of most
             # to least drastic changes
             if query.db_changed:
+                special.clear_plan_cache()
                 with self._completer_lock:
-                    self.completer.reset_completions()
+                    if self.completer:
+                        self.completer.reset_completions()
                 self.refresh_completions(persist_priorities="keywords")
             elif query.meta_changed:
+                special.clear_plan_cache()
                 self.refresh_completions(persist_priorities="all")
             elif query.path_changed:
                 logger.debug("Refreshing search path")
@@ -485,24 +789,41 @@ class IRISSqlCli(object):
     def refresh_completions(self, history=None, persist_priorities="all"):
         """Refresh outdated completions
 
-        :param history: A prompt_toolkit.history.FileHistory object. Used to
-                        load keyword and identifier preferences
+        :param history: An iterable of executed queries. Used to load keyword
+                        and identifier preferences
 
         :param persist_priorities: 'all' or 'keywords'
         """
 
+        if self.completion_refresher is None:
+            from .completion_refresher import CompletionRefresher
+
+            self.completion_refresher = CompletionRefresher()
+
         callback = functools.partial(
             self._on_completions_refreshed, persist_priorities=persist_priorities
         )
         return self.completion_refresher.refresh(
             self.sqlexecute,
             callback,
-            {},
+            self.completer_options,
+            history=history,
         )
 
     def _on_completions_refreshed(self, new_completer, persist_priorities):
+        """Swap the completer for the refreshed one.
+
+        persist_priorities is how the usage counts of the old completer are
+        kept: 'all', 'keywords' or 'none'.
+        """
         with self._completer_lock:
+            old_completer = self.completer
             self.completer = new_completer
+            if old_completer is not None and persist_priorities != "none":
+                new_completer.prioritizer = old_completer.prioritizer
+                if persist_priorities == "keywords":
+                    # Another database, other names
+                    new_completer.prioritizer.clear_names()
 
         if self.prompt_app:
             # After refreshing, redraw the CLI to clear the statusbar
@@ -510,15 +831,21 @@ class IRISSqlCli(object):
             self.prompt_app.app.invalidate()
 
     def get_completions(self, text, cursor_positition):
+        from prompt_toolkit.document import Document
+
         with self._completer_lock:
-            return self.completer.get_completions(
-                Document(text=text, cursor_position=cursor_positition), None
+            if self.completer is None:
+                self.completer = self.new_completer()
+            return list(
+                self.completer.get_completions(
+                    Document(text=text, cursor_position=cursor_positition), None
+                )
             )
 
     def log_output(self, output):
         """Log the output in the audit log, if it's enabled."""
         if self.logfile:
-            click.echo(utf8tounicode(output), file=self.logfile)
+            self.logfile.write(utf8tounicode(output) + "\n")
 
     def echo(self, s, **kwargs):
         """Print a message to stdout.
@@ -625,65 +952,79 @@ class IRISSqlCli(object):
 
         The message will be logged in the audit log, if enabled. The
         message will be written to the tee file, if enabled. The
-        message will be written to the output file, if enabled.
+        message will be written to the output file, if enabled. The lines
+        go to these sinks in chunks, see `sinks`.
 
         """
         if output:
-            size = self.prompt_app.output.get_size()
-
-            margin = self.get_output_margin(status)
-
-            fits = True
-            buf = []
-            output_via_pager = self.explicit_pager and special.is_pager_enabled()
-            for i, line in enumerate(output, 1):
-                self.log_output(line)
-                special.write_tee(line)
-                special.write_once(line)
-
-                if fits or output_via_pager:
-                    # buffering
-                    buf.append(line)
-                    if len(line) > size.columns or i > (size.rows - margin):
-                        fits = False
-                        if not self.explicit_pager and special.is_pager_enabled():
-                            # doesn't fit, use pager
-                            output_via_pager = True
-
-                        if not output_via_pager:
-                            # doesn't fit, flush buffer
-                            for line in buf:
-                                click.secho(line)
-                            buf = []
-                else:
-                    click.secho(line)
-
-            if buf:
+            lines = iter(output)
+            output_via_pager = special.is_pager_enabled()
+            if output_via_pager and not self.explicit_pager:
+                # Without an explicit pager, only the results that don't fit
+                # the screen are paged
+                size = self.prompt_app.output.get_size()
+                margin = self.get_output_margin(status)
+                prefix, fits = sinks.screen_prefix(
+                    lines, size.rows - margin, size.columns
+                )
+                lines = itertools.chain(prefix, lines)
+                output_via_pager = not fits
+
+            with special.once_writer() as write_once:
+                file_sinks = [self.log_output] if self.logfile else []
+                if special.is_tee_enabled():
+                    file_sinks.append(special.write_tee)
+                if write_once:
+                    file_sinks.append(write_once)
+                chunks = sinks.fan_out(sinks.chunks(lines), file_sinks)
                 if output_via_pager:
-                    # sadly click.echo_via_pager doesn't accept generators
-                    click.echo_via_pager("\n".join(buf))
+                    sinks.to_pager(chunks)
+                    # The user may have quit the pager before the end
+                    sinks.drain(chunks)
                 else:
-                    for line in buf:
-                        click.secho(line)
+                    sinks.to_terminal(chunks)
 
         if status:
             self.log_output(status)
             click.secho(status)
 
     def run_cli(self):
+        from .filehistory import IndexedFileHistory
+
         logger = self.logger
+        if not self.quiet:
+            # Overlap the server version lookup with the REPL setup
+            server_version_lookup = self.sqlexecute.prefetch_server_version()
         self.configure_pager()
-        self.refresh_completions()
+        with self._completer_lock:
+            if self.completer is None:
+                self.completer = self.new_completer()
+        usage_history = self.config["main"].as_int("completion_usage_history")
+        if self.history_store and usage_history > 0:
+            # The refreshed completer counts the names and keywords of the
+            # history, in the background, and starts from these counts
+            self.refresh_completions(
+                history=self.history_store.recent_queries(
+                    self.sqlexecute.namespace, usage_history
+                ),
+                persist_priorities="none",
+            )
+        else:
+            self.refresh_completions()
 
         history_file = self.config["main"]["history_file"]
         if history_file == "default":
             history_file = config_location() + "history"
-        history = FileHistory(os.path.expanduser(history_file))
+        history = IndexedFileHistory(os.path.expanduser(history_file))
 
         self.prompt_app = self._build_cli(history)
 
         if not self.quiet:
-            print("Server: ", self.sqlexecute.server_version)
+            server_version_lookup.join(timeout=SERVER_VERSION_TIMEOUT)
+            if server_version_lookup.is_alive():
+                print("Server:  (still looking up, see \\status)")
+            else:
+                print("Server: ", self.sqlexecute.server_version)
             print("Version:", __version__)
 
         try:
@@ -696,11 +1037,14 @@ class IRISSqlCli(object):
                 query = self.execute_command(text)
 
                 self.query_history.append(query)
+                if self.history_store and query:
+                    self.history_store.add(query, self.sqlexecute.namespace)
 
                 self.now = dt.datetime.today()
 
-                # with self._completer_lock:
-                #     self.completer.extend_query_history(text)
+                if query and query.successful and not query.is_special:
+                    with self._completer_lock:
+                        self.completer.extend_query_history(text)
 
         except (IRISSQLCliQuitError, EOFError):
             if not self.quiet:
@@ -713,6 +1057,14 @@ class IRISSqlCli(object):
         _, height = shutil.get_terminal_size()
         return min(int(round(height * reserved_space_ratio)), max_reserved_space)
 
+    @staticmethod
+    def csv_dialect():
+        # The default CSV dialect is "excel" which is not handling newline values correctly
+        # Nevertheless, we want to keep on using "excel" on Windows since it uses '\r\n'
+        # as the line terminator
+        # https://github.com/dbcli/irissqlcli/issues/1102
+        return "excel" if platform.system() == "Windows" else "unix"
+
     def format_output(
         self, title, cur, headers, status, expanded=False, max_width=None
     ):
@@ -731,65 +1083,84 @@ class IRISSqlCli(object):
             "sep_title": "RECORD {n}",
             "sep_character": "-",
             "sep_length": (1, 25),
-            "preprocessors": (format_numbers, align_decimals),
             "disable_numparse": True,
             "preserve_whitespace": True,
             "style": self.style_output,
+            # The values are truncated by the FormatPlan
+            "max_field_width": None,
         }
 
         if table_format == "csv":
-            # The default CSV dialect is "excel" which is not handling newline values correctly
-            # Nevertheless, we want to keep on using "excel" on Windows since it uses '\r\n'
-            # as the line terminator
-            # https://github.com/dbcli/irissqlcli/issues/1102
-            dialect = "excel" if platform.system() == "Windows" else "unix"
-            output_kwargs["dialect"] = dialect
+            output_kwargs["dialect"] = self.csv_dialect()
 
         if title:  # Only print the title if it's not None.
             output.append(title)
 
-        if cur:
-            if max_width is not None:
+        if cur and table_format in jsonformat.supported_formats and not expanded:
+            # Serialized from the values, without the table preprocessors
+            self.last_plan = None
+            output = itertools.chain(
+                output, jsonformat.json_lines(cur, headers, table_format)
+            )
+        elif cur:
+            if max_width is not None or not hasattr(cur, "description"):
                 cur = list(cur)
-            column_types = None
-            if hasattr(cur, "description"):
-                column_types = [col.type_code for col in cur.description]
-
-            formatted = self.formatter.format_output(
-                cur,
-                headers,
-                format_name="vertical" if expanded else None,
-                column_types=column_types,
-                **output_kwargs,
+            # NULLs and decimal alignment are left to the machine formats
+            machine_format = table_format in delimited.supported_formats
+            machine_format = machine_format and not expanded
+            widths = None
+            if not machine_format:
+                widths = [
+                    self.max_field_widths.get(str(h).lower(), self.max_field_width)
+                    for h in headers
+                ]
+            plan = FormatPlan(
+                column_types(cur),
+                missing_value=None if machine_format else self.null_string,
+                align=not machine_format and not expanded,
+                style=self.style_output,
+                widths=widths,
             )
-            if isinstance(formatted, str):
-                formatted = iter(formatted.splitlines())
-            first_line = next(formatted)
-            formatted = itertools.chain([first_line], formatted)
-            if (
-                not expanded
-                and max_width
-                and len(strip_ansi(first_line)) > max_width
-                and headers
-            ):
+            output_kwargs["preprocessors"] = (plan.preprocess,)
+            self.last_plan = plan
+
+            if expanded:
+                formatted = self.vertical_output(plan, cur, headers, output_kwargs)
+            else:
                 formatted = self.formatter.format_output(
-                    cur,
-                    headers,
-                    format_name="vertical",
-                    column_types=column_types,
-                    **output_kwargs,
+                    cur, headers, column_types=plan.types, **output_kwargs
                 )
                 if isinstance(formatted, str):
                     formatted = iter(formatted.splitlines())
+                first_line = next(formatted)
+                formatted = itertools.chain([first_line], formatted)
+                if max_width and len(strip_ansi(first_line)) > max_width and headers:
+                    formatted = self.vertical_output(plan, cur, headers, output_kwargs)
 
             output = itertools.chain(output, formatted)
 
+        if isinstance(cur, RowStream):
+            # Known once the rows were written
+            output = itertools.chain(output, cur.status())
         # Only print the status if it's not None
-        if status:
+        elif status:
             output = itertools.chain(output, [format_status(cur, status)])
 
         return output
 
+    @staticmethod
+    def vertical_output(plan, cur, headers, output_kwargs):
+        """The lines of *cur* as vertical records, converted by the FormatPlan
+        *plan* as they are read."""
+        return vertical.vertical_lines(
+            plan.stream(cur, headers),
+            [str(header) for header in headers],
+            sep_title=output_kwargs["sep_title"],
+            sep_character=output_kwargs["sep_character"],
+            sep_length=output_kwargs["sep_length"],
+            style=output_kwargs["style"],
+        )
+
 
 CONTEXT_SETTINGS = {"help_option_names": ["--help"]}
 
@@ -847,8 +1218,8 @@ CONTEXT_SETTINGS = {"help_option_names": ["--help"]}
 @click.option(
     "-l",
     "--logfile",
-    type=click.File(mode="a", encoding="utf-8"),
-    help="Log every query and its results to a file.",
+    type=click.Path(dir_okay=False),
+    help="Log every query and its results to a file, gzip compressed if it ends with .gz.",
 )
 @click.option(
     "--irissqlclirc",
@@ -916,16 +1287,26 @@ def cli(
 
     namespace = namespace or namespace_opt or os.getenv("IRISNAMESPACE") or "USER"
     username = username or username_opt
-    irissqlcli = IRISSqlCli(
-        prompt_passwd,
-        quiet,
-        logfile=logfile,
-        irissqlclirc=irissqlclirc,
-        auto_vertical_output=auto_vertical_output,
-        warn=warn,
-    )
+    try:
+        irissqlcli = IRISSqlCli(
+            prompt_passwd,
+            quiet,
+            logfile=logfile,
+            irissqlclirc=irissqlclirc,
+            auto_vertical_output=auto_vertical_output,
+            warn=warn,
+        )
+    except (IOError, OSError) as e:
+        click.secho(
+            "Cannot open log file '{}': {}".format(e.filename, e.strerror),
+            err=True,
+            fg="red",
+        )
+        sys.exit(1)
 
     if cert:
+        import ssl
+
         sslcontext = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
         sslcontext.load_verify_locations(cert)
         sslcontext.check_hostname = False
@@ -0,0 +1,45 @@
+"""Result sets as pyarrow tables and pandas data frames.
+
+The rows are fetched from the cursor in batches of `BATCH_SIZE` rows, and
+each batch is converted column by column to Arrow arrays, so a large result
+is never held whole as Python tuples. The column types are inferred from the
+values and widened across the batches. pyarrow, and pandas for data frames,
+are optional: pip install irissqlcli[dataframe].
+"""
+
+# Number of rows fetched at once and converted to a record batch
+BATCH_SIZE = 65536
+
+
+def fetch_batches(cursor, size=BATCH_SIZE):
+    """Yields the rows of *cursor* in lists of *size* rows at most."""
+    while True:
+        batch = cursor.fetchmany(size)
+        if not batch:
+            return
+        yield batch
+
+
+def to_arrow(batches, headers):
+    """A pyarrow Table of the row *batches*, named by *headers*.
+
+    A column whose batches were inferred different types gets the widest,
+    an int column with a float batch is a double column, a column of NULL
+    only has the null type.
+    """
+    import pyarrow as pa
+
+    names = [str(header) for header in headers]
+    tables = [
+        pa.Table.from_arrays([pa.array(values) for values in zip(*rows)], names=names)
+        for rows in batches
+        if rows
+    ]
+    if not tables:
+        return pa.Table.from_arrays([pa.nulls(0) for _ in names], names=names)
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def to_pandas(batches, headers):
+    """A pandas DataFrame of the row *batches*, named by *headers*."""
+    return to_arrow(batches, headers).to_pandas()
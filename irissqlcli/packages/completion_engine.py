@@ -1,11 +1,12 @@
 from __future__ import print_function
-import sqlparse
 from sqlparse.sql import Comparison, Identifier, Where
 from .encodingutils import string_types, text_type
-from .parseutils import last_word, extract_tables, find_prev_keyword
+from .parseutils import last_word, extract_tables, find_prev_keyword, parse
 from .special import parse_special_command
+from .completion_profiler import timed
 
 
+@timed("suggest")
 def suggest_type(full_text, text_before_cursor):
     """Takes the full_text that is typed so far and also the text before the
     cursor to suggest completion type and scope.
@@ -27,19 +28,19 @@ def suggest_type(full_text, text_before_cursor):
         # it will always return the list of keywords as completion.
         if word_before_cursor:
             if word_before_cursor.endswith("(") or word_before_cursor.startswith("\\"):
-                parsed = sqlparse.parse(text_before_cursor)
+                parsed = parse(text_before_cursor)
             else:
-                parsed = sqlparse.parse(text_before_cursor[: -len(word_before_cursor)])
+                parsed = parse(text_before_cursor[: -len(word_before_cursor)])
 
                 # word_before_cursor may include a schema qualification, like
                 # "schema_name.partial_name" or "schema_name.", so parse it
                 # separately
-                p = sqlparse.parse(word_before_cursor)[0]
+                p = parse(word_before_cursor)[0]
 
                 if p.tokens and isinstance(p.tokens[0], Identifier):
                     identifier = p.tokens[0]
         else:
-            parsed = sqlparse.parse(text_before_cursor)
+            parsed = parse(text_before_cursor)
     except (TypeError, AttributeError):
         return [{"type": "keyword"}]
 
@@ -168,7 +169,7 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
     if not token:
         return [{"type": "keyword"}, {"type": "special"}]
     elif token_v.endswith("("):
-        p = sqlparse.parse(text_before_cursor)[0]
+        p = parse(text_before_cursor)[0]
 
         if p.tokens and isinstance(p.tokens[-1], Where):
             # Four possibilities:
@@ -226,7 +227,7 @@ def suggest_based_on_last_token(token, text_before_cursor, full_text, identifier
     elif token_v in ("show"):
         return [{"type": "show"}]
     elif token_v in ("to",):
-        p = sqlparse.parse(text_before_cursor)[0]
+        p = parse(text_before_cursor)[0]
         if p.token_first().value.lower() == "change":
             return [{"type": "change"}]
         else:
@@ -0,0 +1,265 @@
+"""Per keystroke timings of the completion pipeline.
+
+Recording is off by default. Once enabled, every SQLCompleter.get_completions
+call is recorded as a keystroke, with the time spent in each phase:
+
+- parse: sqlparse.parse, extract_tables and find_prev_keyword,
+- suggest: the rest of suggest_type,
+- match: scanning the candidates in find_matches,
+- sort: sorting the candidates and the matches.
+
+Phases are exclusive, a parse inside suggest_type only counts as parse.
+"""
+
+import cProfile
+import heapq
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from time import perf_counter
+
+_logger = logging.getLogger(__name__)
+
+KEYSTROKES_USAGE = "\\keystrokes [on [profile dir]|off|reset]"
+
+PHASES = ("parse", "suggest", "match", "sort")
+
+# Upper bounds, in milliseconds, of the histogram buckets
+HISTOGRAM_BOUNDS = (0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+profiler = None
+enabled = False
+
+_state = threading.local()
+_null = nullcontext()
+
+
+class Keystroke(object):
+    __slots__ = ("text", "times", "total", "_stack")
+
+    def __init__(self, text):
+        self.text = text
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.total = 0.0
+        self._stack = []
+
+
+class _Phase(object):
+    __slots__ = ("keystroke", "name", "start")
+
+    def __init__(self, keystroke, name):
+        self.keystroke = keystroke
+        self.name = name
+
+    def __enter__(self):
+        now = perf_counter()
+        stack = self.keystroke._stack
+        if stack:
+            # Pause the enclosing phase
+            parent = stack[-1]
+            self.keystroke.times[parent.name] += now - parent.start
+        stack.append(self)
+        self.start = now
+
+    def __exit__(self, *args):
+        now = perf_counter()
+        stack = self.keystroke._stack
+        self.keystroke.times[self.name] += now - self.start
+        stack.pop()
+        if stack:
+            stack[-1].start = now
+
+
+def phase(name):
+    """Context manager timing the phase *name* of the current keystroke, a
+    no-op when no keystroke is recorded."""
+    keystroke = getattr(_state, "keystroke", None)
+    if keystroke is None:
+        return _null
+    return _Phase(keystroke, name)
+
+
+def timed(name):
+    """Decorator timing every call of the function as phase *name*."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def keystroke(text):
+    """Context manager recording a keystroke, *text* is the text before the
+    cursor."""
+    if not enabled or getattr(_state, "keystroke", None) is not None:
+        return _null
+    return profiler.record(text)
+
+
+def enable(profile_dir=None, keep_slowest=5):
+    """Start recording keystrokes. With *profile_dir*, keystrokes also run
+    under cProfile and the stats of the *keep_slowest* slowest ones are kept
+    there as pstats files."""
+    global profiler, enabled
+    if profile_dir:
+        profile_dir = os.path.expanduser(profile_dir)
+        os.makedirs(profile_dir, exist_ok=True)
+    if profiler is None or profiler.profile_dir != profile_dir:
+        profiler = KeystrokeProfiler(profile_dir, keep_slowest)
+    enabled = True
+    return profiler
+
+
+def disable():
+    """Stop recording, the recorded keystrokes are kept for reporting."""
+    global enabled
+    enabled = False
+
+
+class KeystrokeProfiler(object):
+    def __init__(self, profile_dir=None, keep_slowest=5, max_keystrokes=10000):
+        self.profile_dir = profile_dir
+        self.keep_slowest = keep_slowest
+        self.keystrokes = deque(maxlen=max_keystrokes)
+        # Min-heap of (total, seq, text, path) of the slowest profiled ones
+        self.slowest = []
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def record(self, text):
+        keystroke = Keystroke(text)
+        profile = cProfile.Profile() if self.profile_dir else None
+        _state.keystroke = keystroke
+        start = perf_counter()
+        try:
+            if profile:
+                try:
+                    profile.enable()
+                except ValueError as e:
+                    # Another profiler is active in this thread
+                    _logger.debug("Unable to profile keystroke: %r", e)
+                    profile = None
+            yield keystroke
+        finally:
+            if profile:
+                profile.disable()
+            keystroke.total = perf_counter() - start
+            _state.keystroke = None
+            self._add(keystroke, profile)
+
+    def _add(self, keystroke, profile):
+        with self._lock:
+            self.keystrokes.append(keystroke)
+            if not profile:
+                return
+            slowest = self.slowest
+            if len(slowest) >= self.keep_slowest and keystroke.total <= slowest[0][0]:
+                return
+            seq = next(self._seq)
+            path = os.path.join(self.profile_dir, "keystroke-%d.pstats" % seq)
+            try:
+                profile.dump_stats(path)
+            except (IOError, OSError) as e:
+                _logger.error("Unable to write keystroke profile %r: %r", path, e)
+                return
+            entry = (keystroke.total, seq, keystroke.text, path)
+            if len(slowest) < self.keep_slowest:
+                heapq.heappush(slowest, entry)
+                return
+            evicted = heapq.heapreplace(slowest, entry)
+        try:
+            os.remove(evicted[3])
+        except OSError:
+            pass
+
+    def reset(self):
+        with self._lock:
+            self.keystrokes.clear()
+            for entry in self.slowest:
+                try:
+                    os.remove(entry[3])
+                except OSError:
+                    pass
+            self.slowest = []
+
+    def _samples(self):
+        """Returns {column: sorted timings in milliseconds}."""
+        with self._lock:
+            keystrokes = list(self.keystrokes)
+        samples = {"total": sorted(k.total * 1000 for k in keystrokes)}
+        for name in PHASES:
+            samples[name] = sorted(k.times[name] * 1000 for k in keystrokes)
+        return samples
+
+    def summary(self):
+        """Build the (rows, headers) of the per phase statistics."""
+        from ..benchmark import percentile
+
+        samples = self._samples()
+        headers = [
+            "phase",
+            "keystrokes",
+            "mean ms",
+            "p50 ms",
+            "p95 ms",
+            "p99 ms",
+            "max ms",
+        ]
+        rows = []
+        for name in ("total",) + PHASES:
+            values = samples[name]
+            if not values:
+                continue
+            rows.append(
+                (name, len(values), "%0.3f" % (sum(values) / len(values)))
+                + tuple("%0.3f" % percentile(values, pct) for pct in (50, 95, 99))
+                + ("%0.3f" % values[-1],)
+            )
+        return rows, headers
+
+    def histogram(self):
+        """Build the (rows, headers) of the latency histogram, the number of
+        keystrokes per bucket for the total and for each phase."""
+        samples = self._samples()
+        columns = ("total",) + PHASES
+        labels = ["< %g" % HISTOGRAM_BOUNDS[0]]
+        labels.extend(
+            "%g - %g" % bounds for bounds in zip(HISTOGRAM_BOUNDS, HISTOGRAM_BOUNDS[1:])
+        )
+        labels.append(">= %g" % HISTOGRAM_BOUNDS[-1])
+
+        counts = {name: [0] * len(labels) for name in columns}
+        for name in columns:
+            for value in samples[name]:
+                bucket = 0
+                while (
+                    bucket < len(HISTOGRAM_BOUNDS) and value >= HISTOGRAM_BOUNDS[bucket]
+                ):
+                    bucket += 1
+                counts[name][bucket] += 1
+
+        rows = [
+            tuple([label] + [counts[name][i] for name in columns])
+            for i, label in enumerate(labels)
+            if any(counts[name][i] for name in columns)
+        ]
+        return rows, ["ms"] + list(columns)
+
+    def slowest_keystrokes(self):
+        """Build the (rows, headers) of the profiled slowest keystrokes."""
+        with self._lock:
+            slowest = sorted(self.slowest, reverse=True)
+        rows = [
+            ("%0.3f" % (total * 1000), text, path) for total, _, text, path in slowest
+        ]
+        return rows, ["ms", "text", "profile"]
@@ -0,0 +1,173 @@
+"""Output files compressed on a background thread.
+
+The tee, once and export files whose name ends with .gz, .zst or .xz are
+compressed as they are written. The output is gathered in blocks of
+`BLOCK_SIZE` bytes, which a writer thread compresses and writes to the file,
+so the compression overlaps with the query and the formatting. Appending to
+a file adds a gzip member, zstd frame or xz stream, which the tools read as
+one.
+"""
+
+import atexit
+import errno
+import lzma
+import os
+import queue
+import threading
+import time
+import zlib
+
+# Size of the blocks handed to the writer thread
+BLOCK_SIZE = 1024 * 1024
+
+# Number of blocks waiting for the writer thread before write blocks
+QUEUE_SIZE = 8
+
+# Stops the writer thread
+_CLOSE = object()
+
+
+def _gzip():
+    # 31: deflate with a gzip header and trailer
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+
+def _xz():
+    return lzma.LZMACompressor(lzma.FORMAT_XZ)
+
+
+def _zstd():
+    import zstandard
+
+    return zstandard.ZstdCompressor().compressobj()
+
+
+COMPRESSORS = {".gz": _gzip, ".xz": _xz, ".zst": _zstd}
+
+
+def is_compressed(filename):
+    """Whether *filename* is compressed, by its extension.
+
+    >>> is_compressed("out.csv.gz"), is_compressed("out.csv")
+    (True, False)
+    """
+    return os.path.splitext(filename)[1].lower() in COMPRESSORS
+
+
+def open_output(file, mode="a"):
+    """Opens the output file *file* to write, or append with mode "a". A
+    `CompressedFile` when it is compressed, a text file otherwise."""
+    if is_compressed(file):
+        return CompressedFile(file, mode)
+    return open(file, mode)
+
+
+class CompressedFile(object):
+    """A file compressed by a writer thread. write() takes text, encoded in
+    UTF-8, or bytes. The file is complete once closed, it is closed on exit
+    at the latest."""
+
+    def __init__(self, filename, mode="w"):
+        try:
+            self._compressor = COMPRESSORS[os.path.splitext(filename)[1].lower()]()
+        except ImportError:
+            raise OSError(
+                errno.ENOPROTOOPT,
+                "the zstandard package is needed for .zst files",
+                filename,
+            )
+        self.name = filename
+        self._file = open(filename, mode.rstrip("b") + "b")
+        self.closed = False
+        # Bytes written, before and after compression
+        self.size = self.compressed_size = 0
+        # Seconds spent compressing and writing
+        self.busy_time = 0.0
+        self._error = None
+        self._block = []
+        self._block_size = 0
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="compress", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._block.append(data)
+        self._block_size += len(data)
+        if self._block_size >= BLOCK_SIZE:
+            self._send()
+        return len(data)
+
+    def flush(self):
+        """Nothing to do: full blocks are written as they come, the rest when
+        the file is closed."""
+
+    def _send(self):
+        if self._error:
+            raise self._error
+        if self._block:
+            self._queue.put(b"".join(self._block))
+            self._block = []
+            self._block_size = 0
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            start = time.perf_counter()
+            if block is _CLOSE:
+                data = self._compressor.flush()
+            else:
+                data = self._compressor.compress(block)
+                self.size += len(block)
+            try:
+                if not self._error:
+                    self._file.write(data)
+            except (IOError, OSError) as e:
+                # Raised by the next write, the blocks are still consumed
+                self._error = e
+            self.compressed_size += len(data)
+            self.busy_time += time.perf_counter() - start
+            if block is _CLOSE:
+                return
+
+    def close(self):
+        """Writes the rest of the output and closes the file."""
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        try:
+            self._send()
+        finally:
+            self._queue.put(_CLOSE)
+            self._thread.join()
+            self._file.close()
+        if self._error:
+            raise self._error
+
+    def summary(self):
+        """The sizes, compression ratio and throughput, once closed.
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as tmp:
+        ...     with CompressedFile(os.path.join(tmp, "out.gz")) as f:
+        ...         _ = f.write("x" * 100000)
+        ...     f.summary()  # doctest: +ELLIPSIS
+        'Wrote 100000 bytes to .../out.gz, compressed ...:1 at ... MB/s'
+        """
+        ratio = self.size / self.compressed_size if self.compressed_size else 0
+        throughput = self.size / self.busy_time / 1e6 if self.busy_time else 0
+        return "Wrote %d bytes to %s, compressed %.1f:1 at %.1f MB/s" % (
+            self.size,
+            self.name,
+            ratio,
+            throughput,
+        )
@@ -0,0 +1,111 @@
+"""Streaming csv and tsv output for --execute and piped mode.
+
+The rows are written as the cursor yields them, straight to a large buffer
+over the stdout file descriptor. The preprocessors of TabularOutputFormatter
+are skipped, the output is the same as its csv and tsv formats: NULL is an
+empty field, bytes are decoded or hexlified, tsv escapes newlines and tabs.
+"""
+
+import csv
+import io
+import sys
+from contextlib import contextmanager
+
+from cli_helpers.utils import bytes_to_string
+
+supported_formats = ("csv", "tsv")
+
+# Size of the buffer between the writers and stdout
+BUFFER_SIZE = 1024 * 1024
+
+
+@contextmanager
+def buffered_stdout(buffer_size=BUFFER_SIZE):
+    """A text stream writing to the stdout file descriptor through a
+    *buffer_size* buffer. stdout itself when it has no file descriptor."""
+    try:
+        fileno = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        yield sys.stdout
+        return
+
+    sys.stdout.flush()
+    out = io.open(
+        fileno,
+        "w",
+        buffering=buffer_size,
+        encoding=sys.stdout.encoding,
+        errors=getattr(sys.stdout, "errors", None),
+        closefd=False,
+    )
+    try:
+        yield out
+    finally:
+        out.close()
+
+
+def _field(value):
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return bytes_to_string(value)
+    return value
+
+
+def _tsv_field(value):
+    return str(_field(value)).replace("\n", r"\n").replace("\t", r"\t")
+
+
+def write_csv(out, rows, headers, dialect="unix"):
+    """Writes *headers* and *rows* to *out* as csv.
+
+    >>> write_csv(sys.stdout, [(1, None, b"ab"), (2, "x,y", None)], ["id", "a", "b"])
+    "id","a","b"
+    "1","","ab"
+    "2","x,y",""
+    """
+    writer = csv.writer(out, dialect=dialect, lineterminator="\n")
+    writer.writerow(headers)
+    for row in rows:
+        if bytes in set(map(type, row)):
+            row = [_field(value) for value in row]
+        # None is written as an empty field
+        writer.writerow(row)
+
+
+def write_tsv(out, rows, headers):
+    """Writes *headers* and *rows* to *out* as tsv.
+
+    >>> out = io.StringIO()
+    >>> write_tsv(out, [(1, None), (2, "a\\tb")], ["id", "name"])
+    >>> out.getvalue()
+    'id\\tname\\n1\\t\\n2\\ta\\\\tb\\n'
+    """
+    write = out.write
+    write("\t".join(_tsv_field(header) for header in headers) + "\n")
+    for row in rows:
+        line = "\t".join(map(str, row))
+        # Some fields may be NULL, bytes or need escaping
+        if (
+            line.count("\t") != len(row) - 1
+            or "\n" in line
+            or "None" in line
+            or "b'" in line
+            or 'b"' in line
+        ):
+            line = "\t".join(map(_tsv_field, row))
+        write(line + "\n")
+
+
+def write_delimited(out, format_name, title, cur, headers, dialect="unix"):
+    """Writes a result set to *out* in the *format_name* format, csv or tsv.
+    Like format_output, the headers are only written when there are rows or a
+    cursor."""
+    if title:
+        out.write(title + "\n")
+    if not cur:
+        return
+    if format_name == "csv":
+        write_csv(out, cur, headers, dialect)
+    else:
+        write_tsv(out, cur, headers)
@@ -0,0 +1,244 @@
+"""Preprocessing of a result set, planned once from its column types.
+
+The type of each column is looked up once, in the cursor description or in
+the first rows, and gives the column a converter. The rows are then
+converted in one pass, instead of the per cell type checks of the
+format_numbers and align_decimals preprocessors of cli_helpers.
+"""
+
+import datetime
+from decimal import Decimal
+
+from cli_helpers.utils import bytes_to_string, intlen, style_field, to_string
+from pygments.token import Token
+
+# Column types by the type_code of the cursor description, the values of
+# iris.dbapi.SQLType. Other codes are text.
+TYPE_CODES = {
+    -7: int,  # BIT
+    -6: int,  # TINYINT
+    -5: int,  # BIGINT
+    4: int,  # INTEGER
+    5: int,  # SMALLINT
+    2: Decimal,  # NUMERIC
+    3: Decimal,  # DECIMAL
+    6: float,  # FLOAT
+    7: float,  # REAL
+    8: float,  # DOUBLE
+    -4: bytes,  # LONGVARBINARY
+    -3: bytes,  # VARBINARY
+    -2: bytes,  # BINARY
+    9: datetime.date,  # DATE
+    10: datetime.time,  # TIME
+    11: datetime.datetime,  # TIMESTAMP
+    91: datetime.date,  # TYPE_DATE
+    92: datetime.time,  # TYPE_TIME
+    93: datetime.datetime,  # TYPE_TIMESTAMP
+    1091: datetime.date,  # DATE_HOROLOG
+    1092: datetime.time,  # TIME_HOROLOG
+    1093: datetime.datetime,  # TIMESTAMP_POSIX
+}
+
+_KINDS = set(TYPE_CODES.values())
+
+EXPAND_USAGE = "\\expand [row column]"
+
+# Number of rows looked at for the column types of a result without a
+# description
+SAMPLE_ROWS = 100
+
+
+def column_types(cur):
+    """The types of the columns of *cur*, a cursor or a list of rows.
+
+    >>> column_types([(1, None, "a"), (2, 2.5, None)])
+    [<class 'int'>, <class 'float'>, <class 'str'>]
+    """
+    description = getattr(cur, "description", None)
+    if description:
+        return [TYPE_CODES.get(column[1], str) for column in description]
+
+    types = []
+    for row in cur[:SAMPLE_ROWS]:
+        if not types:
+            types = [None] * len(row)
+        for i, value in enumerate(row):
+            if types[i] is None and value is not None:
+                types[i] = type(value)
+    # Streams and the other types are text
+    return [t if t in _KINDS else str for t in types]
+
+
+def read_text(value, size=-1):
+    """Reads up to *size* characters of a stream *value*, from its start."""
+    if hasattr(value, "seek"):
+        value.seek(0)
+    text = value.read(size)
+    return bytes_to_string(text) if isinstance(text, bytes) else text
+
+
+def full_text(value):
+    """The text of a *value*, reading all of a stream."""
+    if hasattr(value, "read"):
+        return read_text(value)
+    return to_string(value)
+
+
+class FormatPlan(object):
+    """The converters of the columns of a result set.
+
+    NULL becomes *missing_value*, styled with *style*, or is left to the
+    formatter when it is None. Numbers and dates become strings, bytes are
+    decoded or hexlified. When *align* is set, the float and decimal columns
+    are padded to align on the decimal point.
+
+    The text values longer than the *widths* of their column are truncated,
+    0 or None means no limit. Only the start of a stream value, one with a
+    read method, is read. The truncated values are kept in `truncated` by
+    (row, column) until `full_text` is asked for.
+
+    >>> plan = FormatPlan([int, float, bytes], "<null>")
+    >>> plan.preprocess([(1, 2.5, b"ab"), (None, 10.25, None)], ["a", "b", "c"])
+    ([['1', ' 2.5', 'ab'], ['<null>', '10.25', '<null>']], ['a', 'b', 'c'])
+    >>> plan = FormatPlan([str], widths=[8])
+    >>> plan.preprocess([("short",), ("a longer value",)], ["a"])
+    ([['short'], ['a lon...']], ['a'])
+    >>> plan.truncated
+    {(1, 0): 'a longer value'}
+    """
+
+    def __init__(self, types, missing_value=None, align=True, style=None, widths=None):
+        self.types = types
+        if missing_value is not None and style is not None:
+            missing_value = style_field(Token.Output.Null, missing_value, style)
+        self.missing_value = missing_value
+        widths = widths or [None] * len(types)
+        self.converters = [
+            self._converter(t, missing_value, width) for t, width in zip(types, widths)
+        ]
+        self.aligned = [
+            i for i, t in enumerate(types) if align and t in (float, Decimal)
+        ]
+        self.limited = [
+            (i, width)
+            for i, (t, width) in enumerate(zip(types, widths))
+            if width and t in (str, bytes)
+        ]
+        self.truncated = {}
+        self.headers = []
+
+    @staticmethod
+    def _converter(column_type, missing, width):
+        # Enough of a stream to tell whether it is truncated
+        size = width + 1 if width else -1
+        if column_type is str:
+
+            def convert(value):
+                if type(value) is str:
+                    return value
+                if value is None:
+                    return missing
+                if hasattr(value, "read"):
+                    return read_text(value, size)
+                return to_string(value)
+
+        elif column_type is bytes:
+
+            def convert(value):
+                if value is None:
+                    return missing
+                if hasattr(value, "read"):
+                    return read_text(value, size)
+                return bytes_to_string(value)
+
+        else:
+
+            def convert(value):
+                return missing if value is None else str(value)
+
+        return convert
+
+    def preprocess(self, data, headers, **_):
+        """Converts *data*, a preprocessor of TabularOutputFormatter."""
+        self.headers = headers
+        converters = self.converters
+        rows = data if isinstance(data, list) else list(data)
+        data = [[c(v) for c, v in zip(converters, row)] for row in rows]
+
+        for i, width in self.limited:
+            for n, row in enumerate(data):
+                value = row[i]
+                if value is not None and len(value) > width:
+                    self.truncated[n, i] = rows[n][i]
+                    row[i] = value[: max(width - 3, 0)] + "..."
+
+        missing = self.missing_value
+        for i in self.aligned:
+            width = max(
+                (intlen(row[i]) for row in data if row[i] is not missing), default=0
+            )
+            for row in data:
+                value = row[i]
+                if value is not missing:
+                    row[i] = " " * (width - intlen(value)) + value
+        return data, headers
+
+    def stream(self, rows, headers):
+        """Converts the *rows* one at a time, as they are iterated. Like
+        `preprocess`, without the alignment of the decimals.
+
+        >>> plan = FormatPlan([int, str], "<null>", widths=[0, 5])
+        >>> list(plan.stream(iter([(1, None), (2, "truncated")]), ["a", "b"]))
+        [['1', '<null>'], ['2', 'tr...']]
+        """
+        self.headers = headers
+        converters = self.converters
+        for n, row in enumerate(rows):
+            values = [c(v) for c, v in zip(converters, row)]
+            for i, width in self.limited:
+                value = values[i]
+                if value is not None and len(value) > width:
+                    self.truncated[n, i] = row[i]
+                    values[i] = value[: max(width - 3, 0)] + "..."
+            yield values
+
+    def expand(self, arg):
+        """The full text of the truncated value at *arg*, see
+        `truncated_value`.
+
+        >>> plan = FormatPlan([int, str], widths=[0, 5])
+        >>> _ = plan.preprocess([(1, "truncated"), (2, "value")], ["id", "name"])
+        >>> plan.expand("1 NAME"), plan.expand("")
+        ('truncated', 'truncated')
+        """
+        return full_text(self.truncated_value(arg.split(), EXPAND_USAGE))
+
+    def truncated_value(self, args, usage):
+        """The original of a truncated value. *args* are the row, numbered
+        from 1, and the column, a name or a number. They may be left out when
+        a single value was truncated. ValueError mentions *usage* when they
+        are missing."""
+        if not args and len(self.truncated) == 1:
+            return next(iter(self.truncated.values()))
+        if len(args) != 2:
+            raise ValueError(
+                "%d values were truncated. Usage: %s" % (len(self.truncated), usage)
+            )
+
+        row, column = args
+        names = [str(header).lower() for header in self.headers]
+        if column.lower() in names:
+            column = names.index(column.lower())
+        elif column.isdigit():
+            column = int(column) - 1
+        else:
+            raise ValueError("Unknown column %s." % column)
+        if not row.isdigit():
+            raise ValueError("Usage: %s" % usage)
+
+        value = self.truncated.get((int(row) - 1, column))
+        if value is None:
+            raise ValueError(
+                "The value at row %s, column %s was not truncated." % (row, args[1])
+            )
+        return value
@@ -0,0 +1,335 @@
+"""Ranked fuzzy matching of completion candidates.
+
+A name matches the typed text when the text is a subsequence of it, ignoring
+case. `FuzzyIndex` preprocesses the names once so that the best matches are
+found without looking at every name. They are ranked:
+
+1. used names matching by prefix, segment or initials, most used first,
+2. prefix matches, the name starts with the text,
+3. segment matches, a segment of the name starts with the text. Segments are
+   separated by punctuation (order_items) or by case changes (OrderItems),
+4. initials matches, the initials of the segments start with the text, like
+   oi for order_items,
+5. the other matches, most used first, then the shortest and leftmost.
+
+The first four are looked up in sorted indexes. The others need a scan of the
+names, which stops when the budget runs out and only looks at the matches of
+a previous text when the text extends it. Until an index is built,
+`FuzzyScan` ranks the names the same way by scanning them all.
+
+The segments and initials of the rare names whose lowercase has another
+length, like "İ", are not indexed: their offsets would not match.
+"""
+
+import re
+import string
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from functools import partial
+from itertools import accumulate
+
+from .completion_profiler import phase
+
+# Number of names scanned between two budget checks
+SCAN_CHUNK_SIZE = 1024
+
+# Number of scans kept to narrow down the following ones
+SCAN_CACHE_SIZE = 4
+
+# Segments starting past this offset are not indexed
+MAX_SEGMENT_OFFSET = 255
+
+# Sorts after any text starting with the looked up prefix
+_END = "\U0010ffff"
+
+# Character classes: a lowercase, A uppercase, 0 digit, _ punctuation
+_CLASSES = {ord(c): "a" for c in string.ascii_lowercase}
+_CLASSES.update({ord(c): "A" for c in string.ascii_uppercase})
+_CLASSES.update({ord(c): "0" for c in string.digits})
+_CLASSES.update({i: "_" for i in range(128) if i not in _CLASSES and i != 10})
+
+# Matches the character before a segment start, in the classes of a name
+_BOUNDARY = re.compile(r"_[aA0]|[a0]A|A(?=Aa)")
+
+
+def segment_starts(name):
+    """Offsets of the segments of *name* after the first one.
+
+    >>> segment_starts("order_items")
+    [6]
+    >>> segment_starts("HTTPServerLog2")
+    [4, 10]
+    >>> segment_starts('"Order Items"')
+    [1, 7]
+    """
+    return [m.start() + 1 for m in _BOUNDARY.finditer(name.translate(_CLASSES))]
+
+
+def match_tier(name, lowered, initials, text):
+    """The rank of the match of the lowercase *text* on *name*: 0 for a
+    prefix, 1 for a segment, 2 for initials, None otherwise."""
+    if lowered.startswith(text):
+        return 0
+    if len(name) == len(lowered) and any(
+        lowered.startswith(text, offset) for offset in segment_starts(name)
+    ):
+        return 1
+    if initials.startswith(text):
+        return 2
+    return None
+
+
+def is_subsequence(text, other):
+    """Whether *text* is a subsequence of *other*.
+
+    >>> is_subsequence("oi", "order_items")
+    True
+    >>> is_subsequence("io", "order_items")
+    False
+    """
+    chars = iter(other)
+    return all(c in chars for c in text)
+
+
+class FuzzyIndex(object):
+    """Sorted *names* with their segment and initials indexes."""
+
+    def __init__(self, names):
+        names = sorted(set(names))
+        names.sort(key=str.lower)
+        self.names = names
+        self.lowered = lowered = [n.lower() for n in names]
+        self.initials = initials = [n[:1] for n in lowered]
+
+        # Segment starts of all the names as (index << 8 | offset), found in
+        # one pass over the names joined together
+        starts = array("q", [0])
+        starts.extend(accumulate(len(n) + 1 for n in names))
+        positions = [
+            m.start() + 1
+            for m in _BOUNDARY.finditer("\n".join(names).translate(_CLASSES))
+        ]
+        lines = list(map(partial(bisect_right, starts), positions))
+        segments = array("q")
+        # The names whose lowercase has another length are kept as they are,
+        # so that the positions in the names are the same in joined
+        case_stable = [len(n) == len(l) for n, l in zip(names, lowered)]
+        joined = "\n".join(
+            l if stable else n for n, l, stable in zip(names, lowered, case_stable)
+        )
+        for position, line in zip(positions, lines):
+            offset = position - starts[line - 1]
+            if 0 < offset <= MAX_SEGMENT_OFFSET and case_stable[line - 1]:
+                segments.append((line - 1) << 8 | offset)
+                initials[line - 1] += joined[position]
+
+        # The sorted keys are kept next to the indexes to bisect them, bisect
+        # only takes a key function from Python 3.10
+        segments = sorted((self._segment(packed), packed) for packed in segments)
+        self._segment_keys = [key for key, _ in segments]
+        self._segments = array("q", [packed for _, packed in segments])
+        self._by_initials = array(
+            "q", sorted(range(len(names)), key=initials.__getitem__)
+        )
+        self._initials_keys = [initials[i] for i in self._by_initials]
+        self._scans = deque(maxlen=SCAN_CACHE_SIZE)
+        self._used = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _segment(self, packed):
+        return self.lowered[packed >> 8][packed & 0xFF :]
+
+    def indexes(self, lowered):
+        """The positions in `names` of the names whose lowercase is
+        *lowered*."""
+        lo = bisect_left(self.lowered, lowered)
+        return range(lo, bisect_right(self.lowered, lowered, lo))
+
+    def tier(self, i, text):
+        """The rank of the match of the lowercase *text* on name *i*: 0 for a
+        prefix, 1 for a segment, 2 for initials, None otherwise."""
+        return match_tier(self.names[i], self.lowered[i], self.initials[i], text)
+
+    def prefix_matches(self, text):
+        lo = bisect_left(self.lowered, text)
+        hi = bisect_left(self.lowered, text + _END, lo)
+        return range(lo, hi)
+
+    def segment_matches(self, text):
+        lo = bisect_left(self._segment_keys, text)
+        hi = bisect_left(self._segment_keys, text + _END, lo)
+        return (packed >> 8 for packed in self._segments[lo:hi])
+
+    def initials_matches(self, text):
+        lo = bisect_left(self._initials_keys, text)
+        hi = bisect_left(self._initials_keys, text + _END, lo)
+        return self._by_initials[lo:hi]
+
+    def find(self, text, usage=None, budget=None):
+        """Yields the names matching *text*, best first.
+
+        *usage* maps lowercase names to how often they were used. If a CompletionBudget
+        *budget* runs out while scanning, the best of the matches found so
+        far are yielded.
+        """
+        text = text.lower()
+        usage = usage or {}
+        names = self.names
+        seen = set()
+
+        with phase("match"):
+            used = self._used_matches(text, usage)
+        for i in used:
+            seen.add(i)
+            yield names[i]
+
+        if not text:
+            tiers = (self.prefix_matches(text),)
+        else:
+            tiers = (
+                self.prefix_matches(text),
+                self.segment_matches(text),
+                self.initials_matches(text),
+            )
+        for matches in tiers:
+            for i in matches:
+                if i not in seen:
+                    seen.add(i)
+                    yield names[i]
+
+        if text:
+            for i in self._scan(text, usage, budget, seen):
+                yield names[i]
+
+    def _used_matches(self, text, usage):
+        """Indexes of the used names matching *text* by prefix, segment or
+        initials, most used first."""
+        matches = []
+        # Copied, the counts are updated while completing
+        for name, count in list(usage.items()):
+            if name not in self._used:
+                self._used[name] = self.indexes(name)
+            if count <= 0:
+                continue
+            for i in self._used[name]:
+                tier = self.tier(i, text)
+                if tier is not None:
+                    matches.append((-count, tier, i))
+        matches.sort()
+        return [i for _, _, i in matches]
+
+    def _scan(self, text, usage, budget, seen):
+        """Indexes of the names matching *text* that are not in *seen*, most
+        used first, then by shortest and leftmost match.
+
+        The matched names, and the ones left when the budget ran out, are
+        kept: a later scan of a text extending this one only looks at them.
+        """
+        # Sequences of the indexes to scan
+        parts = [range(len(self.names))]
+        narrowed = None
+        for previous, matched, pending in list(self._scans):
+            if (narrowed is None or len(previous) >= len(narrowed)) and (
+                is_subsequence(previous, text)
+            ):
+                narrowed, parts = previous, [matched] + pending
+
+        search = re.compile(".*?".join(map(re.escape, text))).search
+        lowered = self.lowered
+        matched = array("q")
+        pending = []
+        found = []
+        with phase("match"):
+            for n, part in enumerate(parts):
+                for start in range(0, len(part), SCAN_CHUNK_SIZE):
+                    end = start + SCAN_CHUNK_SIZE
+                    for i in part[start:end]:
+                        match = search(lowered[i])
+                        if match:
+                            matched.append(i)
+                            if i not in seen:
+                                left, right = match.span()
+                                found.append(
+                                    (-usage.get(lowered[i], 0), right - left, left, i)
+                                )
+                    if budget and budget.exhausted():
+                        pending = [part[end:]] + parts[n + 1 :]
+                        break
+                if pending:
+                    break
+            self._scans.append((text, matched, [p for p in pending if len(p)]))
+        with phase("sort"):
+            found.sort()
+        return [i for _, _, _, i in found]
+
+
+class FuzzyScan(object):
+    """The *names* matched like by a FuzzyIndex, without one: all the names
+    are scanned, until the budget runs out. For the time an index is built.
+
+    >>> list(FuzzyScan(["orders", "o_r_d", "order_items"]).find("oi"))
+    ['order_items']
+    >>> list(FuzzyScan(["o_r_d", "orders", "customer_orders"]).find("ord"))
+    ['orders', 'customer_orders', 'o_r_d']
+    """
+
+    def __init__(self, names):
+        self.names = names
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _tier(name, lowered, text):
+        if lowered.startswith(text):
+            return 0
+        starts = segment_starts(name) if len(name) == len(lowered) else ()
+        if any(lowered.startswith(text, offset) for offset in starts):
+            return 1
+        initials = lowered[:1] + "".join(
+            lowered[offset] for offset in starts if offset <= MAX_SEGMENT_OFFSET
+        )
+        if initials.startswith(text):
+            return 2
+        return None
+
+    def find(self, text, usage=None, budget=None):
+        """Returns the names matching *text*, best first, in about the order
+        of FuzzyIndex.find."""
+        text = text.lower()
+        usage = usage or {}
+        search = re.compile(".*?".join(map(re.escape, text))).search
+        found = []
+        with phase("match"):
+            for start in range(0, len(self.names), SCAN_CHUNK_SIZE):
+                for name in self.names[start : start + SCAN_CHUNK_SIZE]:
+                    lowered = name.lower()
+                    match = search(lowered)
+                    if not match:
+                        continue
+                    count = usage.get(lowered, 0)
+                    tier = self._tier(name, lowered, text)
+                    if tier is None:
+                        tier = 3
+                    elif count > 0:
+                        # The used names first, whatever their tier
+                        tier = -1
+                    left, right = match.span()
+                    found.append(
+                        (
+                            tier,
+                            -count,
+                            lowered if tier < 3 else "",
+                            right - left,
+                            left,
+                            name,
+                        )
+                    )
+                if budget and budget.exhausted():
+                    break
+        with phase("sort"):
+            found.sort()
+        return [match[-1] for match in found]
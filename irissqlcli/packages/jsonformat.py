@@ -0,0 +1,110 @@
+"""JSON and JSON Lines output, serialized as the rows come.
+
+json writes an array of objects, jsonl one object per line, keyed by column
+name, repeated names numbered from the second (id, id_2). NULL is null and numbers are numbers. Decimals are strings with their
+exact digits, dates and times ISO 8601 strings. Binary values are decoded or
+hexlified like in the other formats, stream values are written whole. orjson
+is used when it is installed.
+"""
+
+import datetime
+import json
+from decimal import Decimal
+
+from cli_helpers.utils import bytes_to_string
+
+from .formatplan import full_text
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+supported_formats = ("json", "jsonl")
+
+
+def _default(value):
+    """Encodes the values that json and orjson don't."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return bytes_to_string(bytes(value))
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return full_text(value)
+
+
+if orjson is not None:
+
+    def dumps(value):
+        return orjson.dumps(value, default=_default).decode("utf-8")
+
+else:
+
+    def dumps(value):
+        return json.dumps(
+            value, default=_default, ensure_ascii=False, separators=(",", ":")
+        )
+
+
+def unique_names(headers):
+    """The *headers* as strings, the repeated ones numbered from the second.
+
+    >>> unique_names(["id", "id", "id_2", "count", "id"])
+    ['id', 'id_3', 'id_2', 'count', 'id_4']
+    """
+    names = [str(header) for header in headers]
+    taken = set(names)
+    seen = set()
+    for i, name in enumerate(names):
+        if name in seen:
+            n = 2
+            while "%s_%d" % (name, n) in taken:
+                n += 1
+            names[i] = "%s_%d" % (name, n)
+            taken.add(names[i])
+        seen.add(name)
+    return names
+
+
+def json_lines(rows, headers, format_name="json"):
+    """Yields the lines of *rows* in the *format_name* format, json or jsonl.
+
+    >>> rows = [(1, None, Decimal("1.50")), (2, "b", datetime.date(2024, 1, 31))]
+    >>> for line in json_lines(rows, ["id", "name", "value"], "jsonl"):
+    ...     print(line)
+    {"id":1,"name":null,"value":"1.50"}
+    {"id":2,"name":"b","value":"2024-01-31"}
+    >>> list(json_lines([(1,), (2,)], ["id"]))
+    ['[', '{"id":1},', '{"id":2}', ']']
+    """
+    names = unique_names(headers)
+    encoded = (dumps(dict(zip(names, row))) for row in rows)
+    if format_name == "jsonl":
+        yield from encoded
+        return
+
+    yield "["
+    previous = None
+    for line in encoded:
+        if previous is not None:
+            yield previous + ","
+        previous = line
+    if previous is not None:
+        yield previous
+    yield "]"
+
+
+def adapter(data, headers, format_name="json", **_):
+    """The json and jsonl formats for TabularOutputFormatter."""
+    return json_lines(data, headers, format_name)
+
+
+def write_json(out, format_name, title, cur, headers):
+    """Writes a result set to *out* in the *format_name* format, json or
+    jsonl, like `delimited.write_delimited`."""
+    if title:
+        out.write(title + "\n")
+    if not cur:
+        return
+    out.writelines(line + "\n" for line in json_lines(cur, headers, format_name))
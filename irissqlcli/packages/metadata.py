@@ -0,0 +1,127 @@
+"""Compact store of the schemas, relations and columns used for completion.
+
+Catalogs have far fewer distinct names than references to them: the same
+column names come back in thousands of tables. Every name is kept once in a
+`NamePool` and referred to by its integer id. Relations are numbered, and
+the columns of each relation are an array of name ids.
+"""
+
+from array import array
+
+
+class NamePool(object):
+    """Interned names, numbered in the order they were added.
+
+    >>> pool = NamePool()
+    >>> pool.intern("id"), pool.intern("name"), pool.intern("id")
+    (0, 1, 0)
+    >>> pool.names[1], pool.get("name"), pool.get("missing")
+    ('name', 1, None)
+    """
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def get(self, name):
+        """The id of *name*, None if it was never interned."""
+        return self._ids.get(name)
+
+    def intern(self, name):
+        """The id of *name*, added to the pool if needed."""
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+
+class SchemaObjects(object):
+    """The relations of one kind (tables, views or functions) by schema,
+    with their columns. Names are interned in the shared *pool*.
+
+    >>> objects = SchemaObjects(NamePool())
+    >>> objects.add_relation("SQLUser", "orders")
+    >>> objects.add_column("SQLUser", "orders", "id")
+    >>> "SQLUser" in objects, objects.relations("SQLUser")
+    (True, ['orders'])
+    >>> objects.columns("SQLUser", "orders")
+    ['*', 'id']
+    >>> objects.columns("SQLUser", "items") is None
+    True
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        # schema name id -> position in _relations
+        self._schemas = {}
+        # per schema, relation name id -> position in _columns
+        self._relations = []
+        # per relation, the column name ids
+        self._columns = []
+
+    def __contains__(self, schema):
+        return self._schema(schema) is not None
+
+    def _schema(self, schema):
+        return self._schemas.get(self.pool.get(schema))
+
+    def _relation(self, schema, relname):
+        position = self._schema(schema)
+        if position is None:
+            return None
+        return self._relations[position].get(self.pool.get(relname))
+
+    def add_schema(self, schema):
+        """Adds *schema*, a known schema keeps its relations. Returns its
+        relations by name id."""
+        name_id = self.pool.intern(schema)
+        position = self._schemas.get(name_id)
+        if position is None:
+            position = self._schemas[name_id] = len(self._relations)
+            self._relations.append({})
+        return self._relations[position]
+
+    def add_relation(self, schema, relname):
+        """Adds *relname* to *schema*, without columns. The columns of a
+        known relation are dropped."""
+        relations = self.add_schema(schema)
+        name_id = self.pool.intern(relname)
+        position = relations.get(name_id)
+        if position is None:
+            relations[name_id] = len(self._columns)
+            self._columns.append(array("i"))
+        else:
+            self._columns[position] = array("i")
+
+    def add_column(self, schema, relname, column):
+        """Adds *column* to a relation, KeyError if the relation is
+        unknown."""
+        position = self._relation(schema, relname)
+        if position is None:
+            raise KeyError((schema, relname))
+        self._columns[position].append(self.pool.intern(column))
+
+    def schemas(self):
+        names = self.pool.names
+        return [names[name_id] for name_id in self._schemas]
+
+    def relations(self, schema):
+        """The relation names of *schema*, empty if it is unknown."""
+        position = self._schema(schema)
+        if position is None:
+            return []
+        names = self.pool.names
+        return [names[name_id] for name_id in self._relations[position]]
+
+    def columns(self, schema, relname):
+        """The column names of a relation, after an asterisk. None if the
+        relation is unknown."""
+        position = self._relation(schema, relname)
+        if position is None:
+            return None
+        names = self.pool.names
+        return ["*"] + [names[name_id] for name_id in self._columns[position]]
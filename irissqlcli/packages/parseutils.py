@@ -1,8 +1,27 @@
 from __future__ import print_function
 import re
+import threading
+from collections import OrderedDict, deque
+
 import sqlparse
+from sqlparse import lexer
+from sqlparse.engine import StatementSplitter, grouping
 from sqlparse.sql import IdentifierList, Identifier, Function
-from sqlparse.tokens import Keyword, DML, Punctuation
+from sqlparse.tokens import Keyword, DML, Error, Punctuation, Whitespace
+
+from .completion_profiler import timed
+
+PARSE_CACHE_SIZE = 32
+
+# Number of lexed texts kept, the completer parses a few related texts per
+# keystroke: the text before the cursor, the whole text, the current statement.
+LEXED_TEXTS = 4
+
+# Non-whitespace tokens lexed again before the first edited character, enough
+# for the lexer's multi word keywords like LEFT OUTER JOIN.
+RELEX_MARGIN = 8
+
+TABLE_PREFIXES = ("COPY", "FROM", "INTO", "UPDATE", "TABLE", "JOIN")
 
 cleanup_regex = {
     # This matches only alphanumerics and underscores.
@@ -62,6 +81,171 @@ def last_word(text, include="alphanum_underscore"):
             return ""
 
 
+def _common_prefix_length(a, b):
+    """
+    >>> _common_prefix_length("select * from t", "select * from u")
+    14
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _unsafe_token(tokens, token):
+    ttype, value = token
+    if ttype in Error or value == "[":
+        # An unterminated quote or [name]
+        return True
+    # An unterminated /* comment
+    return value.startswith("*") and tokens and tokens[-1][1] == "/"
+
+
+class ParseCache(object):
+    """sqlparse.parse for the completer, which parses nearly the same text on
+    every keystroke.
+
+    The lexed tokens of the last text are kept, a new text only has the part
+    after its common prefix with the last one lexed again. Grouped statements
+    are memoized by their text, so only the edited statement of a buffer is
+    grouped again. The returned statements are shared, they must not be
+    modified.
+    """
+
+    def __init__(self, size=PARSE_CACHE_SIZE):
+        self.size = size
+        # The lexed texts as (text, tokens, offsets, unsafe) tuples, most
+        # recent last. tokens are the (ttype, value) tuples of text, offsets
+        # their start offset in text and unsafe the index of the first token
+        # that may start a string or a comment once the text after it changes,
+        # like an unterminated quote.
+        self._lexed = deque([("", [], [], 0)], maxlen=LEXED_TEXTS)
+        self._statements = OrderedDict()
+        self._results = OrderedDict()
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        while len(cache) > self.size:
+            cache.popitem(last=False)
+
+    def _recall(self, cache, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    def tokenize(self, sql):
+        """Returns the (ttype, value) tokens of *sql* and their offsets."""
+        with self._lock:
+            lexed = list(self._lexed)
+        # Start from the text sharing the longest prefix with sql
+        changed, best = -1, None
+        for entry in lexed:
+            length = _common_prefix_length(entry[0], sql)
+            if length >= changed:
+                changed, best = length, entry
+        text, tokens, offsets, unsafe = best
+        if sql == text:
+            return tokens, offsets
+
+        # Keep the tokens well before the first edited character, restarting
+        # after a whitespace so that lookbehinds see the same context.
+        keep = 0
+        while keep < len(tokens) and offsets[keep] + len(tokens[keep][1]) < changed:
+            keep += 1
+        keep = min(keep, unsafe)
+        margin = RELEX_MARGIN
+        while keep > 0 and (margin > 0 or tokens[keep - 1][0] not in Whitespace):
+            keep -= 1
+            if tokens[keep][0] not in Whitespace:
+                margin -= 1
+
+        start = offsets[keep] if keep < len(offsets) else 0
+        new_tokens = tokens[:keep]
+        new_offsets = offsets[:keep]
+        offset = start
+        unsafe = None
+        for token in lexer.tokenize(sql[start:]):
+            if unsafe is None and _unsafe_token(new_tokens, token):
+                unsafe = len(new_tokens)
+            new_tokens.append(token)
+            new_offsets.append(offset)
+            offset += len(token[1])
+        if unsafe is None:
+            unsafe = len(new_tokens)
+
+        with self._lock:
+            self._lexed.append((sql, new_tokens, new_offsets, unsafe))
+        return new_tokens, new_offsets
+
+    def parse(self, sql):
+        """Same as sqlparse.parse(sql)."""
+        with self._lock:
+            result = self._recall(self._results, sql)
+        if result is not None:
+            return result
+
+        tokens, _ = self.tokenize(sql)
+        statements = []
+        for statement in StatementSplitter().process(iter(tokens)):
+            key = str(statement)
+            with self._lock:
+                grouped = self._recall(self._statements, key)
+            if grouped is None:
+                grouped = grouping.group(statement)
+                with self._lock:
+                    self._remember(self._statements, key, grouped)
+            statements.append(grouped)
+
+        result = tuple(statements)
+        with self._lock:
+            self._remember(self._results, sql, result)
+        return result
+
+    def from_clause_key(self, sql):
+        """Returns the part of *sql* that extract_tables depends on: up to the
+        first WHERE outside parentheses following a FROM, JOIN, etc."""
+        tokens, offsets = self.tokenize(sql)
+        depth = 0
+        tbl_prefix_seen = False
+        for (ttype, value), offset in zip(tokens, offsets):
+            if ttype is Punctuation:
+                depth += {"(": 1, ")": -1}.get(value, 0)
+            elif depth == 0 and ttype in Keyword:
+                value = value.upper()
+                if tbl_prefix_seen and value == "WHERE":
+                    return sql[:offset]
+                if value in TABLE_PREFIXES or value.endswith("JOIN"):
+                    tbl_prefix_seen = True
+        return sql
+
+    def tables(self, sql, extract):
+        """Returns extract(sql), memoized until the FROM clause changes."""
+        key = self.from_clause_key(sql)
+        with self._lock:
+            tables = self._recall(self._tables, key)
+        if tables is None:
+            tables = extract(sql)
+            with self._lock:
+                self._remember(self._tables, key, tables)
+        return list(tables)
+
+
+parse_cache = ParseCache()
+
+
+@timed("parse")
+def parse(sql):
+    """Memoized sqlparse.parse, see ParseCache."""
+    return parse_cache.parse(sql)
+
+
 # This code is borrowed from sqlparse example script.
 # <url>
 def is_subselect(parsed):
@@ -146,13 +330,18 @@ def extract_table_identifiers(token_stream):
 
 
 # extract_tables is inspired from examples in the sqlparse lib.
+@timed("parse")
 def extract_tables(sql):
     """Extract the table names from an SQL statement.
 
     Returns a list of (schema, table, alias) tuples
 
     """
-    parsed = sqlparse.parse(sql)
+    return parse_cache.tables(sql, _extract_tables)
+
+
+def _extract_tables(sql):
+    parsed = parse(sql)
     if not parsed:
         return []
 
@@ -165,6 +354,7 @@ def extract_tables(sql):
     return list(extract_table_identifiers(stream))
 
 
+@timed("parse")
 def find_prev_keyword(sql):
     """Find the last sql keyword in an SQL statement
 
@@ -174,7 +364,7 @@ def find_prev_keyword(sql):
     if not sql.strip():
         return None, ""
 
-    parsed = sqlparse.parse(sql)[0]
+    parsed = parse(sql)[0]
     flattened = list(parsed.flatten())
 
     logical_operators = ("AND", "OR", "NOT", "BETWEEN")
@@ -222,6 +412,22 @@ def is_destructive(queries):
     return queries_start_with(queries, keywords)
 
 
+def normalize_query(sql):
+    """Normalize a query for use as a cache or log key: comments and the
+    trailing semicolon are stripped, whitespace is collapsed and keywords
+    are upper-cased.
+
+    >>> normalize_query("select  a\\n  from t -- all\\n;")
+    'SELECT a FROM t'
+    >>> normalize_query("select 'a  b' from t")
+    "SELECT 'a  b' FROM t"
+    """
+    formatted = sqlparse.format(
+        sql, strip_comments=True, keyword_case="upper", strip_whitespace=True
+    )
+    return formatted.rstrip(";").strip()
+
+
 if __name__ == "__main__":
     sql = "select * from (select t. from tabl t"
     print(extract_tables(sql))
@@ -0,0 +1,37 @@
+"""Usage counts of the names and keywords of the executed queries, they rank
+the completions."""
+
+from collections import Counter
+
+from sqlparse import lexer
+from sqlparse.tokens import Keyword, Name, String
+
+
+class PrevalenceCounter(object):
+    """Counts by lowercase name and keyword.
+
+    >>> counter = PrevalenceCounter()
+    >>> counter.update('SELECT * FROM SQLUser."Order Items" ORDER BY id')
+    >>> sorted(counter.name_counts)
+    ['"order items"', 'id', 'sqluser']
+    >>> sorted(counter.keyword_counts)
+    ['by', 'from', 'order', 'order by', 'select']
+    """
+
+    def __init__(self):
+        self.keyword_counts = Counter()
+        self.name_counts = Counter()
+
+    def update(self, text):
+        for ttype, value in lexer.tokenize(text):
+            if ttype in Keyword:
+                words = value.lower().split()
+                if len(words) > 1:
+                    # Multi word keywords are also completed word by word
+                    self.keyword_counts.update(words)
+                self.keyword_counts[" ".join(words)] += 1
+            elif ttype in Name or ttype in String.Symbol:
+                self.name_counts[value.lower()] += 1
+
+    def clear_names(self):
+        self.name_counts = Counter()
@@ -0,0 +1,68 @@
+"""Output pipeline of the formatted results.
+
+The lines of a result are joined into chunks of `CHUNK_LINES` lines. Each
+chunk is written to the file sinks (the audit log, the tee and once files),
+then to the display: the terminal or the pager subprocess. The chunks left
+when the user quits the pager are still written to the file sinks. Whether
+a result fits on the screen is decided once, from its first lines.
+"""
+
+from itertools import islice
+
+import click
+
+# Number of lines written at once to the sinks
+CHUNK_LINES = 1000
+
+
+def screen_prefix(lines, rows, columns):
+    """Reads the first lines of the iterator *lines*, one more than *rows* at
+    most. Returns them and whether the whole result fits in *rows* and
+    *columns*.
+
+    >>> screen_prefix(iter(["a", "b", "c", "d"]), 2, 10)
+    (['a', 'b', 'c'], False)
+    >>> screen_prefix(iter(["a", "b"]), 2, 10)
+    (['a', 'b'], True)
+    """
+    prefix = list(islice(lines, max(rows, 0) + 1))
+    fits = len(prefix) <= rows and all(len(line) <= columns for line in prefix)
+    return prefix, fits
+
+
+def chunks(lines, size=CHUNK_LINES):
+    """Joins *lines* into chunks of *size* lines.
+
+    >>> list(chunks(["a", "b", "c"], 2))
+    ['a\\nb', 'c']
+    """
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, size))
+        if not batch:
+            return
+        yield "\n".join(batch)
+
+
+def fan_out(chunks, sinks):
+    """Yields *chunks*, after writing each to the *sinks*."""
+    for chunk in chunks:
+        for sink in sinks:
+            sink(chunk)
+        yield chunk
+
+
+def to_terminal(chunks):
+    for chunk in chunks:
+        click.secho(chunk)
+
+
+def to_pager(chunks):
+    """Writes *chunks* to the pager subprocess as they come."""
+    click.echo_via_pager(chunk + "\n" for chunk in chunks)
+
+
+def drain(chunks):
+    """Reads the rest of *chunks*, once the display stopped reading them."""
+    for _ in chunks:
+        pass
@@ -0,0 +1,184 @@
+from __future__ import unicode_literals
+import logging
+import re
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, namedtuple
+
+from . import export
+from .main import special_command, PARSED_QUERY
+from ..parseutils import normalize_query
+
+log = logging.getLogger(__name__)
+
+Plan = namedtuple("Plan", ["cost", "lines", "modules"])
+Module = namedtuple("Module", ["name", "cost", "lines"])
+
+MAP_REGEX = re.compile(
+    r"\b(master map|index map|bitmap index|extent bitmap)\s+"
+    r"([%$\w]+(?:\.[%$\w]+)+)",
+    re.IGNORECASE,
+)
+TAG_REGEX = re.compile(r"<[^>]*>")
+
+PLAN_CACHE_SIZE = 100
+plan_cache = OrderedDict()
+
+
+@export
+def clear_plan_cache():
+    plan_cache.clear()
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text_lines(element, skip=("sql",)):
+    """Collect the text of *element*, leaving out the text inside the
+    children listed in *skip* and inside modules."""
+    text = [element.text or ""]
+    for child in element:
+        if child.tag not in skip and child.tag != "module":
+            text.append("".join(child.itertext()))
+        text.append(child.tail or "")
+    return [line.rstrip() for line in "".join(text).splitlines() if line.strip()]
+
+
+def parse_plan(xml_text):
+    """Parse the XML returned by IRIS for EXPLAIN into a list of Plans.
+
+    >>> plans = parse_plan('''<plans><plan><sql>select 1</sql>
+    ... <cost value="12"/>
+    ...  Call module B.
+    ...  Output the row.
+    ... <module name="B" cost="3">
+    ...  Read master map SQLUser.T.IDKEY.
+    ... </module>
+    ... </plan></plans>''')
+    >>> plans[0].cost, plans[0].lines
+    (12.0, [' Call module B.', ' Output the row.'])
+    >>> plans[0].modules
+    [Module(name='B', cost=3.0, lines=[' Read master map SQLUser.T.IDKEY.'])]
+    """
+    try:
+        root = ET.fromstring(xml_text.strip())
+    except ET.ParseError:
+        log.debug("Unable to parse query plan: %r", xml_text)
+        lines = TAG_REGEX.sub("", xml_text).splitlines()
+        return [Plan(None, [line.rstrip() for line in lines if line.strip()], [])]
+
+    plans = []
+    for plan in [root] if root.tag == "plan" else root.iter("plan"):
+        cost = plan.find("cost")
+        modules = [
+            Module(m.get("name", "?"), _number(m.get("cost")), _text_lines(m))
+            for m in plan.iter("module")
+        ]
+        plans.append(
+            Plan(
+                _number(cost.get("value")) if cost is not None else None,
+                _text_lines(plan, skip=("sql", "cost")),
+                modules,
+            )
+        )
+    return plans
+
+
+def _build_tree(lines):
+    """Nest plan lines by their indentation, returns a list of
+    (text, children) nodes."""
+    root = []
+    stack = [(-1, root)]
+    for line in lines:
+        indent = len(line) - len(line.lstrip())
+        while stack[-1][0] >= indent:
+            stack.pop()
+        node = (line.strip(), [])
+        stack[-1][1].append(node)
+        stack.append((indent, node[1]))
+    return root
+
+
+def _render_tree(nodes, prefix=""):
+    for i, (text, children) in enumerate(nodes):
+        last = i == len(nodes) - 1
+        yield prefix + ("└── " if last else "├── ") + text
+        for line in _render_tree(children, prefix + ("    " if last else "│   ")):
+            yield line
+
+
+def _format_cost(cost):
+    return "%g" % cost if cost is not None else "unknown"
+
+
+def render_plan(plans):
+    """Render parsed plans as a list of text lines.
+
+    >>> for line in render_plan([Plan(10.0, ["Read index map T.I.", " For each row:",
+    ...                                      "  Output the row."],
+    ...                               [Module("B", 4.0, ["Read master map T.IDKEY."])])]):
+    ...     print(line)
+    Plan cost: 10
+    ├── Read index map T.I.
+    │   └── For each row:
+    │       └── Output the row.
+    └── Module B (cost 4, 40.0%)
+        └── Read master map T.IDKEY.
+    Maps used: T.I (index map), T.IDKEY (master map)
+    """
+    output = []
+    for n, plan in enumerate(plans, 1):
+        title = "Plan cost: %s" if len(plans) == 1 else "Plan %d cost: %%s" % n
+        output.append(title % _format_cost(plan.cost))
+
+        nodes = _build_tree(plan.lines)
+        for module in plan.modules:
+            label = "Module %s (cost %s" % (module.name, _format_cost(module.cost))
+            if module.cost is not None and plan.cost:
+                label += ", %0.1f%%" % (100 * module.cost / plan.cost)
+            nodes.append((label + ")", _build_tree(module.lines)))
+        output.extend(_render_tree(nodes))
+
+        maps = OrderedDict()
+        for line in plan.lines + [l for m in plan.modules for l in m.lines]:
+            for kind, name in MAP_REGEX.findall(line):
+                maps.setdefault(name.rstrip("."), kind.lower())
+        if maps:
+            output.append(
+                "Maps used: "
+                + ", ".join("%s (%s)" % (name, kind) for name, kind in maps.items())
+            )
+    return output
+
+
+@special_command(
+    "\\explain",
+    "\\explain[+] query",
+    "Show the query plan (+ to bypass the plan cache).",
+    arg_type=PARSED_QUERY,
+    case_sensitive=True,
+)
+def explain(cur, arg=None, arg_type=PARSED_QUERY, verbose=False):
+    if not arg:
+        return [(None, None, None, "Missing required argument, query.")]
+
+    key = normalize_query(arg)
+    cached = key in plan_cache and not verbose
+    if cached:
+        plan_cache.move_to_end(key)
+        lines = plan_cache[key]
+    else:
+        query = "EXPLAIN " + arg
+        log.debug(query)
+        cur.execute(query)
+        xml_text = "".join(str(row[0]) for row in cur.fetchall() if row[0])
+        lines = render_plan(parse_plan(xml_text))
+        plan_cache[key] = lines
+        while len(plan_cache) > PLAN_CACHE_SIZE:
+            plan_cache.popitem(last=False)
+
+    status = "(cached)" if cached else ""
+    return [(None, [(line,) for line in lines], ["Query Plan"], status)]
@@ -1,11 +1,13 @@
 from __future__ import unicode_literals
 import os
+from contextlib import contextmanager
 from io import open
 
 import click
 from configobj import ConfigObj
 
 from . import export
+from ..compressedfile import CompressedFile, open_output
 from .main import special_command, NO_QUERY, PARSED_QUERY
 from .favoritequeries import FavoriteQueries
 
@@ -22,6 +24,17 @@ def set_favorite_queries(config):
     favoritequeries = FavoriteQueries(config)
 
 
+@export
+def set_expanded_output(val):
+    global use_expanded_output
+    use_expanded_output = val
+
+
+@export
+def is_expanded_output():
+    return use_expanded_output
+
+
 @export
 def set_pager_enabled(val):
     global PAGER_ENABLED
@@ -95,7 +108,7 @@ def set_tee(arg, **_):
     global tee_file
 
     try:
-        tee_file = open(**parseargfile(arg))
+        tee_file = open_output(**parseargfile(arg))
     except (IOError, OSError) as e:
         raise OSError("Cannot write to file '{}': {}".format(e.filename, e.strerror))
 
@@ -104,16 +117,25 @@ def set_tee(arg, **_):
 
 @export
 def close_tee():
+    """Closes the tee file. Returns the summary of a compressed file."""
     global tee_file
     if tee_file:
-        tee_file.close()
-        tee_file = None
+        try:
+            tee_file.close()
+        finally:
+            closed, tee_file = tee_file, None
+        if isinstance(closed, CompressedFile):
+            return closed.summary()
 
 
 @special_command("notee", "notee", "Stop writing results to an output file.")
 def no_tee(arg, **_):
-    close_tee()
-    return [(None, None, None, "")]
+    return [(None, None, None, close_tee() or "")]
+
+
+@export
+def is_tee_enabled():
+    return tee_file is not None
 
 
 @export
@@ -140,22 +162,42 @@ def set_once(arg, **_):
 
 
 @export
-def write_once(output):
-    global once_file, written_to_once_file
-    if output and once_file:
-        try:
-            f = open(**once_file)
-        except (IOError, OSError) as e:
-            once_file = None
-            raise OSError(
-                "Cannot write to file '{}': {}".format(e.filename, e.strerror)
-            )
-
-        with f:
-            click.echo(output, file=f, nl=False)
-            click.echo("\n", file=f, nl=False)
+@contextmanager
+def once_writer():
+    """Yields the writer of the output of one result to the once file, None
+    when it is not set. The file is opened on the first write and stays open
+    until the result is written."""
+    global once_file
+    if not once_file:
+        yield None
+        return
+
+    opened = []
+
+    def write_once(output):
+        global once_file, written_to_once_file
+        if not output:
+            return
+        if not opened:
+            try:
+                opened.append(open_output(**once_file))
+            except (IOError, OSError) as e:
+                once_file = None
+                raise OSError(
+                    "Cannot write to file '{}': {}".format(e.filename, e.strerror)
+                )
+        click.echo(output, file=opened[0], nl=False)
+        click.echo("\n", file=opened[0], nl=False)
         written_to_once_file = True
 
+    try:
+        yield write_once
+    finally:
+        if opened:
+            opened[0].close()
+            if isinstance(opened[0], CompressedFile):
+                click.secho(opened[0].summary())
+
 
 @export
 def unset_once_if_written():
@@ -149,12 +149,17 @@ def quit(*_args):
     arg_type=NO_QUERY,
     case_sensitive=True,
 )
-# @special_command(
-#     "\\G",
-#     "\\G",
-#     "Display current query results vertically.",
-#     arg_type=NO_QUERY,
-#     case_sensitive=True,
-# )
 def stub():
     raise NotImplementedError
+
+
+@special_command(
+    "\\G",
+    "\\G",
+    "Display current query results vertically.",
+    arg_type=NO_QUERY,
+    case_sensitive=True,
+)
+def vertical_usage():
+    # \G is a query terminator, on its own it only explains itself
+    return [(None, None, None, "End a query with \\G to show its results vertically.")]
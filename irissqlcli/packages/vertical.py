@@ -0,0 +1,50 @@
+"""Streaming vertical output, for the queries ending with \\G.
+
+The vertical format of cli_helpers formats the whole result at once. Here
+the records are written as the rows come, one line per column, after the
+headers were styled and padded once. The output is the same.
+"""
+
+from cli_helpers.utils import filter_style_table, style_field
+from pygments.token import Token
+
+
+def vertical_lines(
+    rows, headers, sep_title="{n}. row", sep_character="*", sep_length=27, style=None
+):
+    """Yields the lines of the records of *rows*, lists of strings, like the
+    vertical format of cli_helpers.
+
+    >>> rows = [["1", "first\\nline"], ["2", "x"]]
+    >>> for line in vertical_lines(rows, ["id", "name"], "RECORD {n}", "-", (1, 5)):
+    ...     print(line)
+    -[ RECORD 1 ]-----
+    id   | 1
+    name | first
+    line
+    -[ RECORD 2 ]-----
+    id   | 2
+    name | x
+    """
+    header_token = Token.Output.Header
+    odd_token, even_token = Token.Output.OddRow, Token.Output.EvenRow
+    styles = filter_style_table(style, header_token, odd_token, even_token)
+    if style and styles.get(header_token):
+        headers = [style_field(header_token, header, style) for header in headers]
+    style_rows = style and (styles.get(odd_token) or styles.get(even_token))
+
+    width = max((len(header) for header in headers), default=0)
+    prefixes = [header.ljust(width) + " | " for header in headers]
+    left = right = sep_length
+    if isinstance(sep_length, tuple):
+        left, right = sep_length
+    left, right = sep_character * left, sep_character * right
+
+    for n, row in enumerate(rows, 1):
+        if style_rows:
+            token = odd_token if n % 2 else even_token
+            row = [style_field(token, value, style) for value in row]
+        record = "\n".join(map(str.__add__, prefixes, row))
+        yield "%s[ %s ]%s" % (left, sep_title.format(n=n), right)
+        # Multi-line values are split into lines
+        yield from record.split("\n")
@@ -0,0 +1,54 @@
+import datetime as dt
+import json
+import logging
+import os
+import threading
+
+from .config import ensure_dir_exists
+from .packages.parseutils import normalize_query
+
+_logger = logging.getLogger(__name__)
+
+
+class SlowQueryLog(object):
+    """Append statements slower than *threshold* milliseconds to *path* as
+    JSON lines."""
+
+    def __init__(self, path, threshold):
+        self.path = os.path.expanduser(path)
+        self.threshold = threshold
+        self._file = None
+        self._lock = threading.Lock()
+
+    def is_slow(self, stats):
+        return (stats.execute_time + stats.fetch_time) * 1000 >= self.threshold
+
+    def log(self, stats, namespace=None, connection_id=None):
+        """Write the QueryStats *stats* of a slow statement."""
+        entry = {
+            "time": dt.datetime.now().isoformat(),
+            "sql": normalize_query(stats.sql),
+            "execute_ms": round(stats.execute_time * 1000, 3),
+            "fetch_ms": round(stats.fetch_time * 1000, 3),
+            "total_ms": round((stats.execute_time + stats.fetch_time) * 1000, 3),
+            "rows": stats.rowcount,
+            "bytes": stats.bytes,
+            "namespace": namespace,
+            "connection_id": connection_id,
+        }
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            try:
+                if self._file is None:
+                    ensure_dir_exists(self.path)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line + "\n")
+                self._file.flush()
+            except (IOError, OSError) as e:
+                _logger.error("Unable to write slow query log %r: %r", self.path, e)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -1,18 +1,83 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 import logging
+import threading
 from re import compile, escape
 from collections import Counter
+from itertools import islice
+from time import monotonic
 
 from prompt_toolkit.completion import Completer, Completion
 
+from .packages import completion_profiler
 from .packages.completion_engine import suggest_type
+from .packages.fuzzymatch import FuzzyIndex, FuzzyScan
+from .packages.metadata import NamePool, SchemaObjects
 from .packages.parseutils import last_word
+from .packages.prioritization import PrevalenceCounter
 from .packages.special.iocommands import favoritequeries
 from .packages.filepaths import parse_path, complete_path, suggest_path
 
 _logger = logging.getLogger(__name__)
 
+# Number of candidates find_matches scans between two budget checks
+SCAN_CHUNK_SIZE = 1024
+
+# Number of completions yielded before the time budget applies, the first
+# page of the completion menu
+FIRST_PAGE_SIZE = 100
+
+# Schema objects indexed on the keystroke that needs them, up to this number.
+# The larger ones are indexed in the background and scanned meanwhile.
+INDEX_BUILD_SIZE = 5000
+
+
+class CompletionBudget(object):
+    """Limits of one get_completions request: *time_budget* seconds and
+    *max_completions* completions, 0 for no limit.
+
+    The time runs from start(), once the suggestion types are known, and the
+    time spent waiting on the consumer of the completions is not counted.
+    The first `FIRST_PAGE_SIZE` completions are yielded whatever the time.
+    """
+
+    def __init__(self, completer, time_budget=0, max_completions=0):
+        self.completer = completer
+        self.request = completer._request
+        self.time_budget = time_budget
+        self.deadline = None
+        self.remaining = max_completions or None
+        self.count = 0
+
+    def start(self):
+        """Starts the clock of the time budget."""
+        if self.time_budget:
+            self.deadline = monotonic() + self.time_budget
+
+    def pause(self, seconds):
+        """Moves the deadline by *seconds* not spent completing."""
+        if self.deadline is not None:
+            self.deadline += seconds
+
+    def stale(self):
+        """Whether a newer request started on the completer."""
+        return self.completer._request != self.request
+
+    def out_of_time(self):
+        return self.deadline is not None and monotonic() > self.deadline
+
+    def exhausted(self):
+        return self.stale() or self.out_of_time()
+
+    def spend(self):
+        """Count a yielded completion, returns whether the budget ran out."""
+        self.count += 1
+        if self.remaining is not None:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                return True
+        return self.count >= FIRST_PAGE_SIZE and self.out_of_time()
+
 
 class SQLCompleter(Completer):
     keywords = [
@@ -348,8 +413,18 @@ class SQLCompleter(Completer):
         "$ZVERSION",
     ]
 
-    def __init__(self, supported_formats=(), keyword_casing="auto"):
+    def __init__(
+        self,
+        supported_formats=(),
+        keyword_casing="auto",
+        time_budget=0,
+        max_completions=0,
+    ):
         super(self.__class__, self).__init__()
+        self.time_budget = time_budget
+        self.max_completions = max_completions
+        self._request = 0
+        self.prioritizer = PrevalenceCounter()
         self.reserved_words = set()
         for x in self.keywords:
             self.reserved_words.update(x.split())
@@ -395,18 +470,15 @@ class SQLCompleter(Completer):
         self.all_completions.update(additional_keywords)
 
     def extend_schemas(self, data, kind):
+        self._indexes = {}
+        metadata = self.dbmetadata[kind]
         try:
-            data = [self.escaped_names(d) for d in data]
+            for [
+                schema,
+            ] in data:
+                metadata.add_schema(self.escape_name(schema))
         except Exception as ex:
             logging.exception(ex)
-            data = []
-
-        metadata = self.dbmetadata[kind]
-        for [
-            schema,
-        ] in data:
-            metadata[schema] = {}
-            self.all_completions.add(schema)
 
     def extend_relations(self, data, kind):
         """Extend metadata for tables or views
@@ -418,20 +490,16 @@ class SQLCompleter(Completer):
         # 'data' is a generator object. It can throw an exception while being
         # consumed. This could happen if the user has launched the app without
         # specifying a database name. This exception must be handled to prevent
-        # crashing.
+        # crashing. The rows are added as they come, a large catalog is never
+        # held in a list.
+        self._indexes = {}
+        metadata = self.dbmetadata[kind]
         try:
-            data = [self.escaped_names(d) for d in data]
+            for row in data:
+                schema, relname = self.escaped_names(row)
+                metadata.add_relation(schema, relname)
         except Exception as ex:
             logging.exception(ex)
-            data = []
-
-        # dbmetadata['tables'][$schema_name][$table_name] should be a list of
-        # column names. Default to an asterisk
-        metadata = self.dbmetadata[kind]
-        for [schema, relname] in data:
-            metadata[schema] = metadata[schema] if schema in metadata else {}
-            metadata[schema][relname] = ["*"]
-            self.all_completions.add(relname)
 
     def extend_columns(self, column_data, kind):
         """Extend column metadata
@@ -444,38 +512,51 @@ class SQLCompleter(Completer):
         # being consumed. This could happen if the user has launched the app
         # without specifying a database name. This exception must be handled to
         # prevent crashing.
+        self._indexes = {}
+        metadata = self.dbmetadata[kind]
         try:
-            column_data = [self.escaped_names(d) for d in column_data]
+            for row in column_data:
+                schema, relname, column = self.escaped_names(row)
+                try:
+                    metadata.add_column(schema, relname, column)
+                except KeyError:
+                    # Columns of a relation that was not listed
+                    pass
         except Exception as ex:
             logging.exception(ex)
-            column_data = []
-
-        metadata = self.dbmetadata[kind]
-        for schema, relname, column in column_data:
-            metadata[schema][relname].append(column)
-            self.all_completions.add(column)
 
     def extend_functions(self, func_data):
+        """Extend function metadata
+
+        :param func_data: list of (schema_name, function_name) tuples
+        :return:
+        """
         # 'func_data' is a generator object. It can throw an exception while
         # being consumed. This could happen if the user has launched the app
         # without specifying a database name. This exception must be handled to
         # prevent crashing.
-        try:
-            func_data = [self.escaped_names(d) for d in func_data]
-        except Exception:
-            func_data = []
-
-        # dbmetadata['functions'][$schema_name][$function_name] should return
-        # function metadata.
+        self._indexes = {}
         metadata = self.dbmetadata["functions"]
-
-        for func in func_data:
-            metadata[func[0]] = None
-            self.all_completions.add(func[0])
+        try:
+            for func in func_data:
+                schema, name = self.escaped_names(func[:2])
+                metadata.add_relation(schema, name)
+        except Exception as ex:
+            logging.exception(ex)
 
     def reset_completions(self):
         self.databases = []
-        self.dbmetadata = {"tables": {}, "views": {}, "functions": {}}
+        # The names of all the kinds are interned in one pool
+        pool = NamePool()
+        self.dbmetadata = {
+            "tables": SchemaObjects(pool),
+            "views": SchemaObjects(pool),
+            "functions": SchemaObjects(pool),
+        }
+        # FuzzyIndex of the schema objects, by (schema, obj_type)
+        self._indexes = {}
+        # (indexes, key, names) of the indexes to build in the background
+        self._builds = []
         self.all_completions = set(
             self.keywords + self.agg_functions + self.functions + self.variables
         )
@@ -488,6 +569,8 @@ class SQLCompleter(Completer):
         fuzzy=True,
         casing=None,
         punctuations="most_punctuations",
+        budget=None,
+        usage=None,
     ):
         """Find completion matches for the given text.
 
@@ -495,31 +578,33 @@ class SQLCompleter(Completer):
         completions, find completions matching the last word of the
         text.
 
-        If `start_only` is True, the text will match an available
-        completion only at the beginning. Otherwise, a completion is
-        considered a match if the text appears anywhere within it.
+        If `fuzzy` is True, a completion matches if the text is a subsequence
+        of it. The matches are ranked by FuzzyIndex, which is built from the
+        collection unless it already is one. Otherwise, if `start_only` is
+        True, the text will match an available completion only at the
+        beginning, and anywhere within it if not.
+
+        `usage` maps lowercase completions to their use counts, the most used
+        matches rank first.
 
         yields prompt_toolkit Completion instances for any matches found
-        in the collection of available completions.
+        in the collection of available completions, best matches first.
+
+        If a CompletionBudget `budget` runs out while scanning, the matches
+        found so far are returned.
         """
         last = last_word(text, include=punctuations)
         text = last.lower()
 
-        completions = []
-
         if fuzzy:
-            regex = ".*?".join(map(escape, text))
-            pat = compile("(%s)" % regex)
-            for item in sorted(collection):
-                r = pat.search(item.lower())
-                if r:
-                    completions.append((len(r.group()), r.start(), item))
+            if not isinstance(collection, (FuzzyIndex, FuzzyScan)):
+                with completion_profiler.phase("match"):
+                    collection = FuzzyIndex(collection)
+            matches = collection.find(text, usage, budget)
         else:
-            match_end_limit = len(text) if start_only else None
-            for item in sorted(collection):
-                match_point = item.lower().find(text, 0, match_end_limit)
-                if match_point >= 0:
-                    completions.append((len(text), match_point, item))
+            matches = SQLCompleter._find_substrings(
+                text, collection, start_only, budget, usage or {}
+            )
 
         if casing == "auto":
             casing = "lower" if last and last[-1].islower() else "upper"
@@ -529,23 +614,74 @@ class SQLCompleter(Completer):
                 return kw.upper()
             return kw.lower()
 
-        _logger.debug(
-            "find_matches: %r; %r - %r/%r",
-            fuzzy,
-            text,
-            len(collection),
-            len(completions),
-        )
         return (
             Completion(z if casing is None else apply_case(z), -len(text))
-            for x, y, z in sorted(completions)
+            for z in matches
         )
 
+    @staticmethod
+    def _find_substrings(text, collection, start_only, budget, usage):
+        """Returns the items of `collection` containing `text`, or starting
+        with it if `start_only`, leftmost and most used match first."""
+        completions = []
+
+        with completion_profiler.phase("match"):
+            match_end_limit = len(text) if start_only else None
+
+            def match(item):
+                match_point = item.lower().find(text, 0, match_end_limit)
+                if match_point >= 0:
+                    count = usage.get(item.lower(), 0)
+                    completions.append((match_point, -count, item))
+
+            items = iter(collection)
+            while True:
+                chunk = list(islice(items, SCAN_CHUNK_SIZE))
+                if not chunk:
+                    break
+                for item in chunk:
+                    match(item)
+                if budget and budget.exhausted():
+                    _logger.debug("find_matches: out of budget, partial results")
+                    break
+
+        _logger.debug("find_matches: %r - %r", text, len(completions))
+        with completion_profiler.phase("sort"):
+            completions.sort()
+        return [item for _, _, item in completions]
+
     def get_completions(self, document, complete_event):
+        """Yields the completions, stopping once the time budget or the
+        maximum number of completions is reached, or when a newer request
+        started."""
+        self._request += 1
+        budget = CompletionBudget(self, self.time_budget, self.max_completions)
+        count = 0
+        try:
+            with completion_profiler.keystroke(document.text_before_cursor):
+                for matches in self._get_completions(document, budget):
+                    for completion in matches:
+                        if budget.stale():
+                            _logger.debug("Completions: dropped stale request")
+                            return
+                        waiting = monotonic()
+                        yield completion
+                        budget.pause(monotonic() - waiting)
+                        count += 1
+                        if budget.spend():
+                            _logger.debug("Completions: %r, out of budget", count)
+                            return
+            _logger.debug("Completions: %r", count)
+        finally:
+            self._start_builds()
+
+    def _get_completions(self, document, budget):
+        """Yields the matches of each suggestion type."""
         word_before_cursor = document.get_word_before_cursor(WORD=True)
-        completions = []
-        suggestions = []
         suggestions = suggest_type(document.text, document.text_before_cursor)
+        budget.start()
+        name_counts = self.prioritizer.name_counts
+        keyword_counts = self.prioritizer.keyword_counts
 
         for suggestion in suggestions:
 
@@ -566,14 +702,21 @@ class SQLCompleter(Completer):
                         if count > 1 and col != "*"
                     ]
 
-                cols = self.find_matches(word_before_cursor, scoped_cols)
-                completions.extend(cols)
+                cols = self.find_matches(
+                    word_before_cursor,
+                    scoped_cols,
+                    budget=budget,
+                    usage=name_counts,
+                )
+                yield cols
 
             elif suggestion["type"] == "function":
                 # suggest user-defined functions using substring matching
-                funcs = self.populate_schema_objects(suggestion["schema"], "functions")
-                user_funcs = self.find_matches(word_before_cursor, funcs)
-                completions.extend(user_funcs)
+                funcs = self.schema_objects_index(suggestion["schema"], "functions")
+                user_funcs = self.find_matches(
+                    word_before_cursor, funcs, budget=budget, usage=name_counts
+                )
+                yield user_funcs
 
                 # suggest hardcoded functions using startswith matching only if
                 # there is no schema qualifier. If a schema qualifier is
@@ -586,32 +729,47 @@ class SQLCompleter(Completer):
                         start_only=True,
                         fuzzy=False,
                         casing=self.keyword_casing,
+                        budget=budget,
+                        usage=name_counts,
                     )
-                    completions.extend(predefined_funcs)
+                    yield predefined_funcs
 
             elif suggestion["type"] == "schema":
-                schemas = self.populate_schema_objects(None, "schemas")
-                schemas = self.find_matches(word_before_cursor, schemas)
-                completions.extend(schemas)
+                schemas = self.schema_objects_index(None, "schemas")
+                schemas = self.find_matches(
+                    word_before_cursor, schemas, budget=budget, usage=name_counts
+                )
+                yield schemas
 
             elif suggestion["type"] == "table":
-                tables = self.populate_schema_objects(suggestion["schema"], "tables")
-                tables = self.find_matches(word_before_cursor, tables)
-                completions.extend(tables)
+                tables = self.schema_objects_index(suggestion["schema"], "tables")
+                tables = self.find_matches(
+                    word_before_cursor, tables, budget=budget, usage=name_counts
+                )
+                yield tables
 
             elif suggestion["type"] == "view":
-                views = self.populate_schema_objects(suggestion["schema"], "views")
-                views = self.find_matches(word_before_cursor, views)
-                completions.extend(views)
+                views = self.schema_objects_index(suggestion["schema"], "views")
+                views = self.find_matches(
+                    word_before_cursor, views, budget=budget, usage=name_counts
+                )
+                yield views
 
             elif suggestion["type"] == "alias":
                 aliases = suggestion["aliases"]
-                aliases = self.find_matches(word_before_cursor, aliases)
-                completions.extend(aliases)
+                aliases = self.find_matches(
+                    word_before_cursor, aliases, budget=budget, usage=name_counts
+                )
+                yield aliases
 
             elif suggestion["type"] == "database":
-                dbs = self.find_matches(word_before_cursor, self.databases)
-                completions.extend(dbs)
+                dbs = self.find_matches(
+                    word_before_cursor,
+                    self.databases,
+                    budget=budget,
+                    usage=name_counts,
+                )
+                yield dbs
 
             elif suggestion["type"] == "keyword":
                 keywords = self.find_matches(
@@ -621,8 +779,10 @@ class SQLCompleter(Completer):
                     fuzzy=False,
                     casing=self.keyword_casing,
                     punctuations="many_punctuations",
+                    budget=budget,
+                    usage=keyword_counts,
                 )
-                completions.extend(keywords)
+                yield keywords
 
             elif suggestion["type"] == "special":
                 special = self.find_matches(
@@ -631,8 +791,9 @@ class SQLCompleter(Completer):
                     start_only=True,
                     fuzzy=False,
                     punctuations="many_punctuations",
+                    budget=budget,
                 )
-                completions.extend(special)
+                yield special
             # elif suggestion["type"] == "favoritequery":
             #     queries = self.find_matches(
             #         word_before_cursor,
@@ -640,18 +801,23 @@ class SQLCompleter(Completer):
             #         start_only=False,
             #         fuzzy=True,
             #     )
-            #     completions.extend(queries)
+            #     yield queries
             elif suggestion["type"] == "table_format":
                 formats = self.find_matches(
-                    word_before_cursor, self.table_formats, start_only=True, fuzzy=False
+                    word_before_cursor,
+                    self.table_formats,
+                    start_only=True,
+                    fuzzy=False,
+                    budget=budget,
                 )
-                completions.extend(formats)
+                yield formats
             elif suggestion["type"] == "file_name":
                 file_names = self.find_files(word_before_cursor)
-                completions.extend(file_names)
+                yield file_names or ()
 
-        _logger.debug("Completions: %r", len(completions))
-        return completions
+    def extend_query_history(self, text):
+        """Count the names and keywords of an executed query."""
+        self.prioritizer.update(text)
 
     def find_files(self, word):
         """Yield matching directory or file names.
@@ -684,17 +850,48 @@ class SQLCompleter(Completer):
             schema = schema if schema is not None else "SQLUser"
 
             for obj_type in ["tables", "views"]:
-                if not obj_type in meta:
-                    continue
                 for _schema in [schema, self.escape_name(schema)]:
-                    if not _schema in meta[obj_type]:
-                        continue
                     for _relname in [relname, self.escape_name(relname)]:
-                        if not _relname in meta[obj_type][_schema]:
-                            continue
-                        columns.extend(meta[obj_type][_schema][_relname])
+                        columns.extend(meta[obj_type].columns(_schema, _relname) or ())
         return list(set(columns))
 
+    def schema_objects_index(self, schema, obj_type, background=True):
+        """Returns the FuzzyIndex of populate_schema_objects, built on first
+        use and kept until the metadata changes.
+
+        With *background*, an index of more than `INDEX_BUILD_SIZE` names is
+        built by a thread, a FuzzyScan of the names is returned until it is
+        ready.
+        """
+        key = (tuple(schema) if isinstance(schema, list) else schema, obj_type)
+        indexes = self._indexes
+        index = indexes.get(key)
+        if index is None or (isinstance(index, FuzzyScan) and not background):
+            names = self.populate_schema_objects(schema, obj_type)
+            if background and len(names) > INDEX_BUILD_SIZE:
+                index = indexes[key] = FuzzyScan(names)
+                # Started once the completions are yielded, the build would
+                # slow down the scan
+                self._builds.append((indexes, key, names))
+            else:
+                index = indexes[key] = FuzzyIndex(names)
+        return index
+
+    def _start_builds(self):
+        """Starts the threads building the indexes scanned meanwhile."""
+        while self._builds:
+            threading.Thread(
+                target=self._build_index,
+                args=self._builds.pop(),
+                name="fuzzy_index",
+                daemon=True,
+            ).start()
+
+    @staticmethod
+    def _build_index(indexes, key, names):
+        # A metadata change replaces self._indexes, the index is then dropped
+        indexes[key] = FuzzyIndex(names)
+
     def populate_schema_objects(self, schema, obj_type):
         """Returns list of tables or functions for a (optional) schema"""
         objects = []
@@ -702,8 +899,8 @@ class SQLCompleter(Completer):
             obj_type = "tables"
             schema = "SQLUser"
             schemas = []
-            schemas.extend(self.dbmetadata["tables"].keys())
-            schemas.extend(self.dbmetadata["views"].keys())
+            schemas.extend(self.dbmetadata["tables"].schemas())
+            schemas.extend(self.dbmetadata["views"].schemas())
             objects.extend([schema + "." for schema in schemas])
         metadata = self.dbmetadata[obj_type]
         schema = (
@@ -713,11 +910,11 @@ class SQLCompleter(Completer):
             return objects
         try:
             if schema is None:
-                objects = metadata.keys()
+                objects = metadata.schemas()
             elif schema in metadata:
-                objects.extend(metadata[schema].keys())
+                objects.extend(metadata.relations(schema))
             elif self.escape_name(schema) in metadata:
-                objects.extend(metadata[self.escape_name(schema)].keys())
+                objects.extend(metadata.relations(self.escape_name(schema)))
         except KeyError:
             _logger.debug("populate_schema_objects error: %r - %r\n", schema, obj_type)
             # schema doesn't exist
@@ -1,46 +1,145 @@
+import functools
 import logging
+import threading
 import iris
 import sqlparse
 import traceback
+from collections import namedtuple
+from time import time
 
+from .lobs import (
+    FETCH_BATCH_SIZE,
+    LobHandle,
+    LobSpool,
+    fetch_spooled,
+    lob_columns,
+    spooled,
+)
 from .packages import special
 from .utils import parse_uri
 
 _logger = logging.getLogger(__name__)
 
+# Server introspection results, looked up on demand and cached per host:port
+# for the lifetime of the process.
+server_info_cache = {}
+_server_info_lock = threading.Lock()
+
+# Per-phase timings of the last regular statement run by SQLExecute
+QueryStats = namedtuple(
+    "QueryStats",
+    [
+        "sql",  # The statement that was executed
+        "execute_time",  # Time spent in cursor.execute
+        "fetch_time",  # Time spent fetching the rows
+        "rowcount",  # Number of rows fetched or affected
+        "bytes",  # Estimated size of the fetched rows, None if not measured
+    ],
+)
+
+
+def result_size(rows):
+    """Estimate the number of bytes in a fetched result set.
+
+    >>> result_size([(1, "abc"), (None, b"de")])
+    6
+    """
+    size = 0
+    for row in rows or ():
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, (bytes, bytearray, LobHandle)):
+                size += len(value)
+            else:
+                size += len(str(value))
+    return size
+
+
+# Schemas whose objects are loaded for completion. Patterns match the whole
+# schema name, * matches any characters and ? one. The objects of the
+# excluded schemas, and past the first max_objects of each catalog query, are
+# not loaded; 0 means no limit.
+CatalogFilter = namedtuple("CatalogFilter", ["include", "exclude", "max_objects"])
+CatalogFilter.__new__.__defaults__ = ((), (), 0)
+
+
+def like_pattern(pattern):
+    """The LIKE pattern of a schema *pattern*, with \\ as the escape
+    character.
+
+    >>> like_pattern("Sales*")
+    'Sales%'
+    >>> like_pattern("my_app?")
+    'my\\\\_app_'
+    """
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+
+# Number of rows fetched at once by a RowStream without stream columns
+STREAM_BATCH_SIZE = 100
+
+
+class RowStream(object):
+    """The rows of an executed *cursor*, fetched in batches as they are
+    iterated, once. The values of the stream *columns* are spooled.
+    *on_done* is called with the RowStream after the last row."""
+
+    def __init__(self, cursor, columns=(), on_done=None):
+        self.cursor = cursor
+        self.description = cursor.description
+        self.columns = columns
+        self.on_done = on_done
+        self.rowcount = 0
+        self.fetch_time = 0.0
+
+    def __iter__(self):
+        spool = LobSpool() if self.columns else None
+        size = FETCH_BATCH_SIZE if self.columns else STREAM_BATCH_SIZE
+        while True:
+            start = time()
+            batch = self.cursor.fetchmany(size)
+            self.fetch_time += time() - start
+            if not batch:
+                break
+            self.rowcount += len(batch)
+            if spool:
+                batch = spooled(batch, spool, self.columns)
+            yield from batch
+        if self.on_done:
+            self.on_done(self)
+
+    def status(self):
+        """Yields the status line, once the rows were read."""
+        yield "{0} row{1} in set".format(
+            self.rowcount, "" if self.rowcount == 1 else "s"
+        )
+
 
 class SQLExecute:
     schemas_query = """
-        SELECT 
+        SELECT {top}
             SCHEMA_NAME
         FROM INFORMATION_SCHEMA.SCHEMATA
-        WHERE 
-            NOT SCHEMA_NAME %STARTSWITH '%'
-        AND NOT SCHEMA_NAME %STARTSWITH 'Ens'
-        AND SCHEMA_NAME <> 'INFORMATION_SCHEMA'
+        WHERE {where}
         ORDER BY SCHEMA_NAME
     """
 
     tables_query = """
-        SELECT TABLE_SCHEMA, TABLE_NAME
+        SELECT {top} TABLE_SCHEMA, TABLE_NAME
         FROM INFORMATION_SCHEMA.TABLES
-        WHERE 
-            NOT TABLE_SCHEMA %STARTSWITH '%'
-        AND NOT TABLE_SCHEMA %STARTSWITH 'Ens'
-        AND TABLE_SCHEMA <> 'INFORMATION_SCHEMA'
+        WHERE {where}
         ORDER BY TABLE_SCHEMA, TABLE_NAME
     """
 
     table_columns_query = """
-        SELECT 
+        SELECT {top}
             TABLE_SCHEMA, 
             TABLE_NAME,
             COLUMN_NAME
         FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE 
-            NOT TABLE_SCHEMA %STARTSWITH '%'
-        AND NOT TABLE_SCHEMA %STARTSWITH 'Ens'
-        AND TABLE_SCHEMA <> 'INFORMATION_SCHEMA'
+        WHERE {where}
         ORDER BY TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME
     """
 
@@ -64,7 +163,11 @@ class SQLExecute:
         self.sslcontext = sslcontext
         self.extra_params = kw
 
-        self.server_version = None
+        self.measure_bytes = False
+        self.last_stats = None
+        self.slow_query_log = None
+        self.catalog_filter = CatalogFilter()
+        self._connection_id = None
 
         self.connect()
 
@@ -79,6 +182,24 @@ class SQLExecute:
             embedded=embedded,
         )
 
+    def clone(self):
+        """Open a new connection with the same parameters as this one."""
+        clone = SQLExecute(
+            hostname=self.hostname,
+            port=self.port,
+            namespace=self.namespace,
+            username=self.username,
+            password=self.password,
+            embedded=self.embedded,
+            sslcontext=self.sslcontext,
+            **self.extra_params,
+        )
+        clone.catalog_filter = self.catalog_filter
+        return clone
+
+    def close(self):
+        self.conn.close()
+
     def connect(self):
         conn_params = {
             "hostname": self.hostname,
@@ -99,24 +220,53 @@ class SQLExecute:
         if not self.embedded:
             self.conn.setAutoCommit(True)
         if self.embedded:
-            self.server_version = iris.system.Version.GetVersion()
             self.username = iris.system.Process.UserName()
             if self.namespace is None:
                 self.namespace = iris.system.Process.NameSpace()
             self.hostname = iris.system.Util.InstallDirectory()
-        else:
-            try:
-                iris_conn = iris.connect(hostname=conn_params["hostname"], port=conn_params["port"], namespace=conn_params["namespace"], username=conn_params["username"], password=conn_params["password"])
-                iris.runtime.configure(native_connection=iris_conn)
-                version =iris.system.Version.GetVersion()
-                self.server_version = version
-            except Exception as e:
-                self.server_version = "unknown"
 
-    def run(
-        self,
-        statement,
-    ):
+    @property
+    def server_version(self):
+        """The server version, looked up on first use. The lookup needs a
+        native connection next to the DB-API one, so it is kept out of
+        connect()."""
+        key = (self.hostname, self.port)
+        with _server_info_lock:
+            if key not in server_info_cache:
+                server_info_cache[key] = self._get_server_version()
+            return server_info_cache[key]
+
+    def prefetch_server_version(self):
+        """Look the server version up in a background thread, returns the
+        thread."""
+        thread = threading.Thread(
+            target=lambda: self.server_version, name="server_version", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _get_server_version(self):
+        if self.embedded:
+            return iris.system.Version.GetVersion()
+        try:
+            iris_conn = iris.connect(
+                hostname=self.hostname,
+                port=self.port,
+                namespace=self.namespace,
+                username=self.username,
+                password=self.password,
+            )
+            iris.runtime.configure(native_connection=iris_conn)
+            return iris.system.Version.GetVersion()
+        except Exception as e:
+            _logger.debug("Unable to get server version: %r", e)
+            return "unknown"
+
+    def run(self, statement, stream=False):
+        """Runs the statements of *statement*, yields a result tuple for
+        each. A statement ending with \\G is shown vertically, see
+        special.is_expanded_output. When *stream* is set, the rows of the
+        last statement are a RowStream, fetched as they are shown."""
         statement = statement.strip()
         if not statement:  # Empty string
             yield None, None, None, None, statement, False, False
@@ -141,10 +291,14 @@ class SQLExecute:
             sqlarr = sqlparse.split(statement)
 
         # run each sql query
-        for sql in sqlarr:
+        for n, sql in enumerate(sqlarr, 1):
             # Remove spaces, eol and semi-colons.
             sql = sql.rstrip(";")
             sql = sqlparse.format(sql, strip_comments=False).strip()
+            expanded = sql.endswith("\\G")
+            special.set_expanded_output(expanded)
+            if expanded:
+                sql = sql[:-2].strip()
             if not sql:
                 continue
 
@@ -158,62 +312,154 @@ class SQLExecute:
                     for result in special.execute(cur, sql):
                         yield result + (sql, True, True)
                 except special.CommandNotFound:
-                    yield self.execute_normal_sql(sql) + (sql, True, False)
+                    # The following statements are not run before the
+                    # rows of a stream are read
+                    result = self.execute_normal_sql(sql, stream and n == len(sqlarr))
+                    yield result + (sql, True, False)
 
             except iris.dbapi.OperationalError as e:
                 _logger.error("sql: %r, error: %r", sql, e)
                 _logger.error("traceback: %r", traceback.format_exc())
 
                 yield None, None, None, e, sql, False, False
+        special.set_expanded_output(False)
 
-    def execute_normal_sql(self, split_sql):
-        """Returns tuple (title, rows, headers, status)"""
+    def execute_normal_sql(self, split_sql, stream=False):
+        """Returns tuple (title, rows, headers, status). When *stream* is set,
+        the rows are a RowStream, which gives the status once read."""
         _logger.debug("Regular sql statement. sql: %r", split_sql)
 
         title = headers = None
 
-        cursor = self.conn.cursor()
-        cursor.execute(split_sql)
+        cursor, rows = self.execute_timed(split_sql, stream)
+        rowcount = self.last_stats.rowcount
+
+        if isinstance(rows, RowStream):
+            return (title, rows, [x[0] for x in cursor.description], None)
+        self.log_if_slow(self.last_stats, rows)
 
         # cur.description will be None for operations that do not return
         # rows.
         if cursor.description:
             headers = [x[0] for x in cursor.description]
             status = "{0} row{1} in set"
-            cursor = cursor.fetchall()
-            rowcount = len(cursor)
         else:
             _logger.debug("No rows in result.")
             status = "Query OK, {0} row{1} affected"
-            rowcount = 0 if cursor.rowcount == -1 else cursor.rowcount
-            cursor = None
+        cursor = rows
 
         status = status.format(rowcount, "" if rowcount == 1 else "s")
 
         return (title, cursor, headers, status)
 
-    def schemas(self):
-        """Yields schema names"""
+    def connection_id(self):
+        """Returns the server process ($JOB) serving this connection."""
+        if self._connection_id is None:
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute("SELECT $JOB")
+                    self._connection_id = cur.fetchone()[0]
+            except Exception as e:
+                _logger.debug("Unable to get connection id: %r", e)
+        return self._connection_id
+
+    def log_if_slow(self, stats, rows):
+        """Logs the QueryStats *stats* of a statement returning *rows* in the
+        slow query log, if it is slow."""
+        if self.slow_query_log and self.slow_query_log.is_slow(stats):
+            if stats.bytes is None:
+                stats = stats._replace(bytes=result_size(rows))
+            self.slow_query_log.log(stats, self.namespace, self.connection_id())
+
+    def _stream_read(self, stats, rows):
+        self.last_stats = stats._replace(
+            fetch_time=rows.fetch_time, rowcount=rows.rowcount
+        )
+        self.log_if_slow(self.last_stats, None)
+
+    def execute_timed(self, sql, stream=False):
+        """Execute *sql* and fetch its rows, timing each phase.
+
+        Returns tuple (cursor, rows), rows is None for statements that do not
+        return rows. The timings are kept in `last_stats`. When *stream* is
+        set, the rows are a RowStream, and `last_stats` is updated once they
+        are read.
+        """
+        cursor = self.conn.cursor()
+
+        start = time()
+        cursor.execute(sql)
+        executed = time()
+
+        if cursor.description and stream:
+            rows = RowStream(cursor, lob_columns(cursor.description))
+            rowcount = 0
+        elif cursor.description:
+            streams = lob_columns(cursor.description)
+            if streams:
+                rows = fetch_spooled(cursor, streams)
+            else:
+                rows = cursor.fetchall()
+            rowcount = len(rows)
+        else:
+            rows = None
+            rowcount = 0 if cursor.rowcount == -1 else cursor.rowcount
+        fetched = time()
+
+        self.last_stats = QueryStats(
+            sql,
+            executed - start,
+            fetched - executed,
+            rowcount,
+            result_size(rows) if self.measure_bytes and not stream else None,
+        )
+        if isinstance(rows, RowStream):
+            rows.on_done = functools.partial(self._stream_read, self.last_stats)
+        return cursor, rows
 
+    def catalog_query(self, query, column):
+        """The SQL and parameters of a catalog *query*, filtered on the schema
+        *column* by the catalog_filter."""
+        catalog_filter = self.catalog_filter
+        conditions = [
+            "NOT %s %%STARTSWITH '%%'" % column,
+            "NOT %s %%STARTSWITH 'Ens'" % column,
+            "%s <> 'INFORMATION_SCHEMA'" % column,
+        ]
+        params = []
+        if catalog_filter.include:
+            conditions.append(
+                "(%s)"
+                % " OR ".join(
+                    "%s LIKE ? ESCAPE '\\'" % column for _ in catalog_filter.include
+                )
+            )
+            params.extend(map(like_pattern, catalog_filter.include))
+        for pattern in catalog_filter.exclude:
+            conditions.append("NOT %s LIKE ? ESCAPE '\\'" % column)
+            params.append(like_pattern(pattern))
+        top = (
+            "TOP %d" % catalog_filter.max_objects if catalog_filter.max_objects else ""
+        )
+        sql = query.format(top=top, where="\n        AND ".join(conditions))
+        return sql, params
+
+    def _catalog_rows(self, name, query, column):
+        sql, params = self.catalog_query(query, column)
         with self.conn.cursor() as cur:
-            _logger.debug("Schemas Query. sql: %r", self.schemas_query)
-            cur.execute(self.schemas_query)
+            _logger.debug("%s Query. sql: %r params: %r", name, sql, params)
+            cur.execute(sql, params)
             for row in cur:
                 yield row
 
+    def schemas(self):
+        """Yields schema names"""
+        return self._catalog_rows("Schemas", self.schemas_query, "SCHEMA_NAME")
+
     def tables(self):
         """Yields table names"""
-
-        with self.conn.cursor() as cur:
-            _logger.debug("Tables Query. sql: %r", self.tables_query)
-            cur.execute(self.tables_query)
-            for row in cur:
-                yield row
+        return self._catalog_rows("Tables", self.tables_query, "TABLE_SCHEMA")
 
     def table_columns(self):
         """Yields column names"""
-        with self.conn.cursor() as cur:
-            _logger.debug("Columns Query. sql: %r", self.table_columns_query)
-            cur.execute(self.table_columns_query)
-            for row in cur:
-                yield row
+        return self._catalog_rows("Columns", self.table_columns_query, "TABLE_SCHEMA")
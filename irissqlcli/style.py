@@ -6,8 +6,6 @@ import pygments.styles
 from pygments.token import string_to_tokentype, Token
 from pygments.style import Style as PygmentsStyle
 from pygments.util import ClassNotFound
-from prompt_toolkit.styles.pygments import style_from_pygments_cls
-from prompt_toolkit.styles import merge_styles, Style
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +59,10 @@ def parse_pygments_style(token_name, style_object, style_dict):
 
 
 def style_factory(name, cli_style):
+    # prompt_toolkit is only needed by the REPL, keep it out of batch mode.
+    from prompt_toolkit.styles.pygments import style_from_pygments_cls
+    from prompt_toolkit.styles import merge_styles, Style
+
     try:
         style = pygments.styles.get_style_by_name(name)
     except ClassNotFound:
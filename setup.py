@@ -47,6 +47,10 @@ setup(
     long_description=readme,
     long_description_content_type="text/markdown",
     install_requires=install_requirements,
+    extras_require={
+        "zstd": ["zstandard"],
+        "dataframe": ["pyarrow>=14", "pandas"],
+    },
     entry_points={
         "console_scripts": ["irissqlcli = irissqlcli.main:cli"],
         "distutils.commands": ["lint = tasks:lint", "test = tasks:test"],
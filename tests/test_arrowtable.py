@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+import pytest
+
+from irissqlcli.packages import arrowtable
+
+pa = pytest.importorskip("pyarrow")
+
+
+class FakeCursor(object):
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.sizes = []
+
+    def fetchmany(self, size):
+        self.sizes.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_to_arrow_fetches_batches():
+    cursor = FakeCursor((i, "name %d" % i) for i in range(5))
+    table = arrowtable.to_arrow(arrowtable.fetch_batches(cursor, 2), ["id", "name"])
+
+    assert cursor.sizes == [2, 2, 2, 2]
+    assert table.column_names == ["id", "name"]
+    assert table.column("id").to_pylist() == [0, 1, 2, 3, 4]
+    assert table.column("name").num_chunks == 3
+
+
+def test_to_arrow_widens_types_across_batches():
+    batches = [
+        [(1, None, Decimal("1.5"))],
+        [(2.5, "a", Decimal("123.456"))],
+    ]
+    table = arrowtable.to_arrow(batches, ["x", "y", "z"])
+    assert [str(t) for t in table.schema.types] == [
+        "double",
+        "string",
+        "decimal128(6, 3)",
+    ]
+    assert table.column("z").to_pylist() == [Decimal("1.500"), Decimal("123.456")]
+
+
+def test_to_arrow_empty_result():
+    table = arrowtable.to_arrow(iter([]), ["id", "name"])
+    assert table.column_names == ["id", "name"]
+    assert table.num_rows == 0
+
+
+def test_to_pandas():
+    pytest.importorskip("pandas")
+    frame = arrowtable.to_pandas([[(1, "a"), (2, None)]], ["id", "name"])
+    assert list(frame.columns) == ["id", "name"]
+    assert frame["id"].tolist() == [1, 2]
+    assert frame["name"][0] == "a"
+    assert frame["name"].isna().tolist() == [False, True]
@@ -0,0 +1,108 @@
+import gzip
+import threading
+import time
+
+from irissqlcli.auditlog import AuditLog
+
+
+def test_audit_log_writes_in_background(tmp_path):
+    path = tmp_path / "logs" / "audit.log"
+    log = AuditLog(str(path), queue_size=2)
+    for i in range(100):
+        log.write("line %d\n" % i)
+    log.flush()
+    assert path.read_text().count("\n") == 100
+
+    log.write("last\n")
+    log.close()
+    assert path.read_text().endswith("line 99\nlast\n")
+    # Written right away once closed
+    log.write("after close\n")
+    assert path.read_text().endswith("last\nafter close\n")
+
+
+def test_audit_log_rotation(tmp_path):
+    path = tmp_path / "audit.log"
+    log = AuditLog(str(path), max_bytes=10, backup_count=2)
+    for text in ("first\n", "second\n", "third\n", "fourth\n", "fifth\n"):
+        log.write(text)
+        log.flush()
+    log.close()
+
+    assert path.read_text() == "fifth\n"
+    assert (tmp_path / "audit.log.1").read_text() == "third\nfourth\n"
+    assert (tmp_path / "audit.log.2").read_text() == "first\nsecond\n"
+    assert not (tmp_path / "audit.log.3").exists()
+
+
+def test_audit_log_gzip(tmp_path):
+    path = tmp_path / "audit.log.gz"
+    log = AuditLog(str(path))
+    log.write("first\n")
+    log.write("second\n")
+    log.close()
+    assert gzip.decompress(path.read_bytes()) == b"first\nsecond\n"
+
+    # Appended, then rotated
+    log = AuditLog(str(path), max_bytes=1)
+    log.write("third\n")
+    log.close()
+    rotated = (tmp_path / "audit.log.1.gz").read_bytes()
+    assert gzip.decompress(rotated) == b"first\nsecond\nthird\n"
+
+
+def test_audit_log_unencodable_text(tmp_path):
+    path = tmp_path / "audit.log"
+    log = AuditLog(str(path), queue_size=2)
+    log.write("select '\ud800'\n")
+    log.write("next\n")
+    log.close()
+    assert path.read_text() == "select '\\ud800'\nnext\n"
+
+
+def test_audit_log_writer_failure(tmp_path):
+    path = tmp_path / "audit.log"
+    log = AuditLog(str(path), queue_size=2)
+    # Not text, fails in the writer thread
+    log.write(b"bytes\n")
+    log.flush()
+    # Written synchronously from then on, the full queue doesn't block
+    for i in range(10):
+        log.write("line %d\n" % i)
+    log.flush()
+    log.close()
+    assert path.read_text().count("\n") == 10
+
+
+def test_audit_log_order_after_writer_failure(tmp_path, monkeypatch):
+    path = tmp_path / "audit.log"
+    log = AuditLog(str(path), queue_size=4)
+    failing = threading.Event()
+    resume = threading.Event()
+    write = log._write
+
+    def slow_write(texts):
+        if b"bytes\n" in texts:
+            failing.set()
+            resume.wait()
+            raise TypeError("not text")
+        if threading.current_thread() is log._thread:
+            time.sleep(0.05)
+        write(texts)
+
+    monkeypatch.setattr(log, "_write", slow_write)
+    log.write(b"bytes\n")
+    failing.wait()
+    # Queued behind the failing batch, then written synchronously
+    expected = ["queued %d\n" % i for i in range(3)]
+    for text in expected:
+        log.write(text)
+    resume.set()
+    while not log._failed:
+        time.sleep(0.001)
+    for i in range(3):
+        expected.append("line %d\n" % i)
+        log.write(expected[-1])
+    log.flush()
+    log.close()
+    assert path.read_text() == "".join(expected)
@@ -0,0 +1,68 @@
+import pytest
+
+from irissqlcli.benchmark import run_benchmark, summarize
+from irissqlcli.sqlexecute import QueryStats
+
+
+class FakeCursor:
+    def close(self):
+        pass
+
+
+class FakeExecute:
+    measure_bytes = False
+    max_clones = None
+
+    def __init__(self):
+        self.runs = 0
+        self.clones = []
+        self.closed = False
+
+    def clone(self):
+        if len(self.clones) == self.max_clones:
+            raise OSError("too many connections")
+        clone = FakeExecute()
+        self.clones.append(clone)
+        return clone
+
+    def close(self):
+        self.closed = True
+
+    def execute_timed(self, sql):
+        self.runs += 1
+        self.last_stats = QueryStats(sql, 0.001 * self.runs, 0.001, 2, 10)
+        return FakeCursor(), [(1,), (2,)]
+
+
+def test_run_benchmark_spreads_iterations():
+    executor = FakeExecute()
+    samples, wall_time = run_benchmark(
+        executor, "select 1", 10, warmup=1, concurrency=3
+    )
+
+    assert len(samples) == 10
+    assert executor.runs == 1 + 4
+    assert [c.runs for c in executor.clones] == [1 + 3, 1 + 3]
+    assert all(c.closed for c in executor.clones)
+    assert not executor.closed
+    assert executor.measure_bytes is False
+
+
+def test_run_benchmark_closes_clones_on_error():
+    executor = FakeExecute()
+    executor.max_clones = 2
+    with pytest.raises(OSError):
+        run_benchmark(executor, "select 1", 10, concurrency=4)
+
+    assert len(executor.clones) == 2
+    assert all(c.closed for c in executor.clones)
+    assert not executor.closed
+
+
+def test_summarize():
+    executor = FakeExecute()
+    samples, _ = run_benchmark(executor, "select 1", 4)
+    rows, headers = summarize(samples, 2.0)
+
+    assert headers[0] == "runs"
+    assert rows == [(4, "2.000", "3.500", "4.850", "4.970", "5.000", "4.0", 40)]
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+from prompt_toolkit.document import Document
+
+from irissqlcli.packages import completion_profiler
+from irissqlcli.sqlcompleter import SQLCompleter
+
+
+@pytest.fixture
+def profiler(tmpdir):
+    profiler = completion_profiler.enable(str(tmpdir), keep_slowest=2)
+    yield profiler
+    completion_profiler.disable()
+    completion_profiler.profiler = None
+
+
+def complete(text):
+    document = Document(text=text, cursor_position=len(text))
+    return list(SQLCompleter().get_completions(document, None))
+
+
+def test_disabled_by_default():
+    assert completion_profiler.keystroke("SELECT ") is completion_profiler._null
+    assert completion_profiler.phase("parse") is completion_profiler._null
+
+
+def test_keystroke_phases(profiler):
+    complete("SELECT * FROM t WHERE ")
+    [keystroke] = profiler.keystrokes
+    assert keystroke.text == "SELECT * FROM t WHERE "
+    assert keystroke.times["parse"] > 0
+    assert keystroke.times["match"] > 0
+    # phases are exclusive, they never add up to more than the keystroke
+    assert sum(keystroke.times.values()) <= keystroke.total
+
+
+def test_nested_phases_are_exclusive(profiler):
+    with profiler.record("x") as keystroke:
+        with completion_profiler.phase("suggest"):
+            with completion_profiler.phase("parse"):
+                pass
+    assert keystroke.times["suggest"] >= 0
+    assert keystroke.times["parse"] >= 0
+    assert keystroke.times["suggest"] + keystroke.times["parse"] <= keystroke.total
+
+
+def test_report(profiler):
+    for text in ["SEL", "SELECT ", "SELECT * FROM "]:
+        complete(text)
+
+    rows, headers = profiler.summary()
+    assert headers[0] == "phase"
+    assert [row[0] for row in rows] == ["total", "parse", "suggest", "match", "sort"]
+    assert all(row[1] == 3 for row in rows)
+
+    rows, headers = profiler.histogram()
+    assert headers == ["ms", "total", "parse", "suggest", "match", "sort"]
+    assert sum(row[1] for row in rows) == 3
+
+    # only the 2 slowest profiles are kept
+    rows, headers = profiler.slowest_keystrokes()
+    assert len(rows) == 2
+    assert sorted(os.path.basename(row[2]) for row in rows) == sorted(
+        os.listdir(profiler.profile_dir)
+    )
+
+    profiler.reset()
+    assert not profiler.keystrokes
+    assert os.listdir(profiler.profile_dir) == []
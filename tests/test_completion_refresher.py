@@ -0,0 +1,28 @@
+from irissqlcli.completion_refresher import CompletionRefresher
+
+
+class FakeExecute:
+    def __init__(self):
+        self.clones = []
+        self.closed = False
+
+    def clone(self):
+        clone = FakeExecute()
+        self.clones.append(clone)
+        return clone
+
+    def close(self):
+        self.closed = True
+
+
+def test_refresh_closes_its_connection():
+    refresher = CompletionRefresher()
+    refresher.refreshers = {}
+    executor = FakeExecute()
+    completers = []
+
+    refresher._bg_refresh(executor, completers.append, {})
+
+    assert len(completers) == 1
+    assert [c.closed for c in executor.clones] == [True]
+    assert not executor.closed
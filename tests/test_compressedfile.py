@@ -0,0 +1,61 @@
+import gzip
+import lzma
+import sys
+
+import pytest
+
+from irissqlcli.packages import compressedfile
+from irissqlcli.packages.compressedfile import CompressedFile, open_output
+from irissqlcli.packages.special import iocommands
+
+
+@pytest.mark.parametrize("extension", [".gz", ".xz"])
+def test_compressed_file_in_blocks(monkeypatch, tmp_path, extension):
+    monkeypatch.setattr(compressedfile, "BLOCK_SIZE", 10)
+    decompress = gzip.decompress if extension == ".gz" else lzma.decompress
+    path = tmp_path / ("out.csv" + extension)
+    lines = ["line %d\n" % i for i in range(1000)]
+
+    with open_output(str(path), "w") as f:
+        assert isinstance(f, CompressedFile)
+        for line in lines:
+            f.write(line)
+    assert decompress(path.read_bytes()).decode() == "".join(lines)
+    assert f.size == len("".join(lines))
+    assert f.compressed_size == path.stat().st_size
+
+    # Appended as another member or stream
+    with open_output(str(path), "a") as f:
+        f.write(b"appended\n")
+    assert decompress(path.read_bytes()).decode() == "".join(lines) + "appended\n"
+
+
+def test_zstd_needs_zstandard(monkeypatch, tmp_path):
+    # Not importable, whether it is installed or not
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(OSError) as e:
+        open_output(str(tmp_path / "out.zst"))
+    assert "zstandard" in e.value.strerror
+    assert not (tmp_path / "out.zst").exists()
+
+
+def test_compressed_tee_and_once(monkeypatch, tmp_path):
+    messages = []
+    monkeypatch.setattr(iocommands.click, "secho", messages.append)
+
+    iocommands.set_tee("-o %s" % (tmp_path / "tee.txt.gz"))
+    iocommands.write_tee("first result")
+    iocommands.write_tee("second result")
+    [(_, _, _, status)] = iocommands.no_tee("")
+    assert status.startswith("Wrote 27 bytes to %s" % (tmp_path / "tee.txt.gz"))
+    assert "compressed" in status and "MB/s" in status
+    assert gzip.decompress((tmp_path / "tee.txt.gz").read_bytes()) == (
+        b"first result\nsecond result\n"
+    )
+
+    iocommands.set_once(str(tmp_path / "once.txt.xz"))
+    with iocommands.once_writer() as write_once:
+        write_once("a result")
+    iocommands.unset_once_if_written()
+    assert lzma.decompress((tmp_path / "once.txt.xz").read_bytes()) == b"a result\n"
+    assert messages[0].startswith("Wrote 9 bytes")
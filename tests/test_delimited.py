@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from irissqlcli.packages.delimited import write_delimited
+
+
+def test_headers_only_with_rows():
+    out = io.StringIO()
+    write_delimited(out, "csv", "Title", [], ["id"])
+    assert out.getvalue() == "Title\n"
+
+
+def test_csv_newlines_are_quoted():
+    out = io.StringIO()
+    write_delimited(out, "csv", None, [("a\nb", 1.5)], ["x", "y"])
+    assert out.getvalue() == '"x","y"\n"a\nb","1.5"\n'
+
+
+def test_tsv_escapes_and_nulls():
+    out = io.StringIO()
+    rows = [("None", None), ("line\nbreak", b"\xff"), ("b'x'", b"ok")]
+    write_delimited(out, "tsv", None, rows, ["x", "y"])
+    assert out.getvalue().splitlines() == [
+        "x\ty",
+        "None\t",
+        "line\\nbreak\t0xff",
+        "b'x'\tok",
+    ]
+
+
+class FirstRowWritten(Exception):
+    pass
+
+
+class FirstRowOut(object):
+    """Stops the writer once the headers and the first row were written."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text)
+        if len(self.lines) == 2:
+            raise FirstRowWritten
+
+
+@pytest.mark.parametrize("format_name", ["csv", "tsv"])
+def test_delimited_output_is_lazy(format_name):
+    def rows():
+        yield (1,)
+        raise AssertionError("read too far")
+
+    out = FirstRowOut()
+    with pytest.raises(FirstRowWritten):
+        write_delimited(out, format_name, None, rows(), ["id"])
+    assert out.lines[1].strip('"\n') == "1"
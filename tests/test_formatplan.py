@@ -0,0 +1,32 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from irissqlcli.packages.formatplan import FormatPlan, column_types
+
+Column = namedtuple("Column", "name type_code")
+
+
+class Cursor(list):
+    description = [Column("id", 4), Column("price", 2), Column("data", -3)]
+
+
+def test_types_from_description():
+    assert column_types(Cursor()) == [int, Decimal, bytes]
+
+
+def test_unknown_type_codes_are_text():
+    cur = Cursor()
+    cur.description = [Column("name", 12), Column("other", 1234)]
+    assert column_types(cur) == [str, str]
+
+
+def test_decimals_are_aligned_around_nulls():
+    plan = FormatPlan([Decimal], "NULL")
+    data, _ = plan.preprocess([(Decimal("1.5"),), (None,), (Decimal("100"),)], ["x"])
+    assert data == [["  1.5"], ["NULL"], ["100"]]
+
+
+def test_nulls_left_to_the_formatter():
+    plan = FormatPlan([float, str, bytes], align=False)
+    data, _ = plan.preprocess([(None, None, None), (1.5, 2, b"\xff")], ["a", "b", "c"])
+    assert data == [[None, None, None], ["1.5", "2", "0xff"]]
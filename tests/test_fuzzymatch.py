@@ -0,0 +1,131 @@
+from irissqlcli.packages import fuzzymatch
+from irissqlcli.packages.fuzzymatch import FuzzyIndex
+
+NAMES = [
+    "customer_orders",
+    "CustomerOrders",
+    "orders",
+    "order_items",
+    "o_r_d",
+    "product_order_detail",
+    "words",
+    "status",
+]
+
+
+class Budget(object):
+    """Runs out after *checks* budget checks."""
+
+    def __init__(self, checks):
+        self.checks = checks
+
+    def exhausted(self):
+        self.checks -= 1
+        return self.checks < 0
+
+
+def count_scanned(monkeypatch):
+    """Returns the list of the names scanned from now on."""
+    scanned = []
+    compile = fuzzymatch.re.compile
+
+    class Pattern(object):
+        def __init__(self, pattern):
+            self.pattern = compile(pattern)
+
+        def search(self, name):
+            scanned.append(name)
+            return self.pattern.search(name)
+
+    monkeypatch.setattr(fuzzymatch.re, "compile", Pattern)
+    return scanned
+
+
+def test_ranking():
+    index = FuzzyIndex(NAMES)
+    assert list(index.find("ord")) == [
+        # prefix
+        "order_items",
+        "orders",
+        # segment
+        "product_order_detail",
+        "customer_orders",
+        "CustomerOrders",
+        # initials
+        "o_r_d",
+        # scanned, shortest then leftmost first
+        "words",
+    ]
+
+
+def test_initials():
+    index = FuzzyIndex(NAMES)
+    assert list(index.find("co"))[:2] == ["customer_orders", "CustomerOrders"]
+    assert list(index.find("pod")) == ["product_order_detail"]
+
+
+def test_case_insensitive():
+    index = FuzzyIndex(NAMES)
+    assert list(index.find("ORDERI")) == ["order_items", "product_order_detail"]
+
+
+def test_empty_text_matches_all():
+    index = FuzzyIndex(NAMES)
+    assert list(index.find("")) == sorted(NAMES, key=str.lower)
+
+
+def test_usage_ranks_first():
+    index = FuzzyIndex(NAMES)
+    usage = {"customer_orders": 3, "product_order_detail": 5, "words": 9}
+    assert list(index.find("ord", usage)) == [
+        "product_order_detail",
+        "customer_orders",
+        "order_items",
+        "orders",
+        "CustomerOrders",
+        "o_r_d",
+        # a scanned match does not outrank the indexed ones
+        "words",
+    ]
+
+
+def test_scan_is_narrowed(monkeypatch):
+    index = FuzzyIndex(["table_%d" % i for i in range(100)] + ["stable"])
+    assert list(index.find("sbl")) == ["stable"]
+    scanned = count_scanned(monkeypatch)
+    assert list(index.find("sble")) == ["stable"]
+    assert scanned == ["stable"]
+
+
+def test_scan_resumes_after_budget(monkeypatch):
+    monkeypatch.setattr(fuzzymatch, "SCAN_CHUNK_SIZE", 10)
+    index = FuzzyIndex(["ab%d" % i for i in range(100)])
+    expected = ["ab1"] + ["ab1%d" % i for i in range(10)] + ["ab21", "ab31"]
+    # Stops after 3 chunks, at ab35
+    assert list(index.find("a1", budget=Budget(2))) == expected
+
+    scanned = count_scanned(monkeypatch)
+    expected += ["ab%d1" % i for i in range(4, 10)]
+    assert list(index.find("a1")) == expected
+    # The matches of the first scan, then the names it did not reach
+    assert len(scanned) == 13 + 70
+
+
+def test_scan_without_index():
+    scan = fuzzymatch.FuzzyScan(NAMES)
+    matches = scan.find("ord")
+    assert sorted(matches) == sorted(FuzzyIndex(NAMES).find("ord"))
+    assert matches[:2] == ["order_items", "orders"]
+    assert matches[-2:] == ["o_r_d", "words"]
+
+    usage = {"customer_orders": 3, "words": 9}
+    assert scan.find("ord", usage)[:2] == ["customer_orders", "order_items"]
+    assert scan.find("ord", usage)[-1] == "words"
+
+
+def test_lowercase_of_another_length():
+    # "İ".lower() is two characters
+    index = FuzzyIndex(["İstanbul_Offices", "order_items"])
+    # by initials first, İstanbul_Offices is a scanned match
+    assert list(index.find("oi")) == ["order_items", "İstanbul_Offices"]
+    assert list(index.find("items")) == ["order_items"]
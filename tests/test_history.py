@@ -0,0 +1,70 @@
+from irissqlcli.filehistory import CompactingFileHistory, PrefixIndex
+from irissqlcli.history import QueryHistoryStore, parse_history_args
+from irissqlcli.main import MetaQuery
+
+
+def test_history_store_search():
+    store = QueryHistoryStore(":memory:")
+    store.add(MetaQuery("select * from orders", True, 0.5, 0.4, rowcount=3), "USER")
+    store.add(MetaQuery("select * from customers", True, 2.0, 1.9), "USER")
+    store.add(MetaQuery("delete from orders", False, 0.1, 0.1), "SAMPLES")
+    store.add(MetaQuery("  "), "USER")
+
+    recent = store.search()
+    assert [e[-1] for e in recent] == [
+        "delete from orders",
+        "select * from customers",
+        "select * from orders",
+    ]
+
+    slowest = store.search(**parse_history_args("slowest 1"))
+    assert [e[-1] for e in slowest] == ["select * from customers"]
+
+    found = store.search(**parse_history_args("orders"))
+    assert [e[-1] for e in found] == ["delete from orders", "select * from orders"]
+
+    prefixed = store.search(**parse_history_args("^select * from o"))
+    assert [(e[4], e[5], e[-1]) for e in prefixed] == [
+        (3, "USER", "select * from orders")
+    ]
+
+    failed = store.search(**parse_history_args("failed today"))
+    assert [e[-1] for e in failed] == ["delete from orders"]
+
+
+def test_history_store_recent_queries():
+    store = QueryHistoryStore(":memory:")
+    store.add(MetaQuery("select 1", True, 0.1, 0.1), "USER")
+    store.add(MetaQuery("select 2", True, 0.1, 0.1), "SAMPLES")
+    store.add(MetaQuery("select 3", False, 0.1, 0.1), "USER")
+    store.add(MetaQuery("select 4", True, 0.1, 0.1), "USER")
+    store.add(MetaQuery("select 5", True, 0.1, 0.1), "USER")
+
+    assert list(store.recent_queries("USER", limit=2)) == ["select 4", "select 5"]
+    assert list(store.recent_queries("USER")) == ["select 1", "select 4", "select 5"]
+
+
+def test_indexed_file_history_compacts_duplicates(tmpdir):
+    path = str(tmpdir.join("history"))
+    history = CompactingFileHistory(path, PrefixIndex())
+    for query in ["select 1", "select 2", "select 1", "select\n3", "select 1"]:
+        history.store_string(query)
+
+    history = CompactingFileHistory(path, PrefixIndex())
+    history.compact_min_duplicates = 2
+    assert list(history.load_history_strings()) == ["select 1", "select\n3", "select 2"]
+    assert history.index.suggest("sel") == "select 1"
+    assert history.index.suggest("3") == "3"
+
+    # the file was rewritten without the duplicates
+    history = CompactingFileHistory(path, PrefixIndex())
+    assert len(history._read_entries()) == 3
+
+
+def test_prefix_index_blocks():
+    index = PrefixIndex()
+    index.block_size = 4
+    index.load(["select %03d" % i for i in range(100)] + ["select 042"])
+    assert index.suggest("select") == "select 042"
+    assert index.suggest("select 09") == "select 099"
+    assert index.suggest("select 1") is None
@@ -0,0 +1,61 @@
+import datetime
+import io
+import json
+from decimal import Decimal
+
+from irissqlcli.packages import jsonformat
+
+
+def test_json_lines_is_valid_json():
+    rows = [
+        (1, 'a\n"b"', Decimal("12.345"), 1.5, None),
+        (2, "é", Decimal("-1"), 0.0, datetime.datetime(2024, 1, 2, 3, 4, 5)),
+    ]
+    headers = ["id", "text", "amount", "ratio", "at"]
+
+    document = "\n".join(jsonformat.json_lines(rows, headers, "json"))
+    assert json.loads(document) == [
+        {"id": 1, "text": 'a\n"b"', "amount": "12.345", "ratio": 1.5, "at": None},
+        {
+            "id": 2,
+            "text": "é",
+            "amount": "-1",
+            "ratio": 0.0,
+            "at": "2024-01-02T03:04:05",
+        },
+    ]
+
+    lines = list(jsonformat.json_lines(rows, headers, "jsonl"))
+    assert [json.loads(line)["id"] for line in lines] == [1, 2]
+
+
+def test_json_lines_duplicate_headers():
+    # SELECT a.id, b.id, COUNT(*), COUNT(*)
+    headers = ["id", "id", "Aggregate_3", "Aggregate_3"]
+    (line,) = jsonformat.json_lines([(1, 2, 3, 4)], headers, "jsonl")
+    assert json.loads(line) == {
+        "id": 1,
+        "id_2": 2,
+        "Aggregate_3": 3,
+        "Aggregate_3_2": 4,
+    }
+
+
+def test_json_lines_empty_result():
+    assert list(jsonformat.json_lines([], ["id"], "json")) == ["[", "]"]
+    assert list(jsonformat.json_lines([], ["id"], "jsonl")) == []
+
+
+def test_json_lines_is_lazy():
+    def rows():
+        yield (1,)
+        raise AssertionError("read too far")
+
+    lines = jsonformat.json_lines(rows(), ["id"], "jsonl")
+    assert next(lines) == '{"id":1}'
+
+
+def test_stream_values_are_written_whole():
+    rows = [(io.StringIO("x" * 5000), b"\x00\xff")]
+    (line,) = jsonformat.json_lines(rows, ["text", "data"], "jsonl")
+    assert json.loads(line) == {"text": "x" * 5000, "data": "0x00ff"}
@@ -0,0 +1,49 @@
+from collections import namedtuple
+
+from irissqlcli import lobs
+from irissqlcli.lobs import LobHandle, fetch_spooled, lob_columns
+
+Column = namedtuple("Column", "name type_code")
+DESCRIPTION = [Column("id", 4), Column("doc", -1), Column("data", -4)]
+
+
+class Cursor(object):
+    description = DESCRIPTION
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_stream_columns_are_spooled():
+    rows = [(i, "é" * 1000, b"\x00" * 10) for i in range(25)] + [(25, None, None)]
+    spooled = fetch_spooled(Cursor(rows), lob_columns(DESCRIPTION))
+
+    assert len(spooled) == 26
+    _, doc, data = spooled[3]
+    assert isinstance(doc, LobHandle) and len(doc) == 2000
+    assert doc.read(3) == "ééé"
+    assert data.read() == b"\x00" * 10
+    assert spooled[25] == (25, None, None)
+
+
+def test_read_does_not_split_characters():
+    handle = lobs.LobSpool().add("a€b")
+    assert handle.read(1) == "a"
+    assert handle.read(1) == "€"
+    assert handle.read() == "b"
+
+
+def test_export_copies_in_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(lobs, "CHUNK_SIZE", 7)
+    spool = lobs.LobSpool()
+    spool.add("before")
+    handle = spool.add("x" * 100)
+    spool.add("after")
+
+    with open(tmp_path / "doc.txt", "wb") as out:
+        assert lobs.export(handle, out) == 100
+    assert (tmp_path / "doc.txt").read_text() == "x" * 100
@@ -162,7 +162,7 @@ def output(monkeypatch, terminal_size, testdata, explicit_pager, expect_pager):
     def echo_via_pager(s):
         assert expect_pager
         global clickoutput
-        clickoutput += s
+        clickoutput += s if isinstance(s, str) else "".join(s)
 
     def secho(s):
         assert not expect_pager
@@ -223,3 +223,287 @@ def test_conditional_pager(monkeypatch):
         expect_pager=False,
     )
     SPECIAL_COMMANDS["pager"].handler("")
+
+
+def test_output_writes_chunks_to_file_sinks(monkeypatch, tmp_path):
+    lines = ["line %d" % i for i in range(2500)]
+    (tmp_path / "once.txt").write_text("previous result\n")
+    monkeypatch.setattr(click, "secho", lambda s: None)
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.explicit_pager = False
+    SPECIAL_COMMANDS["nopager"].handler()
+    SPECIAL_COMMANDS["tee"].handler("-o %s" % (tmp_path / "tee.txt"))
+    SPECIAL_COMMANDS["\\o"].handler("-o %s" % (tmp_path / "once.txt"))
+    try:
+        with open(tmp_path / "audit.log", "w") as m.logfile:
+            m.output(lines, "2500 rows in set")
+    finally:
+        SPECIAL_COMMANDS["notee"].handler("")
+        SPECIAL_COMMANDS["pager"].handler("")
+
+    expected = "\n".join(lines) + "\n"
+    assert (tmp_path / "tee.txt").read_text() == expected
+    assert (tmp_path / "once.txt").read_text() == expected
+    assert (tmp_path / "audit.log").read_text() == expected + "2500 rows in set\n"
+
+
+def test_file_sinks_get_all_when_pager_quits(monkeypatch, tmp_path):
+    lines = ["line %d" % i for i in range(2500)]
+    # The user quits the pager after the first chunk
+    monkeypatch.setattr(click, "echo_via_pager", lambda text, color=None: next(text))
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.explicit_pager = True
+    SPECIAL_COMMANDS["tee"].handler("-o %s" % (tmp_path / "tee.txt"))
+    try:
+        with open(tmp_path / "audit.log", "w") as m.logfile:
+            m.output(lines)
+    finally:
+        SPECIAL_COMMANDS["notee"].handler("")
+
+    expected = "\n".join(lines) + "\n"
+    assert (tmp_path / "tee.txt").read_text() == expected
+    assert (tmp_path / "audit.log").read_text() == expected
+
+
+def test_usage_counts_survive_refresh():
+    from irissqlcli.sqlcompleter import SQLCompleter
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.prompt_app = None
+    m.completer = SQLCompleter()
+    m.completer.extend_query_history("SELECT * FROM orders")
+
+    m._on_completions_refreshed(SQLCompleter(), persist_priorities="all")
+    assert m.completer.prioritizer.name_counts["orders"] == 1
+
+    m._on_completions_refreshed(SQLCompleter(), persist_priorities="keywords")
+    assert m.completer.prioritizer.name_counts["orders"] == 0
+    assert m.completer.prioritizer.keyword_counts["select"] == 1
+
+    seeded = SQLCompleter()
+    seeded.extend_query_history("SELECT * FROM customers")
+    m._on_completions_refreshed(seeded, persist_priorities="none")
+    assert m.completer.prioritizer.name_counts["customers"] == 1
+
+
+class FakeExecutor(object):
+    def __init__(self, rows, headers):
+        self.result = (None, rows, headers, "", "", True, False)
+        self.stream = None
+
+    def run(self, query, stream=False):
+        self.stream = stream
+        return [self.result]
+
+
+class FakePlanCursor(object):
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query):
+        self.executed.append(query)
+
+    def fetchall(self):
+        return [('<plans><plan><cost value="2"/> Output the row.</plan></plans>',)]
+
+
+def test_explain_plan_cache(monkeypatch):
+    from irissqlcli.packages import special
+
+    special.clear_plan_cache()
+    cursor = FakePlanCursor()
+
+    def explain(command):
+        ((title, rows, headers, status),) = special.execute(cursor, command)
+        return rows, status
+
+    rows, status = explain("\\explain select 1")
+    assert rows == [("Plan cost: 2",), ("└── Output the row.",)]
+    assert status == ""
+    # Normalized query text hits the cache
+    assert explain("\\explain  SELECT 1") == (rows, "(cached)")
+    assert len(cursor.executed) == 1
+    # + bypasses it
+    assert explain("\\explain+ select 1") == (rows, "")
+    assert len(cursor.executed) == 2
+
+    # Switching namespace clears it
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.sqlexecute = FakeExecutor(None, None)
+    m.sqlexecute.result = (None, None, None, "", "use OTHER", True, True)
+    monkeypatch.setattr(m, "refresh_completions", lambda **kwargs: None)
+    m.execute_command("use OTHER")
+    assert explain("\\explain select 1") == (rows, "")
+    assert len(cursor.executed) == 3
+
+
+class FakePromptApp(object):
+    def __init__(self, texts):
+        self.texts = iter(texts)
+
+    def prompt(self):
+        for text in self.texts:
+            return text
+        raise EOFError
+
+
+def test_declined_destructive_query(monkeypatch, tmp_path, capsys):
+    from irissqlcli import main
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.quiet = True
+    m.history_store = None
+    m.config["main"]["history_file"] = str(tmp_path / "history")
+    m.sqlexecute = FakeExecutor([(1,)], ["id"])
+    monkeypatch.setattr(m, "refresh_completions", lambda **kwargs: None)
+    monkeypatch.setattr(
+        m, "_build_cli", lambda history: FakePromptApp(["drop table t", "select 1"])
+    )
+    # Declined, select is not destructive
+    monkeypatch.setattr(
+        main,
+        "confirm_destructive_query",
+        lambda text: False if text.startswith("drop") else None,
+    )
+
+    m.run_cli()
+    assert "Wise choice!" in capsys.readouterr().out
+    # The REPL went on to the next query
+    assert m.query_history[0] is None
+    assert m.query_history[1].query == "select 1"
+
+
+def test_bench_confirms_destructive_query(monkeypatch):
+    from irissqlcli import main
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    confirmed = []
+
+    def decline(query):
+        confirmed.append(query)
+        return False
+
+    monkeypatch.setattr(main, "confirm_destructive_query", decline)
+    monkeypatch.setattr(main, "run_benchmark", lambda *args: pytest.fail("ran"))
+    assert m.bench("100 DELETE FROM t") == [(None, None, None, "Wise choice!")]
+    assert confirmed == ["DELETE FROM t"]
+
+
+def test_bare_vertical_terminator_shows_usage():
+    from irissqlcli.packages import special
+
+    ((title, rows, headers, status),) = special.execute(None, "\\G")
+    assert status == "End a query with \\G to show its results vertically."
+
+
+def test_run_query_streams_delimited_output(capfd):
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.sqlexecute = FakeExecutor([(1, None, b"ab"), (2, "a\tb", "x")], ["id", "a", "b"])
+
+    m.formatter.format_name = "tsv"
+    m.run_query("SELECT")
+    assert capfd.readouterr().out == "id\ta\tb\n1\t\tab\n2\ta\\tb\tx\n"
+    assert m.sqlexecute.stream
+
+    m.formatter.format_name = "csv"
+    m.run_query("SELECT")
+    assert capfd.readouterr().out == '"id","a","b"\n"1","","ab"\n"2","a\tb","x"\n'
+
+
+def test_json_output(capfd):
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.sqlexecute = FakeExecutor([(1, None, b"ab"), (2, "b", "x")], ["id", "a", "b"])
+
+    m.formatter.format_name = "jsonl"
+    m.run_query("SELECT")
+    assert capfd.readouterr().out == (
+        '{"id":1,"a":null,"b":"ab"}\n{"id":2,"a":"b","b":"x"}\n'
+    )
+
+    m.formatter.format_name = "json"
+    output = m.format_output(None, iter([(1, "a")]), ["id", "a"], None)
+    assert list(output) == ["[", '{"id":1,"a":"a"}', "]"]
+    assert m.streams_rows("SELECT 1")
+
+
+def test_long_values_are_truncated_and_expanded():
+    import io
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.max_field_width = 10
+    m.max_field_widths = {"id": 1}
+    m.formatter.format_name = "psql"
+    rows = [(12, "x" * 30, io.StringIO("y" * 1000))]
+    output = "\n".join(m.format_output(None, rows, ["id", "a", "b"], None))
+    assert "| 12 | xxxxxxx... | yyyyyyy... |" in output
+
+    [(_, _, _, value)] = m.expand_value("1 b")
+    assert value == "y" * 1000
+    [(_, _, _, message)] = m.expand_value("")
+    assert message.startswith("2 values were truncated.")
+
+
+def test_export_truncated_stream(tmp_path):
+    from irissqlcli.lobs import LobSpool
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.max_field_width = 10
+    rows = [(1, LobSpool().add("z" * 5000))]
+    output = "\n".join(m.format_output(None, rows, ["id", "doc"], None))
+    assert "zzzzzzz..." in output
+
+    [(_, _, _, status)] = m.export_value("1 doc %s" % (tmp_path / "doc.txt"))
+    assert status == "Wrote 5000 bytes to %s" % (tmp_path / "doc.txt")
+    assert (tmp_path / "doc.txt").read_text() == "z" * 5000
+    [(_, _, _, status)] = m.export_value("1 doc %s" % (tmp_path / "doc.txt.gz"))
+    assert status.startswith(
+        "Wrote 5000 bytes to %s, compressed" % (tmp_path / "doc.txt.gz")
+    )
+    [(_, _, _, status)] = m.export_value("1 doc")
+    assert status.startswith("Usage:")
+
+
+def test_vertical_output_is_streamed():
+    from cli_helpers.utils import strip_ansi
+    from irissqlcli.packages import special
+    from irissqlcli.sqlexecute import QueryStats, RowStream
+
+    class Cursor(object):
+        description = [("id", 4), ("name", 12)]
+        fetches = 0
+
+        def __init__(self, rows):
+            self.rows = rows
+
+        def fetchmany(self, size):
+            self.fetches += 1
+            batch, self.rows = self.rows[:size], self.rows[size:]
+            return batch
+
+    cursor = Cursor([(i, "name %d" % i) for i in range(1, 301)])
+
+    class Executor(object):
+        last_stats = QueryStats("", 0, 0, 0, None)
+
+        def run(self, text, stream=False):
+            special.set_expanded_output(True)
+            yield None, RowStream(cursor), ["id", "name"], None, text, True, False
+
+    m = IRISSqlCli(irissqlclirc=default_config_file)
+    m.sqlexecute = Executor()
+    output, query = m._evaluate_command("SELECT id, name FROM t\\G")
+    assert query.streamed
+
+    lines = iter(output)
+    first_record = [strip_ansi(next(lines)) for _ in range(3)]
+    assert first_record == [
+        "-[ RECORD 1 ]-------------------------",
+        "id   | 1",
+        "name | name 1",
+    ]
+    assert cursor.fetches == 1
+    rest = list(lines)
+    assert strip_ansi(rest[-2]) == "name | name 300"
+    assert rest[-1] == "300 rows in set"
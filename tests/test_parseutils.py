@@ -0,0 +1,73 @@
+import pytest
+import sqlparse
+from sqlparse import lexer
+
+from irissqlcli.packages.parseutils import ParseCache, extract_tables
+
+EDITS = [
+    "SELECT * FROM orders o",
+    "SELECT * FROM orders o LEFT",
+    "SELECT * FROM orders o LEFT OUTER JOIN items i ON o.id = i.order_id",
+    "SELECT * FROM orders o WHERE o.note = 'it''s",
+    "SELECT * FROM orders o WHERE o.note = 'it''s' AND o.id = ",
+    "SELECT * FROM orders /* WHERE o.id",
+    "SELECT * FROM orders /* WHERE */ o WHERE o.id",
+    "SELECT * FROM [my table",
+    "SELECT * FROM [my table] t; SELECT",
+    "SELECT 1; SELECT * FROM items WHERE",
+]
+
+
+def test_tokenize_matches_lexer():
+    cache = ParseCache()
+    for text in EDITS + list(reversed(EDITS)):
+        tokens, offsets = cache.tokenize(text)
+        assert tokens == list(lexer.tokenize(text))
+        assert [text[offset:] for offset in offsets] == [
+            text[len("".join(value for _, value in tokens[:i])) :]
+            for i in range(len(tokens))
+        ]
+
+
+@pytest.mark.parametrize("text", EDITS)
+def test_parse_matches_sqlparse(text):
+    cache = ParseCache()
+    cache.parse("SELECT 1; " + text[:-3])
+    statements = cache.parse(text)
+    assert [str(s) for s in statements] == [str(s) for s in sqlparse.parse(text)]
+    assert cache.parse(text) is statements
+
+
+def test_statements_are_memoized():
+    cache = ParseCache()
+    first = cache.parse("SELECT * FROM orders; SELECT")
+    second = cache.parse("SELECT * FROM orders; SELECT * FROM")
+    assert second[0] is first[0]
+
+
+def test_tables_memoized_until_from_clause_changes():
+    cache = ParseCache()
+    calls = []
+
+    def extract(sql):
+        calls.append(sql)
+        return [(None, "orders", "o")]
+
+    cache.tables("SELECT * FROM orders o WHERE o.id = 1", extract)
+    cache.tables("SELECT * FROM orders o WHERE o.id = 1 AND o.", extract)
+    assert len(calls) == 1
+
+    cache.tables("SELECT * FROM orders o, items i WHERE o.id = 1", extract)
+    assert len(calls) == 2
+
+    # A WHERE inside a subquery does not end the FROM clause
+    cache.tables("SELECT * FROM (SELECT * FROM t WHERE x) s", extract)
+    cache.tables("SELECT * FROM (SELECT * FROM t WHERE x) s, u", extract)
+    assert len(calls) == 4
+
+
+def test_extract_tables_after_where():
+    assert extract_tables("SELECT * FROM abc a WHERE a.") == [(None, "abc", "a")]
+    assert extract_tables("SELECT * FROM abc a WHERE a.x = 1 AND ") == [
+        (None, "abc", "a")
+    ]
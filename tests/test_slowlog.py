@@ -0,0 +1,29 @@
+import json
+
+from irissqlcli.slowlog import SlowQueryLog
+from irissqlcli.sqlexecute import QueryStats
+
+
+def test_slow_query_log(tmpdir):
+    path = str(tmpdir.join("logs", "slow.jsonl"))
+    slow_log = SlowQueryLog(path, 100)
+
+    fast = QueryStats("select 1", 0.01, 0.01, 1, None)
+    slow = QueryStats("select  *\nfrom t;", 0.09, 0.02, 3, 42)
+    assert not slow_log.is_slow(fast)
+    assert slow_log.is_slow(slow)
+
+    slow_log.log(slow, "USER", 1234)
+    slow_log.close()
+
+    with open(path) as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry["sql"] == "SELECT * FROM t"
+    assert entry["execute_ms"] == 90.0
+    assert entry["fetch_ms"] == 20.0
+    assert entry["rows"] == 3
+    assert entry["bytes"] == 42
+    assert entry["namespace"] == "USER"
+    assert entry["connection_id"] == 1234
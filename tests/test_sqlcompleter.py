@@ -0,0 +1,151 @@
+from prompt_toolkit.document import Document
+
+from irissqlcli import sqlcompleter
+from irissqlcli.packages import fuzzymatch
+from irissqlcli.sqlcompleter import SQLCompleter
+
+
+def completer_with_tables(count, **kwargs):
+    completer = SQLCompleter(**kwargs)
+    completer.extend_schemas([("SQLUser",)], kind="tables")
+    completer.extend_relations(
+        [("SQLUser", "table_%d" % i) for i in range(count)], kind="tables"
+    )
+    return completer
+
+
+def complete(completer, text):
+    return completer.get_completions(
+        Document(text=text, cursor_position=len(text)), None
+    )
+
+
+def test_best_matches_first():
+    completer = completer_with_tables(0)
+    completer.extend_relations(
+        [("SQLUser", "order_items"), ("SQLUser", "orders"), ("SQLUser", "o_r_d")],
+        kind="tables",
+    )
+    names = [c.text for c in complete(completer, "SELECT * FROM SQLUser.ord")]
+    assert names == ["order_items", "orders", "o_r_d"]
+
+
+def test_max_completions():
+    completer = completer_with_tables(100, max_completions=10)
+    names = [c.text for c in complete(completer, "SELECT * FROM SQLUser.table_")]
+    assert names == sorted("table_%d" % i for i in range(100))[:10]
+
+
+def test_time_budget_returns_partial_results(monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr(sqlcompleter, "monotonic", lambda: next(clock))
+    monkeypatch.setattr(fuzzymatch, "SCAN_CHUNK_SIZE", 10)
+    completer = completer_with_tables(100, time_budget=0.5)
+    completions = list(complete(completer, "SELECT * FROM SQLUser.tb1"))
+    # the first chunk is scanned before the budget check, out of the 19
+    # tables with a 1
+    assert 0 < len(completions) < 19
+
+
+def test_time_budget_starts_after_suggestions(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(sqlcompleter, "monotonic", lambda: clock[0])
+    suggest_type = sqlcompleter.suggest_type
+
+    def slow_suggest_type(*args):
+        clock[0] += 1.0
+        return suggest_type(*args)
+
+    monkeypatch.setattr(sqlcompleter, "suggest_type", slow_suggest_type)
+    completer = completer_with_tables(300, time_budget=0.5)
+    completions = complete(completer, "SELECT * FROM SQLUser.table_")
+    first = next(completions)
+    # the consumer is slow, it is not counted
+    clock[0] += 1.0
+    assert len([first] + list(completions)) == 300
+
+
+def test_time_budget_yields_first_page(monkeypatch):
+    clock = iter(range(100000))
+    monkeypatch.setattr(sqlcompleter, "monotonic", lambda: next(clock))
+    completer = completer_with_tables(300, time_budget=0.5)
+    completions = list(complete(completer, "SELECT * FROM SQLUser.table_"))
+    assert len(completions) == sqlcompleter.FIRST_PAGE_SIZE
+
+
+def test_stale_request_is_dropped():
+    completer = completer_with_tables(100)
+    completions = complete(completer, "SELECT * FROM SQLUser.table_")
+    assert next(completions).text == "table_0"
+    # a newer request, the user typed more
+    next(complete(completer, "SELECT * FROM SQLUser.table_1"))
+    assert list(completions) == []
+
+
+def test_used_table_ranks_first():
+    completer = completer_with_tables(0)
+    completer.extend_relations(
+        [("SQLUser", "orders_%d" % i) for i in range(1000)], kind="tables"
+    )
+    completer.extend_query_history("SELECT * FROM SQLUser.Orders_734 o")
+    completer.extend_query_history("SELECT * FROM SQLUser.orders_512 o")
+    completer.extend_query_history("SELECT * FROM SQLUser.orders_512 o")
+    names = [c.text for c in complete(completer, "SELECT * FROM SQLUser.ord")]
+    assert names[:3] == ["orders_512", "orders_734", "orders_0"]
+    assert len(names) == 1000
+
+
+def test_used_keyword_ranks_first():
+    completer = SQLCompleter()
+    assert next(complete(completer, "DE")).text == "DECIMAL"
+    completer.extend_query_history("DELETE FROM orders")
+    assert next(complete(completer, "DE")).text == "DELETE"
+
+
+def test_scoped_columns_and_schema_objects():
+    completer = completer_with_tables(2)
+    completer.extend_relations([("Sales", "order"), ("Sales", "items")], kind="tables")
+    completer.extend_columns(
+        [
+            ("SQLUser", "table_0", "id"),
+            ("Sales", "order", "id"),
+            ("Sales", "order", "Total Amount"),
+            ("Sales", "missing", "id"),
+        ],
+        kind="tables",
+    )
+    # names are stored escaped, order is a reserved word
+    assert sorted(completer.populate_scoped_cols([("Sales", "order", None)])) == [
+        '"Total Amount"',
+        "*",
+        "id",
+    ]
+    assert sorted(completer.populate_scoped_cols([(None, "table_0", "t")])) == [
+        "*",
+        "id",
+    ]
+    assert completer.populate_schema_objects("Sales", "tables") == ['"order"', "items"]
+    # the schemas, then the tables of the default schema
+    assert completer.populate_schema_objects(None, "schemas") == [
+        '"SQLUser".',
+        '"Sales".',
+        "table_0",
+        "table_1",
+    ]
+
+
+def test_large_schema_is_scanned_until_indexed(monkeypatch):
+    import threading
+
+    monkeypatch.setattr(sqlcompleter, "INDEX_BUILD_SIZE", 10)
+    completer = completer_with_tables(100)
+    text = "SELECT * FROM SQLUser.table_9"
+    scanned = [c.text for c in complete(completer, text)]
+    for thread in threading.enumerate():
+        if thread.name == "fuzzy_index":
+            thread.join()
+
+    index = completer.schema_objects_index("SQLUser", "tables")
+    assert isinstance(index, fuzzymatch.FuzzyIndex)
+    assert scanned == [c.text for c in complete(completer, text)]
+    assert scanned[:2] == ["table_9", "table_90"]
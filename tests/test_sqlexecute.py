@@ -0,0 +1,129 @@
+import iris
+
+from irissqlcli import sqlexecute
+from irissqlcli.packages import special
+from irissqlcli.sqlexecute import SQLExecute
+
+
+class FakeCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, params))
+
+    def __iter__(self):
+        return iter([("Sales", "orders")])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+
+    def setAutoCommit(self, value):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
+
+def test_server_version_is_looked_up_lazily(monkeypatch):
+    native_connections = []
+    lookups = []
+    monkeypatch.setattr(iris.dbapi, "connect", lambda **kw: FakeConnection())
+    monkeypatch.setattr(iris, "connect", lambda **kw: native_connections.append(kw))
+    monkeypatch.setattr(
+        SQLExecute, "_get_server_version", lambda self: lookups.append(1) or "2024.1"
+    )
+    monkeypatch.setattr(sqlexecute, "server_info_cache", {})
+
+    executor = SQLExecute("localhost", 1972, "USER", "_SYSTEM", "SYS")
+    assert native_connections == []
+    assert lookups == []
+
+    executor.prefetch_server_version().join()
+    assert executor.server_version == "2024.1"
+    assert executor.clone().server_version == "2024.1"
+    assert len(lookups) == 1
+
+
+def test_catalog_filter_is_pushed_to_the_server(monkeypatch):
+    monkeypatch.setattr(iris.dbapi, "connect", lambda **kw: FakeConnection())
+    executor = SQLExecute("localhost", 1972, "USER", "_SYSTEM", "SYS")
+    executor.catalog_filter = sqlexecute.CatalogFilter(
+        include=["Sales*", "HR"], exclude=["Sales_Old"], max_objects=5000
+    )
+    executor = executor.clone()
+
+    assert list(executor.tables()) == [("Sales", "orders")]
+    [(sql, params)] = executor.conn.executed
+    assert "SELECT TOP 5000 TABLE_SCHEMA, TABLE_NAME" in sql
+    assert "AND (TABLE_SCHEMA LIKE ? ESCAPE '\\' OR TABLE_SCHEMA LIKE ?" in sql
+    assert "AND NOT TABLE_SCHEMA LIKE ? ESCAPE '\\'" in sql
+    assert "AND NOT TABLE_SCHEMA %STARTSWITH 'Ens'" in sql
+    assert params == ["Sales%", "HR", "Sales\\_Old"]
+
+
+def test_catalog_is_not_filtered_by_default(monkeypatch):
+    monkeypatch.setattr(iris.dbapi, "connect", lambda **kw: FakeConnection())
+    executor = SQLExecute("localhost", 1972, "USER", "_SYSTEM", "SYS")
+
+    list(executor.schemas())
+    [(sql, params)] = executor.conn.executed
+    assert "TOP" not in sql and "LIKE" not in sql
+    assert params == []
+
+
+class FakeResultCursor(FakeCursor):
+    description = [("id", 4), ("name", 12)]
+    rowcount = -1
+
+    def __init__(self, executed, rows):
+        super().__init__(executed)
+        self.rows = rows
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+
+def test_vertical_terminator_streams_the_last_statement(monkeypatch):
+    connection = FakeConnection()
+    cursors = []
+
+    def cursor():
+        cursors.append(FakeResultCursor(connection.executed, [(1, "a"), (2, "b")]))
+        return cursors[-1]
+
+    monkeypatch.setattr(connection, "cursor", cursor)
+    monkeypatch.setattr(iris.dbapi, "connect", lambda **kw: connection)
+    monkeypatch.setattr(sqlexecute, "STREAM_BATCH_SIZE", 1)
+    executor = SQLExecute("localhost", 1972, "USER", "_SYSTEM", "SYS")
+
+    results = executor.run("SELECT 1\\G; SELECT id, name FROM t\\G", stream=True)
+    title, rows, headers, status, sql, success, _ = next(results)
+    assert special.is_expanded_output()
+    assert rows == [(1, "a"), (2, "b")]
+    assert sql == "SELECT 1"
+
+    title, rows, headers, status, sql, success, _ = next(results)
+    assert isinstance(rows, sqlexecute.RowStream)
+    assert headers == ["id", "name"] and status is None
+    assert cursors[-1].fetches == 0
+
+    assert list(rows) == [(1, "a"), (2, "b")]
+    assert list(rows.status()) == ["2 rows in set"]
+    assert executor.last_stats.rowcount == 2
+    assert list(results) == []
+    assert not special.is_expanded_output()
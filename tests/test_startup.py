@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+# Modules only the interactive REPL needs, --execute and piped batch mode
+# must not pay for importing them.
+INTERACTIVE_MODULES = (
+    "prompt_toolkit",
+    "pendulum",
+    "pygments.lexers",
+    "irissqlcli.sqlcompleter",
+    "irissqlcli.completion_refresher",
+)
+
+
+def test_batch_mode_imports():
+    code = (
+        "import sys, irissqlcli.main; "
+        "print(' '.join(m for m in %r if m in sys.modules))" % (INTERACTIVE_MODULES,)
+    )
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert output.decode().split() == []